@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Timing / memory benchmark of the golden model over the run_pipeline.sh
+parameter space. Each (scale, stage) pair runs in a fresh spawned process so
+its peak RSS is not polluted by earlier stages; the inputs a stage needs are
+generated (seeded) before the timer starts.
+
+Per entry: best / mean wall time over --repeat runs, peak RSS of the worker
+(and the growth over its pre-stage baseline), element throughput
+(output elements per second; matmuls also report MAC/s).
+
+Usage:
+    # default scales, all stages
+    python benchmark.py --json bench.json
+    # selected scales / stages, compare against an older run
+    python benchmark.py --scales small medium --stages block_matmul softmax_matrix_wrapper \
+        --baseline bench_old.json --tolerance 0.25 --json bench.json
+    # custom scale (same knobs as run_pipeline.sh)
+    python benchmark.py --rows 1024 --cols 64 --proj_dim 512 --cores_a 8 --total_modules 8
+
+Exit code is 1 when any stage is slower than baseline * (1 + tolerance).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+try:
+    import resource
+except ImportError:     # Windows: no peak RSS
+    resource = None
+
+SEED = 1
+
+# run_pipeline.sh-style scales; precisions follow its derived widths
+# ('pipeline' = run_pipeline.sh defaults)
+SCALES = {
+    'small':    dict(rows=64,   cols=16, proj_dim=64,  cores_a=2, total_modules=2),
+    'medium':   dict(rows=256,  cols=64, proj_dim=256, cores_a=4, total_modules=4),
+    'pipeline': dict(rows=512,  cols=64, proj_dim=512, cores_a=8, total_modules=8),
+    'large':    dict(rows=2048, cols=64, proj_dim=512, cores_a=8, total_modules=8),
+}
+DEFAULT_SCALES = ('small', 'medium')
+
+
+# ------------------------------------------------------------
+# Inputs
+# ------------------------------------------------------------
+def make_config(scale: dict, input_total_bits: int = 16, input_frac_bits: int = 8,
+                soft_total_bits: int = 16, soft_frac_bits: int = 15, matmul_engine: str = 'float'):
+    """PipelineConfig with run_pipeline.sh's derived Q/K/V and Q_KT precisions"""
+    from golden_pipeline import PipelineConfig
+
+    keys_total, keys_frac = input_total_bits + 2, input_frac_bits + 1
+    return PipelineConfig(
+        min_val=-1, max_val=1, matmul_engine=matmul_engine, seed=SEED,
+        input_total_bits=input_total_bits, input_frac_bits=input_frac_bits,
+        weight_total_bits=input_total_bits, weight_frac_bits=input_frac_bits,
+        keys_total_bits=keys_total, keys_frac_bits=keys_frac,
+        qkt_total_bits=keys_total + 4, qkt_frac_bits=keys_frac + 1,
+        soft_total_bits=soft_total_bits, soft_frac_bits=soft_frac_bits,
+        final_total_bits=soft_total_bits, final_frac_bits=soft_frac_bits,
+        **scale)
+
+
+class _Inputs:
+    """Lazily computed, memoized stage inputs of one config"""
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self._projection = None
+        self._qkt = None
+
+    def projection(self) -> dict:
+        if self._projection is None:
+            from golden_pipeline import linear_projection_stage
+            self._projection = linear_projection_stage(self.cfg)
+        return self._projection
+
+    def qkt(self) -> np.ndarray:
+        if self._qkt is None:
+            from golden_pipeline import qkt_stage
+            p = self.projection()
+            self._qkt = qkt_stage(self.cfg, p['Q'], p['K'])
+        return self._qkt
+
+
+# ------------------------------------------------------------
+# Stages
+# Each builder prepares its inputs and returns (run, elements, macs);
+# only run() is timed.
+# ------------------------------------------------------------
+def _create_matrix(inp, tmp):
+    from matrix_multiplier import matrix_rng
+    cfg = inp.cfg
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    run = lambda: processor.create_matrix(cfg.rows, cfg.cols, cfg.min_val, cfg.max_val, cfg.conv_input,
+                                          True, matrix_rng(cfg.seed, 'input'))
+    return run, cfg.rows * cfg.cols, 0
+
+
+def _multiply_matrices(inp, tmp):
+    cfg, p = inp.cfg, inp.projection()
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    run = lambda: processor.multiply_matrices(p['A'], p['Wq'], cfg.conv_input, cfg.conv_weight, cfg.conv_keys)
+    return run, cfg.rows * cfg.proj_dim, cfg.rows * cfg.cols * cfg.proj_dim
+
+
+def _export_core(inp, tmp):
+    from block_matmul import BLOCK_SIZE
+    cfg, p = inp.cfg, inp.projection()
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+
+    def run():
+        processor.export_matrix(p['A'], cfg.conv_input, os.path.join(tmp, "mem_input.mem"), mode='core',
+                                block_size=BLOCK_SIZE, num_cores=cfg.cores_a, matrix_type='A')
+        processor.export_matrix(p['Wq'], cfg.conv_weight, os.path.join(tmp, "mem_q1.mem"), mode='core',
+                                block_size=BLOCK_SIZE, num_cores=cfg.total_modules, matrix_type='B')
+    return run, p['A'].size + p['Wq'].size, 0
+
+
+def _export_c_v2(inp, tmp):
+    from golden_pipeline import export_qkt
+    cfg, qkt = inp.cfg, inp.qkt()
+    return lambda: export_qkt(cfg, qkt, tmp), qkt.size * 2, 0
+
+
+def _export_row(inp, tmp):
+    cfg, p = inp.cfg, inp.projection()
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    run = lambda: processor.export_matrix(p['Q'], cfg.conv_keys, os.path.join(tmp, "mem_out_q1_row.mem"), mode='row')
+    return run, p['Q'].size, 0
+
+
+def _block_matmul(inp, tmp):
+    from block_matmul import block_matmul
+    cfg, p = inp.cfg, inp.projection()
+    run = lambda: block_matmul(p['Q'], p['K'].T, cfg.conv_keys, cfg.conv_keys, cfg.conv_qkt,
+                               engine=cfg.matmul_engine)
+    return run, cfg.rows * cfg.rows, cfg.rows * cfg.rows * cfg.proj_dim
+
+
+def _softmax_row_wrapper(inp, tmp):
+    import softmax as softmax_rtl
+    from golden_pipeline import DIV_VALUE
+    cfg = inp.cfg
+    rows = softmax_rtl.sign_extend_array(inp.qkt(), cfg.conv_qkt.total_bits).tolist()
+    frac_in, conv_S = cfg.conv_qkt.fractional_bits, cfg.conv_soft
+
+    def run():
+        for row in rows:
+            softmax_rtl.softmax_row_wrapper(row, frac_in, conv_S.fractional_bits, conv_S.total_bits,
+                                            apply_div=True, div_val=DIV_VALUE)
+    return run, cfg.rows * cfg.rows, 0
+
+
+def _softmax_matrix_wrapper(inp, tmp):
+    import softmax as softmax_rtl
+    from golden_pipeline import DIV_VALUE
+    cfg = inp.cfg
+    x = inp.qkt()
+    conv_S = cfg.conv_soft
+    run = lambda: softmax_rtl.softmax_matrix_wrapper(x, cfg.conv_qkt.fractional_bits, conv_S.fractional_bits,
+                                                     conv_S.total_bits, apply_div=True, div_val=DIV_VALUE,
+                                                     width_in=cfg.conv_qkt.total_bits)
+    return run, x.size, 0
+
+
+def _softmax_tables(inp, tmp):
+    import softmax as softmax_rtl
+    from golden_pipeline import DIV_VALUE
+    cfg = inp.cfg
+    x = inp.qkt()
+    conv_S = cfg.conv_soft
+    tables = softmax_rtl.SoftmaxTables()
+    run = lambda: softmax_rtl.softmax_matrix_wrapper(x, cfg.conv_qkt.fractional_bits, conv_S.fractional_bits,
+                                                     conv_S.total_bits, apply_div=True, div_val=DIV_VALUE,
+                                                     width_in=cfg.conv_qkt.total_bits, tables=tables)
+    # tables are built lazily: fill them before the timer starts
+    run()
+    return run, x.size, 0
+
+
+def _softmax_real(inp, tmp):
+    import softmax_real
+    from golden_pipeline import DIV_VALUE
+    cfg, qkt = inp.cfg, inp.qkt()
+
+    def run():
+        x = softmax_real.fixed_matrix_to_float(qkt, cfg.conv_qkt) / float(DIV_VALUE)
+        return softmax_real.float_matrix_to_fixed(softmax_real.softmax_real(x), cfg.conv_soft)
+    return run, qkt.size, 0
+
+
+def _compare_files(inp, tmp):
+    from compare import compare_files
+    cfg, qkt = inp.cfg, inp.qkt()
+    rtl = qkt.copy()
+    rtl.reshape(-1)[::97] ^= 1
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            compare_files(qkt, rtl, cfg.conv_qkt.total_bits, cfg.conv_qkt.fractional_bits)
+    return run, qkt.size, 0
+
+
+def _golden_pipeline(inp, tmp):
+    from golden_pipeline import run_golden_pipeline
+    cfg = inp.cfg
+    return lambda: run_golden_pipeline(cfg, out_dir=tmp), cfg.rows * cfg.rows, 0
+
+
+STAGES = {
+    'create_matrix': _create_matrix,
+    'multiply_matrices': _multiply_matrices,
+    'export_core': _export_core,
+    'export_c_v2': _export_c_v2,
+    'export_row': _export_row,
+    'block_matmul': _block_matmul,
+    'softmax_row_wrapper': _softmax_row_wrapper,
+    'softmax_matrix_wrapper': _softmax_matrix_wrapper,
+    'softmax_tables': _softmax_tables,
+    'softmax_real': _softmax_real,
+    'compare_files': _compare_files,
+    'golden_pipeline': _golden_pipeline,
+}
+
+
+# ------------------------------------------------------------
+# Measurement
+# ------------------------------------------------------------
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None without `resource`)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(scale_name: str, scale: dict, stage: str, repeat: int, cfg_kwargs: dict) -> dict:
+    """Time one stage; meant to run in a fresh worker process"""
+    inp = _Inputs(make_config(scale, **cfg_kwargs))
+    with tempfile.TemporaryDirectory() as tmp:
+        run, elements, macs = STAGES[stage](inp, tmp)
+        rss_before = peak_rss_mb()
+
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+        rss_after = peak_rss_mb()
+
+    best = min(times)
+    return {
+        'scale': scale_name,
+        'stage': stage,
+        'params': dict(scale, **cfg_kwargs),
+        'repeat': repeat,
+        'best_s': best,
+        'mean_s': sum(times) / len(times),
+        'elements': elements,
+        'elements_per_s': elements / best if best > 0 else None,
+        'macs_per_s': macs / best if macs and best > 0 else None,
+        'peak_rss_mb': rss_after,
+        'stage_rss_mb': None if rss_after is None else rss_after - rss_before,
+    }
+
+
+def run_benchmarks(scales: dict, stages, repeat: int = 3, cfg_kwargs: dict = None,
+                   isolate: bool = True, log=print) -> list:
+    """Every (scale, stage) pair, each in its own spawned process unless isolate=False"""
+    cfg_kwargs = cfg_kwargs or {}
+    results = []
+    for scale_name, scale in scales.items():
+        for stage in stages:
+            if isolate:
+                ctx = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    r = pool.submit(run_stage, scale_name, scale, stage, repeat, cfg_kwargs).result()
+            else:
+                r = run_stage(scale_name, scale, stage, repeat, cfg_kwargs)
+            results.append(r)
+            log(format_row(r))
+    return results
+
+
+# ------------------------------------------------------------
+# Baseline
+# ------------------------------------------------------------
+def check_regressions(results: list, baseline: list, tolerance: float) -> list:
+    """Entries slower than baseline best_s * (1 + tolerance); adds 'baseline_s' / 'ratio'"""
+    ref = {(b['scale'], b['stage']): b for b in baseline}
+    regressions = []
+    for r in results:
+        b = ref.get((r['scale'], r['stage']))
+        if b is None or b.get('params') != r['params']:
+            continue
+        r['baseline_s'] = b['best_s']
+        r['ratio'] = r['best_s'] / b['best_s'] if b['best_s'] > 0 else None
+        if r['ratio'] is not None and r['ratio'] > 1.0 + tolerance:
+            regressions.append(r)
+    return regressions
+
+
+# ------------------------------------------------------------
+# Report
+# ------------------------------------------------------------
+HEADER = f"{'scale':9} {'stage':24} {'best [s]':>10} {'Melem/s':>9} {'GMAC/s':>8} {'peak MB':>9} {'ratio':>7}"
+
+
+def format_row(r: dict) -> str:
+    def num(v, scale, fmt):
+        return format(v / scale, fmt) if v is not None else '-'
+    ratio = r.get('ratio')
+    return (f"{r['scale']:9} {r['stage']:24} {r['best_s']:10.4f} "
+            f"{num(r['elements_per_s'], 1e6, '9.2f'):>9} {num(r['macs_per_s'], 1e9, '8.3f'):>8} "
+            f"{num(r['peak_rss_mb'], 1, '9.1f'):>9} {num(ratio, 1, '7.2f'):>7}")
+
+
+def metadata() -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Golden model stage benchmark")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(DEFAULT_SCALES))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+
+    # Custom scale (replaces --scales)
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--cols', type=int, default=64)
+    parser.add_argument('--proj_dim', type=int, default=512)
+    parser.add_argument('--cores_a', type=int, default=8)
+    parser.add_argument('--total_modules', type=int, default=8)
+
+    # Precisions (Q/K/V and Q_KT derived as in run_pipeline.sh)
+    parser.add_argument('--input_total_bits', type=int, default=16)
+    parser.add_argument('--input_frac_bits', type=int, default=8)
+    parser.add_argument('--soft_total_bits', type=int, default=16)
+    parser.add_argument('--soft_frac_bits', type=int, default=15)
+    parser.add_argument('--matmul_engine', choices=['float', 'exact', 'mac'], default='float')
+
+    parser.add_argument('--inline', action='store_true',
+                        help='Run every stage in this process (faster, peak RSS is cumulative)')
+    parser.add_argument('--json', default=None, help='Write results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown vs baseline (0.2 = 20%%)')
+
+    args = parser.parse_args()
+
+    if args.rows is not None:
+        scales = {'custom': dict(rows=args.rows, cols=args.cols, proj_dim=args.proj_dim,
+                                 cores_a=args.cores_a, total_modules=args.total_modules)}
+    else:
+        scales = {name: SCALES[name] for name in args.scales}
+
+    cfg_kwargs = dict(input_total_bits=args.input_total_bits, input_frac_bits=args.input_frac_bits,
+                      soft_total_bits=args.soft_total_bits, soft_frac_bits=args.soft_frac_bits,
+                      matmul_engine=args.matmul_engine)
+
+    print(HEADER)
+    results = run_benchmarks(scales, args.stages, args.repeat, cfg_kwargs, isolate=not args.inline)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = check_regressions(results, baseline, args.tolerance)
+
+        print("\n[BASELINE]", args.baseline)
+        print(HEADER)
+        for r in results:
+            if 'ratio' in r:
+                print(format_row(r))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': metadata(), 'tolerance': args.tolerance,
+                       'results': results, 'regressions': [(r['scale'], r['stage']) for r in regressions]},
+                      f, indent=2)
+        print(f"\nJSON: {args.json}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"  {r['scale']:9} {r['stage']:24} {r['baseline_s']:.4f}s → {r['best_s']:.4f}s (x{r['ratio']:.2f})")
+        sys.exit(1)
+    elif args.baseline:
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
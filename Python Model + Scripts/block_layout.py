@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+block_layout.py
+
+Reshape/transpose tilings that put a row-major matrix into the word order
+the RTL reads from .mem files. Each function returns the tiled words as one
+ndarray (a view whenever numpy can express it without copying); no Python
+loop ever touches individual elements.
+
+Word order per line (outermost first):
+- A core mode : row_group -> block_col | core -> r -> c
+- B core mode : col_group -> block_row | core -> c -> r
+- C core mode : row_group -> col_group | core_b -> core_a -> r -> c
+- C v2 (RTL)  : row_group -> col_group | input_w -> module -> core_b -> core_a -> r -> c
+('|' separates the line index from the words inside one line)
+
+BlockLayout turns one of these tilings into a permutation index, built once
+per (mode, shape, geometry) and cached, so converting a matrix either way
+between row-major and file order is a single np.take:
+
+    layout = get_layout('c_v2', rows, cols, block_size, cores_a, cores_b,
+                        total_input_w, total_modules)
+    lines  = layout.to_blocks(matrix)       # == tile_c_v2(matrix, ...)
+    matrix = layout.to_row_major(lines)
+"""
+import functools
+
+import numpy as np
+
+
+def tile_core_A(matrix: np.ndarray, block_size: int, num_cores: int) -> np.ndarray:
+    """A core mode -> (row_groups * blocks_per_row, num_cores * block_size^2)"""
+    rows, cols = matrix.shape
+    bs = block_size
+    t = matrix.reshape(rows // (num_cores * bs), num_cores, bs, cols // bs, bs)
+    # (rg, core, r, bc, c) -> (rg, bc, core, r, c)
+    t = t.transpose(0, 3, 1, 2, 4)
+    return t.reshape(t.shape[0] * t.shape[1], -1)
+
+
+def tile_core_B(matrix: np.ndarray, block_size: int, num_cores: int) -> np.ndarray:
+    """B core mode -> (col_groups * blocks_per_col, num_cores * block_size^2)"""
+    rows, cols = matrix.shape
+    bs = block_size
+    t = matrix.reshape(rows // bs, bs, cols // (num_cores * bs), num_cores, bs)
+    # (br, r, cg, core, c) -> (cg, br, core, c, r)
+    t = t.transpose(2, 0, 3, 4, 1)
+    return t.reshape(t.shape[0] * t.shape[1], -1)
+
+
+def tile_core_C(matrix: np.ndarray, block_size: int, cores_a: int, cores_b: int) -> np.ndarray:
+    """C core mode -> (row_groups * col_groups, cores_a * cores_b * block_size^2)"""
+    rows, cols = matrix.shape
+    bs = block_size
+    t = matrix.reshape(rows // (cores_a * bs), cores_a, bs, cols // (cores_b * bs), cores_b, bs)
+    # (rg, ra, r, cg, cb, c) -> (rg, cg, cb, ra, r, c)
+    t = t.transpose(0, 3, 4, 1, 2, 5)
+    return t.reshape(t.shape[0] * t.shape[1], -1)
+
+
+def tile_c_v2(matrix: np.ndarray, block_size: int, cores_a: int, cores_b: int,
+              total_input_w: int, total_modules: int) -> np.ndarray:
+    """
+    C v2 (RTL) -> (row_groups * col_groups, total_input_w, words_per_input_w)
+    Reshape the result to 2-D for the file layout; the middle axis holds the
+    per-input_w slices used by the debug print.
+    """
+    rows, cols = matrix.shape
+    bs = block_size
+    t = matrix.reshape(rows // (cores_a * total_input_w * bs), total_input_w, cores_a, bs,
+                       cols // (cores_b * total_modules * bs), total_modules, cores_b, bs)
+    # (rg, iw, ra, r, cg, m, cb, c) -> (rg, cg, iw, m, cb, ra, r, c)
+    t = t.transpose(0, 4, 1, 5, 6, 2, 3, 7)
+    return t.reshape(t.shape[0] * t.shape[1], total_input_w, -1)
+
+
+TILINGS = {
+    'core_a': tile_core_A,      # geometry: num_cores
+    'core_b': tile_core_B,      # geometry: num_cores
+    'core_c': tile_core_C,      # geometry: cores_a, cores_b
+    'c_v2':   tile_c_v2,        # geometry: cores_a, cores_b, total_input_w, total_modules
+}
+
+
+# ------------------------------------------------------------
+# Cached permutations
+# ------------------------------------------------------------
+class BlockLayout:
+    """
+    Word order of one tiling as a permutation of the row-major elements:
+    file word k is element order[k] of the flattened matrix, and inverse
+    maps back. block_shape is the shape the tile_* function returns.
+    """
+    def __init__(self, mode: str, rows: int, cols: int, block_size: int, *geometry):
+        if mode not in TILINGS:
+            raise ValueError(f"Unknown block layout '{mode}'")
+        n = rows * cols
+        dtype = np.int32 if n < (1 << 31) else np.int64
+        index = TILINGS[mode](np.arange(n, dtype=dtype).reshape(rows, cols), block_size, *geometry)
+
+        self.mode = mode
+        self.shape = (rows, cols)
+        self.block_shape = index.shape
+        self.order = np.ascontiguousarray(index).reshape(-1)
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(n, dtype=dtype)
+        self.order.flags.writeable = False
+        self.inverse.flags.writeable = False
+
+    def to_blocks(self, matrix: np.ndarray) -> np.ndarray:
+        """(rows, cols) -> block_shape in file word order"""
+        matrix = np.asarray(matrix)
+        if matrix.shape != self.shape:
+            raise ValueError(f"Matrix is {matrix.shape}, layout expects {self.shape}")
+        return np.take(matrix.reshape(-1), self.order).reshape(self.block_shape)
+
+    def to_row_major(self, words) -> np.ndarray:
+        """Words in file order (any shape) -> (rows, cols)"""
+        flat = np.asarray(words).reshape(-1)
+        if flat.size != self.order.size:
+            raise ValueError(f"File holds {flat.size} words, expected {self.shape[0]}x{self.shape[1]}")
+        return np.take(flat, self.inverse).reshape(self.shape)
+
+
+@functools.lru_cache(maxsize=32)
+def get_layout(mode: str, rows: int, cols: int, block_size: int, *geometry) -> BlockLayout:
+    """Cached BlockLayout (see TILINGS for the geometry arguments of each mode)"""
+    return BlockLayout(mode, rows, cols, block_size, *geometry)
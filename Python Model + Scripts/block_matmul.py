@@ -4,7 +4,7 @@ block_matmul.py (FINAL VERSION - MIXED INPUT SUPPORT)
 
 Features:
 - Mixed input formats:
-    A: float / hex
+    A: float / hex (hex loader also accepts .tmem binary files)
     B: float / hex
 - Output format: float / int / hex
 - Output layout: normal / block
@@ -20,6 +20,11 @@ import numpy as np
 import os
 
 from matrix_multiplier import FixedPointConverter, MatrixProcessor
+from fixed_matmul import fixed_matmul, DATAPATHS, ROUNDING_MODES
+from mem_binary import is_tmem, load_words, save_tmem
+from mem_codec import read_lines, write_lines
+from block_layout import get_layout
+from instrument import timed
 
 BLOCK_SIZE = 2
 
@@ -31,18 +36,15 @@ def load_float_matrix(path: str) -> np.ndarray:
     return np.loadtxt(path, dtype=np.float64)
 
 
+@timed('load_hex_matrix')
 def load_hex_matrix(path: str) -> np.ndarray:
-    data = []
-    with open(path, 'r') as f:
-        for line in f:
-            row = [int(x, 16) for x in line.strip().split()]
-            data.append(row)
-    return np.array(data, dtype=np.int64)
+    if is_tmem(path):
+        return load_words(path)
+    return read_lines(path, 'hex')
 
 
 def float_to_fixed_matrix(mat: np.ndarray, conv: FixedPointConverter) -> np.ndarray:
-    vec = np.vectorize(conv.float_to_fixed)
-    return vec(mat).astype(np.int64)
+    return conv.float_to_fixed_array(mat)
 
 
 # ------------------------------------------------------------
@@ -66,118 +68,68 @@ def print_matrix_custom(matrix, conv, name, fmt):
 # ------------------------------------------------------------
 # Block Matrix Multiplication
 # ------------------------------------------------------------
-def block_matmul(A, B, conv_A, conv_B, conv_C):
-    rows_a, cols_a = A.shape
-    rows_b, cols_b = B.shape
+@timed('block_matmul')
+def block_matmul(A, B, conv_A, conv_B, conv_C, engine='float', rounding='truncate', acc_bits=None):
+    """A @ B in the selected engine; stacked (..., rows, cols) operands broadcast like np.matmul"""
+    assert A.shape[-1] == B.shape[-2], "Matrix dimension mismatch"
 
-    assert cols_a == rows_b, "Matrix dimension mismatch"
+    # Integer datapaths (exact dot product / multi_matmul MAC model)
+    if engine != 'float':
+        return fixed_matmul(A, B, conv_A, conv_B, conv_C,
+                            datapath=engine, rounding=rounding,
+                            acc_bits=acc_bits, block_size=BLOCK_SIZE)
 
-    to_float_A = np.vectorize(conv_A.fixed_to_float)
-    to_float_B = np.vectorize(conv_B.fixed_to_float)
+    A_f = conv_A.fixed_to_float_array(A)
+    B_f = conv_B.fixed_to_float_array(B)
 
-    A_f = to_float_A(A)
-    B_f = to_float_B(B)
+    shape = np.broadcast_shapes(A.shape[:-2], B.shape[:-2]) + (A.shape[-2], B.shape[-1])
+    C_f = np.zeros(shape, dtype=np.float64)
+    float_block_accumulate(C_f, A_f, B_f)
 
-    C_f = np.zeros((rows_a, cols_b), dtype=np.float64)
+    return conv_C.float_to_fixed_array(C_f)
 
-    for i in range(0, rows_a, BLOCK_SIZE):
-        for j in range(0, cols_b, BLOCK_SIZE):
-            for k in range(0, cols_a, BLOCK_SIZE):
-                A_blk = A_f[i:i+BLOCK_SIZE, k:k+BLOCK_SIZE]
-                B_blk = B_f[k:k+BLOCK_SIZE, j:j+BLOCK_SIZE]
-                C_f[i:i+BLOCK_SIZE, j:j+BLOCK_SIZE] += A_blk @ B_blk
 
-    to_fixed = np.vectorize(conv_C.float_to_fixed)
-    return to_fixed(C_f).astype(np.int64)
+def float_block_accumulate(C_f, A_f, B_f):
+    """
+    C_f += A_f @ B_f in the float engine's summation order: every element
+    adds its BLOCK_SIZE-long partial dot products one inner block at a time
+    (the per-block loop of the 2x2 cores), all output blocks at once.
+    """
+    for k in range(0, A_f.shape[-1], BLOCK_SIZE):
+        C_f += A_f[..., k:k+BLOCK_SIZE] @ B_f[..., k:k+BLOCK_SIZE, :]
 
 
 # ------------------------------------------------------------
 # Export helper
 # ------------------------------------------------------------
+@timed('export_matrix_custom')
 def export_matrix_custom(matrix, conv, filename, fmt, layout):
     dirpath = os.path.dirname(filename)
     if dirpath:
         os.makedirs(dirpath, exist_ok=True)
 
-    if layout == 'normal':
-        with open(filename, 'w') as f:
-            for row in matrix:
-                line = []
-                for v in row:
-                    vi = int(v)
-                    if fmt == 'float':
-                        line.append(f"{conv.fixed_to_float(vi):.6f}")
-                    elif fmt == 'hex':
-                        line.append(conv.int_to_hex(vi))
-                    else:
-                        line.append(str(vi))
-                f.write(" ".join(line) + "\n")
-
-    else:  # block layout
-        rows, cols = matrix.shape
-        bs = BLOCK_SIZE
-
-        with open(filename, 'w') as f:
-            for i in range(0, rows, bs):
-                for j in range(0, cols, bs):
-                    block = matrix[i:i+bs, j:j+bs]
-
-                    elements = []
-                    for r in range(bs):
-                        for c in range(bs):
-                            vi = int(block[r, c])
-                            if fmt == 'float':
-                                elements.append(f"{conv.fixed_to_float(vi):.6f}")
-                            elif fmt == 'hex':
-                                elements.append(conv.int_to_hex(vi))
-                            else:
-                                elements.append(str(vi))
-
-                    f.write(" ".join(elements) + "\n")
-
-def debug_print_c_v2(matrix, conv, cores_a, cores_b, block_size, total_input_w, total_modules):
-    rows, cols = matrix.shape
-
-    row_groups = rows // (cores_a * total_input_w * block_size)
-    col_groups = cols // (cores_b * total_modules * block_size)
-
-    line_idx = 0
-
-    for rg in range(row_groups):
-        rbase = rg * cores_a * total_input_w * block_size
-
-        for cg in range(col_groups):
-            cbase = cg * cores_b * total_modules * block_size
-
-            line_slices = []
-
-            for iw in range(total_input_w):
-                elements = []
-
-                for module in range(total_modules):
-                    for cb in range(cores_b):
+    if layout != 'normal':  # block layout: one bs x bs block per line
+        matrix = get_layout('core_a', *matrix.shape, BLOCK_SIZE, 1).to_blocks(matrix)
 
-                        cstart = cbase + (module * cores_b + cb) * block_size
-
-                        for ra in range(cores_a):
-                            rstart = rbase + (iw * cores_a + ra) * block_size
-
-                            block = matrix[
-                                rstart:rstart+block_size,
-                                cstart:cstart+block_size
-                            ]
-
-                            for r in range(block_size):
-                                for c in range(block_size):
-                                    elements.append(f"{int(block[r, c]):04x}")
-
-                line_slices.append(elements)
-
-            print(f"\nLine {line_idx}, 0:", " ".join(line_slices[0]))
-            for i in range(1, len(line_slices)):
-                print(f"         {i}:", " ".join(line_slices[i]))
+    if fmt == 'hex':
+        write_lines(filename, matrix, conv.total_bits, 'hex')
+    elif fmt == 'float':
+        np.savetxt(filename, conv.fixed_to_float_array(matrix), fmt='%.6f', delimiter=' ')
+    else:
+        np.savetxt(filename, np.asarray(matrix, dtype=np.int64), fmt='%d', delimiter=' ')
 
-            line_idx += 1
+def debug_print_c_v2(matrix, conv, cores_a, cores_b, block_size, total_input_w, total_modules):
+    """C v2 blocks, one file line per entry and one row per input_w (f'{v:04x}' words)"""
+    tiles = get_layout('c_v2', *matrix.shape, block_size, cores_a, cores_b,
+                       total_input_w, total_modules).to_blocks(matrix)
+    lines, slices, per_slice = tiles.shape
+    text = [" ".join(f"{v:04x}" for v in row) for row in tiles.reshape(lines * slices, per_slice).tolist()]
+
+    for line_idx in range(lines):
+        line_slices = text[line_idx * slices:(line_idx + 1) * slices]
+        print(f"\nLine {line_idx}, 0:", line_slices[0])
+        for i in range(1, slices):
+            print(f"         {i}:", line_slices[i])
 
 # ------------------------------------------------------------
 # Main
@@ -209,12 +161,20 @@ def main():
 
     parser.add_argument('--signed', action='store_true', default=True)
 
+    # Matmul engine
+    parser.add_argument('--matmul_engine', choices=['float'] + list(DATAPATHS), default='float',
+                        help='float: float64 round-trip, exact: integer dot product, mac: multi_matmul RTL model')
+    parser.add_argument('--rounding', choices=ROUNDING_MODES, default='truncate')
+    parser.add_argument('--acc_bits', type=int, default=None)
+
     parser.add_argument('--cores_a', type=int, required=True)
     parser.add_argument('--cores_b', type=int, required=True)
     parser.add_argument('--total_input_w', type=int, default=2)
     parser.add_argument('--total_modules', type=int, default=1)
 
     parser.add_argument('--export_c_v2', action='store_true')
+    parser.add_argument('--export_tmem', action='store_true',
+                    help='Also write the row-major result as binary <output>_row.tmem')
     parser.add_argument('--transpose_B', action='store_true',
                     help='Transpose matrix B before multiplication')
 
@@ -292,7 +252,10 @@ def main():
         A, B,
         conv_A,
         conv_B,
-        conv_C
+        conv_C,
+        engine=args.matmul_engine,
+        rounding=args.rounding,
+        acc_bits=args.acc_bits
     )
 
     # --------------------------------------------------------
@@ -327,12 +290,10 @@ def main():
         #2 Real Format Export
         base, ext = os.path.splitext(out_file)
         row_file = f"{base}_row{ext}"
-        with open(row_file, 'w') as f:
-            for row in C:
-                line = " ".join(conv_C.int_to_hex(int(v)) for v in row)
-                f.write(line + "\n")
+        write_lines(row_file, C, conv_C.total_bits, 'hex')
 
         print(f"Row output: {row_file}")
+
     else:
         export_matrix_custom(
             matrix=C,
@@ -341,6 +302,11 @@ def main():
             fmt=args.output_format,
             layout=args.output_layout
         )
+
+    if args.export_tmem:
+        tmem_file = f"{os.path.splitext(out_file)[0]}_row.tmem"
+        save_tmem(tmem_file, C, conv_C.total_bits, conv_C.fractional_bits, conv_C.is_signed)
+        print(f"Binary row output: {tmem_file}")
     
     if args.display and args.export_c_v2:
         debug_print_c_v2(
@@ -1,6 +1,39 @@
 #!/usr/bin/env python3
-
+"""
+compare.py
+
+Golden vs RTL .mem comparison. Both files are parsed into integer arrays
+and every statistic is computed on whole arrays in one pass:
+
+- mismatch mask / count / match percentage
+- percent error per element (same rule as before: golden == 0 -> 0% on an
+  exact match, otherwise 100%), average and maximum
+- absolute error (mean / max / RMS) in real units
+- ULP distance (difference of the signed words) and its histogram
+- SNR of the RTL output against the golden output
+- per-row and per-tile error maps
+
+Layouts:
+- row  : each text line is one matrix row (the *_row.mem files); tiles are
+         --tile R C elements (default one block_size x block_size PE block)
+- c_v2 : RTL C v2 order (mem_out_*, Q_KT.mem, final_results.mem). The file
+         is put back into row-major order with the cached block_layout
+         permutation (one np.take), and tiles are the RTL row_group x col_group output tiles (one file line).
+
+Usage:
+    python compare.py --golden Q_KT.mem --rtl out_QKT.mem --total_bits 16 --frac_bits 8 \
+        --layout c_v2 --rows 16 --cols 16 --cores_a 2 --cores_b 2 --total_modules 2 \
+        --json qkt_compare.json
+"""
 import argparse
+import json
+import numpy as np
+
+from mem_codec import decode_lines, decode_tokens
+from block_layout import get_layout
+from instrument import timed
+
+BLOCK_SIZE = 2
 
 
 # ============================================================
@@ -8,13 +41,13 @@ import argparse
 # ============================================================
 def fixed_to_float(hex_str, total_bits, frac_bits, signed=True):
     """
-    Convert fixed-point hex string to float.
+    Convert fixed-point hex string (or already parsed word) to float.
     Example:
         0080 (Q8.8)  -> 0.5
         FF80 (Q8.8)  -> -0.5
     """
 
-    value = int(hex_str, 16)
+    value = int(hex_str, 16) if isinstance(hex_str, str) else int(hex_str)
 
     if signed:
         sign_bit = 1 << (total_bits - 1)
@@ -25,111 +58,226 @@ def fixed_to_float(hex_str, total_bits, frac_bits, signed=True):
     return value / (1 << frac_bits)
 
 
+def to_signed_words(words, total_bits, signed=True):
+    """fixed_to_float's integer part for a whole array (int64)"""
+    words = np.asarray(words, dtype=np.int64)
+    if not signed:
+        return words
+    sign_bit = 1 << (total_bits - 1)
+    return np.where(words & sign_bit, words - (1 << total_bits), words)
+
+
 # ============================================================
 # Load file
 # ============================================================
+@timed('load_hex_file')
 def load_hex_file(path):
-    data = []
+    """All hex words of a file (any line layout, optional 0x prefix) as a flat int64 array"""
+    with open(path, 'rb') as f:
+        return decode_tokens(f.read().split(), 'hex')
+
+
+def load_hex_matrix(path):
+    """Hex words as (lines, words_per_line); ragged files come back flat"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return decode_lines(data, 'hex')
+    except ValueError:
+        return decode_tokens(data.split(), 'hex')
 
-    with open(path, 'r') as f:
-        for line in f:
-            tokens = line.strip().split()
 
-            for t in tokens:
-                if t == "":
-                    continue
+def c_v2_to_row_major(words, rows, cols, cores_a, cores_b, total_input_w, total_modules,
+                      block_size=BLOCK_SIZE):
+    """Undo MatrixProcessor.export_matrix_C_v2: file word order -> (rows, cols)"""
+    layout = get_layout('c_v2', rows, cols, block_size, cores_a, cores_b, total_input_w, total_modules)
+    return layout.to_row_major(words)
 
-                t = t.lower().replace("0x", "")
-                data.append(t)
 
-    return data
+# ============================================================
+# Statistics
+# ============================================================
+def _ulp_histogram(ulp):
+    """Counts per bucket: 0, 1, 2-3, 4-7, ... (bucket k holds 2^(k-1) .. 2^k - 1)"""
+    buckets = np.frexp(ulp.astype(np.float64))[1]
+    counts = np.bincount(buckets.reshape(-1))
+    hist = {}
+    for k, n in enumerate(counts.tolist()):
+        if n == 0:
+            continue
+        lo, hi = (0, 0) if k == 0 else (1 << (k - 1), (1 << k) - 1)
+        hist[str(lo) if lo == hi else f"{lo}-{hi}"] = n
+    return hist
+
+
+def _reduce_tiles(x, tile_rows, tile_cols, ufunc):
+    rows, cols = x.shape
+    x = ufunc.reduceat(x, np.arange(0, rows, tile_rows), axis=0)
+    return ufunc.reduceat(x, np.arange(0, cols, tile_cols), axis=1)
+
+
+def compare_arrays(golden, rtl, total_bits, frac_bits, signed=True,
+                   tile=(BLOCK_SIZE, BLOCK_SIZE), max_report=10, file_index=None):
+    """
+    Compare two word arrays of the same shape (1-D or 2-D).
+    Returns a JSON-serializable report dict.
+    file_index optionally maps every element to its word index in the file.
+    """
+    golden = np.asarray(golden, dtype=np.int64)
+    rtl = np.asarray(rtl, dtype=np.int64)
+
+    g_int = to_signed_words(golden, total_bits, signed)
+    r_int = to_signed_words(rtl, total_bits, signed)
+    scale = float(1 << frac_bits)
+    g_val = g_int / scale
+    r_val = r_int / scale
+
+    mismatch = golden != rtl
+    ulp = np.abs(r_int - g_int)
+    abs_err = np.abs(r_val - g_val)
+
+    g_zero = np.abs(g_val) < 1e-12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(g_zero,
+                       np.where(np.abs(r_val) < 1e-12, 0.0, 100.0),
+                       abs_err / np.abs(g_val) * 100.0)
+
+    total = int(golden.size)
+    n_mismatch = int(np.count_nonzero(mismatch))
+    noise = float(np.sum(abs_err ** 2))
+    signal = float(np.sum(g_val ** 2))
+
+    report = {
+        'shape': list(golden.shape),
+        'total_bits': total_bits,
+        'frac_bits': frac_bits,
+        'signed': bool(signed),
+        'total_elements': total,
+        'mismatches': n_mismatch,
+        'match_percent': (1 - n_mismatch / total) * 100 if total else 100.0,
+        'avg_error_percent': float(np.mean(pct)) if total else 0.0,
+        'max_error_percent': float(np.max(pct)) if total else 0.0,
+        'mean_abs_error': float(np.mean(abs_err)) if total else 0.0,
+        'max_abs_error': float(np.max(abs_err)) if total else 0.0,
+        'rms_error': float(np.sqrt(noise / total)) if total else 0.0,
+        'max_ulp': int(np.max(ulp)) if total else 0,
+        'ulp_histogram': _ulp_histogram(ulp),
+        # None (JSON null, as in sweep.py) when there is no error (infinite SNR)
+        # or the golden signal is all zero (undefined)
+        'snr_db': None if noise == 0 or signal == 0 else float(10 * np.log10(signal / noise)),
+    }
+
+    digits = (total_bits + 3) // 4
+    first = []
+    for flat in np.flatnonzero(mismatch)[:max_report].tolist():
+        pos = np.unravel_index(flat, golden.shape)
+        entry = {
+            'idx': int(file_index.reshape(-1)[flat]) if file_index is not None else flat,
+            'golden': f"{int(golden.flat[flat]):0{digits}x}",
+            'rtl': f"{int(rtl.flat[flat]):0{digits}x}",
+            'golden_value': float(g_val.flat[flat]),
+            'rtl_value': float(r_val.flat[flat]),
+            'ulp': int(ulp.flat[flat]),
+            'error_percent': float(pct.flat[flat]),
+        }
+        if golden.ndim == 2:
+            entry['row'], entry['col'] = int(pos[0]), int(pos[1])
+        first.append(entry)
+    report['first_mismatches'] = first
+
+    if golden.ndim == 2 and total:
+        tile_rows, tile_cols = tile
+        report['row_map'] = {
+            'mismatches': np.count_nonzero(mismatch, axis=1).tolist(),
+            'max_ulp': np.max(ulp, axis=1).tolist(),
+        }
+        report['tile_map'] = {
+            'tile': [tile_rows, tile_cols],
+            'mismatches': _reduce_tiles(mismatch.astype(np.int64), tile_rows, tile_cols, np.add).tolist(),
+            'max_ulp': _reduce_tiles(ulp, tile_rows, tile_cols, np.maximum).tolist(),
+        }
+    return report
+
+
+# ============================================================
+# Report
+# ============================================================
+def print_report(report, max_print=10):
+    for i, m in enumerate(report['first_mismatches'][:max_print]):
+        where = f"row={m['row']} col={m['col']} | " if 'row' in m else ""
+        print(
+            f"[Mismatch {i}] "
+            f"idx={m['idx']} | {where}"
+            f"golden={m['golden']} ({m['golden_value']:.6f}) | "
+            f"rtl={m['rtl']} ({m['rtl_value']:.6f}) | "
+            f"error={m['error_percent']:.4f}%"
+        )
+
+    snr = report['snr_db']
+    if snr is None:
+        snr = 'inf' if report['rms_error'] == 0 else 'n/a'
+    else:
+        snr = f'{snr:.2f}'
+    print("\n================================================")
+    print("COMPARE SUMMARY")
+    print("================================================")
+    print(f"Total elements     : {report['total_elements']}")
+    print(f"Total mismatches   : {report['mismatches']}")
+    print(f"Match percentage   : {report['match_percent']:.4f}%")
+    print(f"Average error      : {report['avg_error_percent']:.6f}%")
+    print(f"Maximum error      : {report['max_error_percent']:.6f}%")
+    print(f"Mean abs error     : {report['mean_abs_error']:.6g}")
+    print(f"Max abs error      : {report['max_abs_error']:.6g}")
+    print(f"RMS error          : {report['rms_error']:.6g}")
+    print(f"Max ULP distance   : {report['max_ulp']}")
+    print(f"SNR                : {snr} dB")
+    print("ULP histogram      : " + ", ".join(f"{k}: {v}" for k, v in report['ulp_histogram'].items()))
+
+    if report['mismatches'] and 'tile_map' in report:
+        tiles = np.array(report['tile_map']['mismatches'])
+        worst = np.argsort(tiles, axis=None)[::-1][:5]
+        tr, tc = report['tile_map']['tile']
+        print(f"Worst tiles ({tr}x{tc}): " + ", ".join(
+            f"({r},{c}): {tiles[r, c]}"
+            for r, c in zip(*np.unravel_index(worst, tiles.shape)) if tiles[r, c] > 0))
+    print("================================================")
 
 
 # ============================================================
 # Compare
 # ============================================================
+@timed('compare_files')
 def compare_files(
     golden,
     rtl,
     total_bits,
     frac_bits,
     signed=True,
-    max_print=10
+    max_print=10,
+    tile=(BLOCK_SIZE, BLOCK_SIZE),
+    file_index=None,
+    json_path=None
 ):
-    if len(golden) != len(rtl):
-        print(f"❌ Size mismatch: golden={len(golden)}, rtl={len(rtl)}")
+    golden = np.asarray(golden)
+    rtl = np.asarray(rtl)
+
+    if golden.size != rtl.size:
+        print(f"❌ Size mismatch: golden={golden.size}, rtl={rtl.size}")
         return False
+    if golden.shape != rtl.shape:
+        # same word count, different line layout: compare in file order
+        golden, rtl = golden.reshape(-1), rtl.reshape(-1)
 
-    mismatch_count = 0
-
-    total_error_percent = 0.0
-    max_error_percent = 0.0
-
-    for i, (g_hex, r_hex) in enumerate(zip(golden, rtl)):
-
-        # ----------------------------------------
-        # Convert to float
-        # ----------------------------------------
-        g_val = fixed_to_float(g_hex, total_bits, frac_bits, signed)
-        r_val = fixed_to_float(r_hex, total_bits, frac_bits, signed)
-
-        # ----------------------------------------
-        # Absolute error
-        # ----------------------------------------
-        abs_error = abs(r_val - g_val)
-
-        # ----------------------------------------
-        # Percentage error
-        #
-        # If golden == 0:
-        #   - exact match -> 0%
-        #   - otherwise -> 100%
-        # ----------------------------------------
-        if abs(g_val) < 1e-12:
-            if abs(r_val) < 1e-12:
-                percent_error = 0.0
-            else:
-                percent_error = 100.0
-        else:
-            percent_error = (abs_error / abs(g_val)) * 100.0
-
-        total_error_percent += percent_error
-
-        if percent_error > max_error_percent:
-            max_error_percent = percent_error
-
-        # ----------------------------------------
-        # Mismatch print
-        # ----------------------------------------
-        if g_hex != r_hex:
-
-            if mismatch_count < max_print:
-                print(
-                    f"[Mismatch {mismatch_count}] "
-                    f"idx={i} | "
-                    f"golden={g_hex} ({g_val:.6f}) | "
-                    f"rtl={r_hex} ({r_val:.6f}) | "
-                    f"error={percent_error:.4f}%"
-                )
-
-            mismatch_count += 1
-
-    # ========================================================
-    # Final statistics
-    # ========================================================
-    avg_error_percent = total_error_percent / len(golden)
+    report = compare_arrays(golden, rtl, total_bits, frac_bits, signed,
+                            tile=tile, max_report=max_print, file_index=file_index)
+    print_report(report, max_print)
 
-    print("\n================================================")
-    print("COMPARE SUMMARY")
-    print("================================================")
-    print(f"Total elements     : {len(golden)}")
-    print(f"Total mismatches   : {mismatch_count}")
-    print(f"Match percentage   : {(1 - mismatch_count/len(golden))*100:.4f}%")
-    print(f"Average error      : {avg_error_percent:.6f}%")
-    print(f"Maximum error      : {max_error_percent:.6f}%")
-    print("================================================")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2, allow_nan=False)
+        print(f"JSON report: {json_path}")
 
-    if mismatch_count == 0:
+    if report['mismatches'] == 0:
         print("✅ PERFECT MATCH")
         return True
     else:
@@ -153,6 +301,17 @@ def main():
     parser.add_argument('--unsigned', action='store_true')
 
     parser.add_argument('--max_print', type=int, default=10)
+    parser.add_argument('--json', default=None, help='Write the full report as JSON')
+
+    # Layout (for the per-row / per-tile maps)
+    parser.add_argument('--layout', choices=['row', 'c_v2'], default='row')
+    parser.add_argument('--tile', type=int, nargs=2, default=None, metavar=('ROWS', 'COLS'))
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--cols', type=int, default=None)
+    parser.add_argument('--cores_a', type=int, default=1)
+    parser.add_argument('--cores_b', type=int, default=1)
+    parser.add_argument('--total_input_w', type=int, default=2)
+    parser.add_argument('--total_modules', type=int, default=1)
 
     args = parser.parse_args()
 
@@ -160,11 +319,25 @@ def main():
 
     print("Loading files...")
 
-    golden_data = load_hex_file(args.golden)
-    rtl_data    = load_hex_file(args.rtl)
+    golden_data = load_hex_matrix(args.golden)
+    rtl_data    = load_hex_matrix(args.rtl)
+
+    print(f"Golden size: {golden_data.size}")
+    print(f"RTL size   : {rtl_data.size}")
+
+    tile = tuple(args.tile) if args.tile else (BLOCK_SIZE, BLOCK_SIZE)
+    file_index = None
 
-    print(f"Golden size: {len(golden_data)}")
-    print(f"RTL size   : {len(rtl_data)}")
+    if args.layout == 'c_v2' and golden_data.size == rtl_data.size:
+        if args.rows is None or args.cols is None:
+            parser.error("--layout c_v2 needs --rows and --cols")
+        geom = (args.rows, args.cols, args.cores_a, args.cores_b, args.total_input_w, args.total_modules)
+        file_index = c_v2_to_row_major(np.arange(golden_data.size), *geom)
+        golden_data = c_v2_to_row_major(golden_data, *geom)
+        rtl_data = c_v2_to_row_major(rtl_data, *geom)
+        if not args.tile:
+            tile = (args.cores_a * args.total_input_w * BLOCK_SIZE,
+                    args.cores_b * args.total_modules * BLOCK_SIZE)
 
     print("Comparing...")
 
@@ -174,9 +347,12 @@ def main():
         total_bits=args.total_bits,
         frac_bits=args.frac_bits,
         signed=signed,
-        max_print=args.max_print
+        max_print=args.max_print,
+        tile=tile,
+        file_index=file_index,
+        json_path=args.json
     )
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+fixed_matmul.py
+
+Integer-domain fixed-point matrix multiplication (no float round-trip).
+
+Datapaths:
+- exact : full-precision dot product, optionally wrapped to --acc_bits,
+          then one shift (truncate / round / even) + saturation to C
+- mac   : models multi_matmul (pe_v2 + saturate_v2 + accumulator_v3):
+            * every product is shifted (>>>) to C's fraction bits
+            * PE partial saturates to C width after each product of a block
+            * block partials are summed in an acc_bits wide register
+              (default WIDTH_OUT + clog2(INNER/BLOCK_SIZE) + 2)
+            * final saturation to C width
+
+Integer strategy:
+- int64 when every intermediate provably fits
+- B split into two int64 limbs (hi/lo) when products overflow int64,
+  recombined in Python ints (object arrays) only for the N x M result
+- plain object arrays, chunked by rows, as the last resort
+
+Inputs/outputs use the same encoding as FixedPointConverter.float_to_fixed
+(two's complement bit patterns stored in int64). Like np.matmul, stacked
+operands (..., N, K) x (..., K, M) are multiplied per matrix with
+broadcasting, so e.g. all heads of a multi-head model go in one call.
+"""
+import numpy as np
+
+ROUNDING_MODES = ('truncate', 'round', 'even')
+DATAPATHS = ('exact', 'mac')
+
+# Keep one bit of headroom below the int64 sign bit
+_SAFE_BITS = 62
+_OBJECT_CHUNK_ROWS = 64
+
+
+# ------------------------------------------------------------
+# Integer helpers (work on int64 and object ndarrays)
+# ------------------------------------------------------------
+def _max_bits(x: np.ndarray) -> int:
+    """Bit length of the largest magnitude in x"""
+    if x.size == 0:
+        return 0
+    return max(int(np.max(x)).bit_length(), int(-np.min(x)).bit_length())
+
+
+def shift_right(x: np.ndarray, shift: int, rounding: str = 'truncate') -> np.ndarray:
+    """Arithmetic shift by `shift` bits (left when negative) with the selected rounding"""
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"Unknown rounding mode '{rounding}'")
+    if shift <= 0:
+        return x << (-shift)
+
+    if rounding == 'truncate':
+        return x >> shift
+    if rounding == 'round':
+        return (x + (1 << (shift - 1))) >> shift
+
+    # round half to even
+    q = x >> shift
+    rem = x - (q << shift)
+    half = 1 << (shift - 1)
+    bump = (rem > half) | ((rem == half) & ((q & 1) == 1))
+    return q + bump.astype(np.int64)
+
+
+def wrap_signed(x: np.ndarray, bits: int) -> np.ndarray:
+    """Two's complement wrap of x to `bits` bits"""
+    if x.dtype != object and bits >= 63:
+        # int64 paths never hold values that wide
+        return x
+    sign = 1 << (bits - 1)
+    return ((x & ((1 << bits) - 1)) ^ sign) - sign
+
+
+def _range_of(conv):
+    return conv.min_int, conv.max_int
+
+
+def _encode(x: np.ndarray, conv) -> np.ndarray:
+    """Saturated/wrapped signed values -> FixedPointConverter encoding in int64"""
+    out = np.asarray(x).astype(np.int64)
+    if conv.is_signed:
+        out &= (1 << conv.total_bits) - 1
+    return out
+
+
+def requantize(acc: np.ndarray, frac_in: int, conv_C, rounding: str = 'truncate',
+               saturate: bool = True) -> np.ndarray:
+    """Shift an accumulator with frac_in fraction bits into conv_C's format"""
+    shifted = shift_right(acc, frac_in - conv_C.fractional_bits, rounding)
+    lo, hi = _range_of(conv_C)
+    if saturate:
+        shifted = np.minimum(np.maximum(shifted, lo), hi)
+    elif conv_C.is_signed:
+        shifted = wrap_signed(shifted, conv_C.total_bits)
+    else:
+        shifted = shifted & ((1 << conv_C.total_bits) - 1)
+    return _encode(shifted, conv_C)
+
+
+# ------------------------------------------------------------
+# Exact dot products
+# ------------------------------------------------------------
+def _result_shape(A: np.ndarray, B: np.ndarray) -> tuple:
+    """Shape of A @ B (stack dimensions broadcast)"""
+    return np.broadcast_shapes(A.shape[:-2], B.shape[:-2]) + (A.shape[-2], B.shape[-1])
+
+
+def _object_matmul(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """Python-int matmul, chunked by rows to bound temporary size"""
+    B_o = B.astype(object)
+    out = np.empty(_result_shape(A, B), dtype=object)
+    for r in range(0, A.shape[-2], _OBJECT_CHUNK_ROWS):
+        out[..., r:r+_OBJECT_CHUNK_ROWS, :] = A[..., r:r+_OBJECT_CHUNK_ROWS, :].astype(object) @ B_o
+    return out
+
+
+def exact_dot(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """
+    Exact A @ B for signed int64 inputs.
+    Returns int64 when the result provably fits, otherwise an object array.
+    """
+    a_bits = _max_bits(A)
+    b_bits = _max_bits(B)
+    k_total = A.shape[-1]
+
+    if a_bits + b_bits + k_total.bit_length() <= _SAFE_BITS:
+        return A @ B
+
+    # Split B = B_hi * 2^L + B_lo with 0 <= B_lo < 2^L and chunk K so both
+    # partial matmuls stay in int64
+    L = (b_bits + 1) // 2
+    k_bits = _SAFE_BITS - a_bits - max(L, b_bits - L + 1)
+    if k_bits < 1:
+        return _object_matmul(A, B)
+
+    k_chunk = 1 << (k_bits - 1)
+    B_hi = B >> L
+    B_lo = B & ((1 << L) - 1)
+
+    total = None
+    for k in range(0, k_total, k_chunk):
+        A_k = A[..., k:k+k_chunk]
+        hi = (A_k @ B_hi[..., k:k+k_chunk, :]).astype(object)
+        lo = (A_k @ B_lo[..., k:k+k_chunk, :]).astype(object)
+        part = (hi << L) + lo
+        total = part if total is None else total + part
+    return total
+
+
+# ------------------------------------------------------------
+# MAC datapath (multi_matmul model)
+# ------------------------------------------------------------
+def _shifted_outer(a: np.ndarray, b: np.ndarray, shift: int, rounding: str) -> np.ndarray:
+    """shift_right(outer(a, b), shift) without overflowing int64 where possible
+    (a: (..., N), b: (..., M) -> (..., N, M))"""
+    a_bits = _max_bits(a)
+    b_bits = _max_bits(b)
+    a = a[..., :, None]
+    b = b[..., None, :]
+
+    if a_bits + b_bits <= _SAFE_BITS:
+        return shift_right(a * b, shift, rounding)
+
+    # Limb form: a*b = a*b_hi*2^L + a*b_lo, floor((X*2^L + Y) / 2^s)
+    #          = floor((X + floor(Y / 2^L)) / 2^(s-L))   for L <= s
+    L = min(shift, b_bits // 2)
+    if (rounding != 'even' and L > 0 and a_bits + b_bits - L + 1 <= _SAFE_BITS
+            and a_bits + L <= _SAFE_BITS):
+        b_hi = b >> L
+        b_lo = b & ((1 << L) - 1)
+        X = a * b_hi
+        Y = a * b_lo
+        if rounding == 'round':
+            half = 1 << (shift - 1)
+            if shift - 1 >= L:
+                X = X + (half >> L)
+            else:
+                Y = Y + half
+        return (X + (Y >> L)) >> (shift - L)
+
+    prod = a.astype(object) * b.astype(object)
+    return shift_right(prod, shift, rounding).astype(np.int64)
+
+
+def default_acc_bits(conv_C, k_total: int, block_size: int = 2) -> int:
+    """accumulator_v3 width: WIDTH_OUT + clog2(INNER / BLOCK_SIZE) + 2"""
+    return conv_C.total_bits + (k_total // block_size - 1).bit_length() + 2
+
+
+def mac_dot(A: np.ndarray, B: np.ndarray, frac_a: int, frac_b: int, conv_C,
+            rounding: str = 'truncate', acc_bits: int = None,
+            block_size: int = 2, acc: np.ndarray = None) -> np.ndarray:
+    """
+    Model of the systolic MAC: returns the signed accumulator (before final
+    saturation) as int64, in conv_C's fraction bits.
+    acc continues a previous accumulator (inner dimension split into
+    consecutive pieces); acc_bits should then be the full dimension's width.
+    """
+    k_total = A.shape[-1]
+    if k_total % block_size != 0:
+        raise ValueError(f"Inner dimension ({k_total}) must be divisible by block_size ({block_size})")
+
+    if acc_bits is None:
+        acc_bits = default_acc_bits(conv_C, k_total, block_size)
+
+    shift = frac_a + frac_b - conv_C.fractional_bits
+    lo, hi = _range_of(conv_C)
+
+    if acc is None:
+        acc = np.zeros(_result_shape(A, B), dtype=np.int64)
+    for k0 in range(0, k_total, block_size):
+        # PE: partial sum of one block, saturated after every product
+        partial = np.zeros_like(acc)
+        for k in range(k0, k0 + block_size):
+            partial = np.clip(partial + _shifted_outer(A[..., k], B[..., k, :], shift, rounding), lo, hi)
+        # Accumulator: block partials in an acc_bits wide register
+        acc = wrap_signed(acc + partial, acc_bits)
+    return acc
+
+
+# ------------------------------------------------------------
+# Public entry point
+# ------------------------------------------------------------
+def fixed_matmul(A: np.ndarray, B: np.ndarray, conv_A, conv_B, conv_C,
+                 datapath: str = 'exact', rounding: str = 'truncate',
+                 saturate: bool = True, acc_bits: int = None,
+                 block_size: int = 2) -> np.ndarray:
+    """
+    Multiply fixed-point matrices entirely in the integer domain.
+    A, B, and the result use the FixedPointConverter encoding.
+    """
+    if datapath not in DATAPATHS:
+        raise ValueError(f"Unknown datapath '{datapath}'")
+
+    A_s = conv_A.sign_extend_array(A)
+    B_s = conv_B.sign_extend_array(B)
+
+    if A_s.shape[-1] != B_s.shape[-2]:
+        raise ValueError(f"Matrix dimension mismatch: {A_s.shape} x {B_s.shape}")
+
+    if datapath == 'mac':
+        acc = mac_dot(A_s, B_s, conv_A.fractional_bits, conv_B.fractional_bits, conv_C,
+                      rounding=rounding, acc_bits=acc_bits, block_size=block_size)
+        return requantize(acc, conv_C.fractional_bits, conv_C, 'truncate', saturate)
+
+    acc = exact_dot(A_s, B_s)
+    if acc_bits is not None:
+        acc = wrap_signed(acc, acc_bits)
+    return requantize(acc, conv_A.fractional_bits + conv_B.fractional_bits, conv_C,
+                      rounding, saturate)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+fused_attention.py
+
+Fused softmax(Q x K^T / div) x V golden path. Scores are produced one
+(query tile x key tile) block at a time and folded straight into the
+output, so the rows x rows score / softmax matrices are never stored:
+memory is O(rows * proj_dim) plus one score tile.
+
+Variants:
+- real : online softmax in float64 (flash-attention style running max /
+         running sum rescaling). Scores are the fixed-point Q_KT words of the
+         pipeline; the probabilities stay unquantized, so this is the ideal
+         reference for softmax_mode='real' (the pipeline additionally rounds
+         softmax to soft_total_bits before the final matmul).
+- rtl  : bit-exact with run_golden_pipeline for softmax_mode='rtl'. The LUT
+         exp / ln of softmax.py cannot be rescaled exactly, so the key tiles
+         are swept three times, recomputing the score tile each time:
+            pass 0: row max
+            pass 1: sum of exp(x - max) (48-bit saturating)
+            pass 2: p = exp(x - max - ln(sum)) quantized to the softmax
+                    format and accumulated into the final matmul
+         The final matmul carries its accumulator across key tiles in the
+         selected engine's order (float blocks / exact integer sum / MAC
+         register), so the result matches block_matmul on the full matrix.
+
+    from golden_pipeline import PipelineConfig
+    from fused_attention import run_fused_pipeline
+    results = run_fused_pipeline(cfg, out_dir="exports")
+"""
+import os
+import numpy as np
+
+from golden_pipeline import (PipelineConfig, linear_projection_stage, _TiledExport,
+                             _check_divisible, TOTAL_INPUT_W, DIV_VALUE)
+from block_matmul import block_matmul, float_block_accumulate, BLOCK_SIZE
+from fixed_matmul import exact_dot, mac_dot, requantize, default_acc_bits
+import softmax as softmax_rtl
+from instrument import timed
+
+DEFAULT_KEY_TILE = 256
+
+
+# ----------------------------------
+# Tiling helpers
+# ----------------------------------
+def _key_tiles(n_keys: int, key_tile: int):
+    if key_tile % BLOCK_SIZE != 0:
+        raise ValueError(f"key_tile must be a multiple of block_size ({BLOCK_SIZE})")
+    return [(k0, min(k0 + key_tile, n_keys)) for k0 in range(0, n_keys, key_tile)]
+
+
+def _scores(cfg: PipelineConfig, Q_t: np.ndarray, K: np.ndarray, k0: int, k1: int) -> np.ndarray:
+    """Q_KT words of one (query tile, key tile) block"""
+    return block_matmul(Q_t, K[k0:k1].T, cfg.conv_keys, cfg.conv_keys, cfg.conv_qkt,
+                        engine=cfg.matmul_engine)
+
+
+# ----------------------------------
+# Real: online softmax
+# ----------------------------------
+def online_softmax_attention(Q_t: np.ndarray, V_f: np.ndarray, score_tile, key_tiles) -> np.ndarray:
+    """
+    softmax(S) x V with running max / sum rescaling.
+    score_tile(k0, k1) returns the float scores of one key tile.
+    """
+    rows = Q_t.shape[0]
+    m = np.full((rows, 1), -np.inf)
+    l = np.zeros((rows, 1))
+    acc = np.zeros((rows, V_f.shape[1]))
+
+    for k0, k1 in key_tiles:
+        s = score_tile(k0, k1)
+        m_new = np.maximum(m, s.max(axis=1, keepdims=True))
+        alpha = np.exp(m - m_new)
+        p = np.exp(s - m_new)
+        l = l * alpha + p.sum(axis=1, keepdims=True)
+        acc = acc * alpha + p @ V_f[k0:k1]
+        m = m_new
+
+    return acc / l
+
+
+@timed('fused_attention_real')
+def fused_attention_real(cfg: PipelineConfig, Q: np.ndarray, K: np.ndarray, V: np.ndarray,
+                         query_tile: int, key_tile: int = DEFAULT_KEY_TILE) -> np.ndarray:
+    """Ideal softmax(Q_KT / div) x V, quantized once to the final format"""
+    V_f = cfg.conv_keys.fixed_to_float_array(V)
+    tiles = _key_tiles(K.shape[0], key_tile)
+    out = np.empty((Q.shape[0], V.shape[1]), dtype=np.int64)
+
+    for r0 in range(0, Q.shape[0], query_tile):
+        Q_t = Q[r0:r0+query_tile]
+        score_tile = lambda k0, k1: \
+            cfg.conv_qkt.fixed_to_float_array(_scores(cfg, Q_t, K, k0, k1)) / float(DIV_VALUE)
+        out_f = online_softmax_attention(Q_t, V_f, score_tile, tiles)
+        out[r0:r0+query_tile] = cfg.conv_final.float_to_fixed_array(out_f)
+    return out
+
+
+# ----------------------------------
+# RTL: multi-pass LUT softmax
+# ----------------------------------
+def _rtl_softmax_input(cfg: PipelineConfig, qkt: np.ndarray) -> np.ndarray:
+    """Q_KT words -> softmax.py's Q16.16 input (sign-extend, div, Qm.n -> Q16.16)"""
+    if cfg.softmax_tables is not None:
+        return cfg.softmax_tables.to_q16(qkt, cfg.conv_qkt.fractional_bits, DIV_VALUE, cfg.conv_qkt.total_bits)
+    return softmax_rtl.rshift_to_q16_array(qkt, cfg.conv_qkt.fractional_bits, DIV_VALUE, cfg.conv_qkt.total_bits)
+
+
+@timed('fused_attention_rtl')
+def fused_attention_rtl(cfg: PipelineConfig, Q: np.ndarray, K: np.ndarray, V: np.ndarray,
+                        query_tile: int, key_tile: int = DEFAULT_KEY_TILE) -> np.ndarray:
+    """Bit-exact softmax.py + block_matmul(softmax, V), without the score matrix"""
+    n_keys = K.shape[0]
+    tiles = _key_tiles(n_keys, key_tile)
+    conv_S, conv_V, conv_C = cfg.conv_soft, cfg.conv_keys, cfg.conv_final
+    width_out, frac_out = conv_S.total_bits, conv_S.fractional_bits
+
+    V_s = conv_V.sign_extend_array(V)
+    V_f = conv_V.fixed_to_float_array(V) if cfg.matmul_engine == 'float' else None
+    acc_bits = default_acc_bits(conv_C, n_keys, BLOCK_SIZE)
+    out = np.empty((Q.shape[0], V.shape[1]), dtype=np.int64)
+    exp = cfg.softmax_tables.exp_q16 if cfg.softmax_tables is not None else softmax_rtl.exp_q16_array
+
+    for r0 in range(0, Q.shape[0], query_tile):
+        Q_t = Q[r0:r0+query_tile]
+        x_tile = lambda k0, k1: _rtl_softmax_input(cfg, _scores(cfg, Q_t, K, k0, k1))
+
+        # PASS 0: max
+        max_val = None
+        for k0, k1 in tiles:
+            m = x_tile(k0, k1).max(axis=1, keepdims=True)
+            max_val = m if max_val is None else np.maximum(max_val, m)
+
+        # PASS 1: exp + sum (non-negative terms: saturate once at the end)
+        sum_exp = 0
+        for k0, k1 in tiles:
+            sum_exp = sum_exp + exp(x_tile(k0, k1) - max_val).sum(axis=1, keepdims=True)
+        ln_sum = softmax_rtl.lnu_q16_array(np.minimum(sum_exp, softmax_rtl.SUM_MASK))
+
+        # PASS 2: probabilities x V, accumulated across key tiles
+        acc = None
+        for k0, k1 in tiles:
+            p = exp(x_tile(k0, k1) - max_val - ln_sum)
+            S = softmax_rtl.from_q16_to_qx_array(p, frac_out, width_out) & ((1 << width_out) - 1)
+
+            if cfg.matmul_engine == 'float':
+                if acc is None:
+                    acc = np.zeros((Q_t.shape[0], V.shape[1]), dtype=np.float64)
+                float_block_accumulate(acc, conv_S.fixed_to_float_array(S), V_f[k0:k1])
+            elif cfg.matmul_engine == 'mac':
+                acc = mac_dot(conv_S.sign_extend_array(S), V_s[k0:k1],
+                              conv_S.fractional_bits, conv_V.fractional_bits, conv_C,
+                              acc_bits=acc_bits, block_size=BLOCK_SIZE, acc=acc)
+            else:
+                part = exact_dot(conv_S.sign_extend_array(S), V_s[k0:k1])
+                acc = part if acc is None else acc + part
+
+        if cfg.matmul_engine == 'float':
+            out[r0:r0+query_tile] = conv_C.float_to_fixed_array(acc)
+        elif cfg.matmul_engine == 'mac':
+            out[r0:r0+query_tile] = requantize(acc, conv_C.fractional_bits, conv_C)
+        else:
+            out[r0:r0+query_tile] = requantize(acc, conv_S.fractional_bits + conv_V.fractional_bits, conv_C)
+    return out
+
+
+# ----------------------------------
+# Pipeline
+# ----------------------------------
+@timed('fused_pipeline')
+def run_fused_pipeline(cfg: PipelineConfig, out_dir: str = None, verbose: bool = False,
+                       groups_per_tile: int = 1, key_tile: int = DEFAULT_KEY_TILE) -> dict:
+    """
+    Linear projection + fused attention. Writes the projection artifacts and
+    final_results.mem (+ _row); Q_KT.mem / softmax_results.mem do not exist
+    in this mode.
+    """
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    results = linear_projection_stage(cfg, out_dir, verbose)
+    Q, K, V = results['Q'], results['K'], results['V']
+    _check_divisible(Q.shape[0], V.shape[1], cfg.cores_a, cfg.total_modules, TOTAL_INPUT_W, 1)
+
+    query_tile = cfg.cores_a * TOTAL_INPUT_W * BLOCK_SIZE * groups_per_tile
+    fused = fused_attention_rtl if cfg.softmax_mode == 'rtl' else fused_attention_real
+    FINAL = fused(cfg, Q, K, V, query_tile, key_tile)
+
+    if out_dir:
+        final_out = _TiledExport(os.path.join(out_dir, "final_results.mem"), cfg.conv_final,
+                                 cfg.cores_a, cfg.total_modules, 1)
+        try:
+            final_out.write(FINAL)
+        finally:
+            final_out.close()
+
+    results['final'] = FINAL
+    return results
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+golden_cache.py
+
+Content-addressed cache for golden-model stage outputs.
+
+Every stage result (a dict of ndarrays) is stored under the sha256 of the
+stage name, the parameters that determine its values and the keys of the
+stages it consumes, so a key changes whenever anything upstream changes.
+Entries are .npz files; the cache is bounded in size and evicts the least
+recently used entries (file mtime is refreshed on every hit). Several
+processes may share one root: an entry another process evicts in the
+meantime is simply a miss.
+
+    cache = GoldenCache("golden_cache", max_bytes=1 << 30)
+    key = stage_key("projection", {"rows": 16, "seed": 1})
+    arrays = cache.load(key)
+    if arrays is None:
+        arrays = compute()
+        cache.store(key, arrays)
+
+Bump CACHE_VERSION whenever the math or the random generation of a stage
+changes, so old entries stop matching.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+
+CACHE_VERSION = 2
+DEFAULT_MAX_BYTES = 2 << 30
+
+
+def stage_key(stage: str, params: dict, parents=()) -> str:
+    """sha256 over the version salt, stage name, parameters and parent keys"""
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'stage': stage,
+        'params': params,
+        'parents': list(parents),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GoldenCache:
+    """Size-bounded LRU store of ndarray dicts keyed by stage_key()"""
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.npz")
+
+    def load(self, key: str):
+        """Arrays stored under key, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            # includes FileNotFoundError: missing or evicted by another process
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def store(self, key: str, arrays: dict):
+        """Write arrays (atomically) and evict down to max_bytes"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def entries(self):
+        """[(mtime, size, path)] of every entry, oldest first"""
+        out = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue    # evicted by another process
+                    out.append((st.st_mtime, st.st_size, path))
+        return sorted(out)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep: str = None):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+golden_pipeline.py
+
+In-process golden model of the self-attention pipeline. Same math and the
+same .mem artifacts as pipeline_runner.py's subprocess chain
+(matrix_multiplier.py -> block_matmul.py -> softmax(_real).py -> block_matmul.py),
+but ndarrays are handed directly from one stage to the next; .mem files are
+only written as a side output when an output directory is given.
+
+    from golden_pipeline import PipelineConfig, run_golden_pipeline
+    cfg = PipelineConfig(rows=16, cols=10, proj_dim=12, cores_a=2, total_modules=2)
+    results = run_golden_pipeline(cfg, out_dir="exports")
+    results['final']   # row-major fixed-point ndarray
+
+run_streaming_pipeline() produces the same artifacts for long sequences:
+Q x K^T, softmax and softmax x V are computed one row tile
+(cores_a * total_input_w * block_size rows) at a time and appended to the
+.mem files, so the rows x rows intermediates never exist in full.
+"""
+import os
+import numpy as np
+
+from matrix_multiplier import FixedPointConverter, MatrixProcessor, matrix_rng, resolve_seed, parse_matrix_seeds
+from block_matmul import block_matmul, BLOCK_SIZE
+from mem_codec import encode_lines, write_lines
+from block_layout import get_layout
+from golden_cache import stage_key
+from instrument import count, stage, timed
+import softmax as softmax_rtl
+import softmax_real
+
+# Layout parameters fixed by the pipeline (see pipeline_runner.py)
+TOTAL_INPUT_W = 2
+QKT_TOTAL_MODULES = 2
+DIV_VALUE = 16
+
+# Stage names of run_golden_pipeline (cache keys, `until`)
+GOLDEN_STAGES = ('projection', 'qkt', 'softmax', 'final')
+
+
+# ----------------------------------
+# Configuration
+# ----------------------------------
+class PipelineConfig:
+    """Shapes, core layout and precisions of one golden-model run"""
+    def __init__(self, rows: int, cols: int, proj_dim: int,
+                 cores_a: int, total_modules: int,
+                 min_val: int = 0, max_val: int = 1,
+                 softmax_mode: str = 'rtl', matmul_engine: str = 'float',
+                 input_total_bits: int = 16, input_frac_bits: int = 8,
+                 weight_total_bits: int = 16, weight_frac_bits: int = 8,
+                 keys_total_bits: int = 16, keys_frac_bits: int = 8,
+                 qkt_total_bits: int = 16, qkt_frac_bits: int = 8,
+                 soft_total_bits: int = 8, soft_frac_bits: int = 7,
+                 final_total_bits: int = 8, final_frac_bits: int = 7,
+                 seed: int = None, matrix_seeds: dict = None, softmax_tables=None):
+        self.rows = rows
+        self.cols = cols
+        self.proj_dim = proj_dim
+        self.cores_a = cores_a
+        self.total_modules = total_modules
+        self.min_val = min_val
+        self.max_val = max_val
+        self.softmax_mode = softmax_mode
+        self.matmul_engine = matmul_engine
+        self.seed = seed
+        self.matrix_seeds = dict(matrix_seeds or {})
+        # softmax.SoftmaxTables for the rtl softmax (lookups, same results)
+        self.softmax_tables = softmax_tables
+
+        self.conv_input = FixedPointConverter(input_total_bits, input_frac_bits)
+        self.conv_weight = FixedPointConverter(weight_total_bits, weight_frac_bits)
+        self.conv_keys = FixedPointConverter(keys_total_bits, keys_frac_bits)
+        self.conv_qkt = FixedPointConverter(qkt_total_bits, qkt_frac_bits)
+        self.conv_soft = FixedPointConverter(soft_total_bits, soft_frac_bits)
+        self.conv_final = FixedPointConverter(final_total_bits, final_frac_bits)
+
+    @classmethod
+    def from_args(cls, args):
+        """Build from pipeline_runner's argparse namespace"""
+        return cls(
+            rows=args.rows, cols=args.cols, proj_dim=args.proj_dim,
+            cores_a=args.cores_a, total_modules=args.total_modules,
+            min_val=args.min_val, max_val=args.max_val,
+            softmax_mode=args.softmax_mode, matmul_engine=args.matmul_engine,
+            input_total_bits=args.input_total_bits, input_frac_bits=args.input_frac_bits,
+            weight_total_bits=args.weight_total_bits, weight_frac_bits=args.weight_frac_bits,
+            keys_total_bits=args.keys_total_bits, keys_frac_bits=args.keys_frac_bits,
+            qkt_total_bits=args.qkt_total_bits, qkt_frac_bits=args.qkt_frac_bits,
+            soft_total_bits=args.soft_total_bits, soft_frac_bits=args.soft_frac_bits,
+            final_total_bits=args.final_total_bits, final_frac_bits=args.final_frac_bits,
+            seed=getattr(args, 'seed', None),
+            matrix_seeds=parse_matrix_seeds(getattr(args, 'matrix_seed', None)),
+        )
+
+    def stage_keys(self) -> dict:
+        """
+        Cache key of every stage (see golden_cache.py). Only what determines
+        the values goes in: the core layout changes the .mem word order, not
+        the results, so cores are left out and exports are redone from the
+        cached arrays. None when unseeded (random inputs are not reproducible).
+        """
+        if self.seed is None:
+            return None
+
+        def fmt(conv):
+            return [conv.total_bits, conv.fractional_bits]
+
+        proj = stage_key('projection', {
+            'rows': self.rows, 'cols': self.cols, 'proj_dim': self.proj_dim,
+            'min_val': self.min_val, 'max_val': self.max_val,
+            'seed': self.seed, 'matrix_seeds': self.matrix_seeds,
+            'input': fmt(self.conv_input), 'weight': fmt(self.conv_weight), 'keys': fmt(self.conv_keys),
+            'matmul_engine': self.matmul_engine,
+        })
+        qkt = stage_key('qkt', {'qkt': fmt(self.conv_qkt), 'matmul_engine': self.matmul_engine}, [proj])
+        soft = stage_key('softmax', {'softmax_mode': self.softmax_mode, 'div': DIV_VALUE,
+                                     'rshift': 'sign_extend', 'soft': fmt(self.conv_soft)}, [qkt])
+        final = stage_key('final', {'final': fmt(self.conv_final), 'matmul_engine': self.matmul_engine},
+                          [soft, proj])
+        return {'projection': proj, 'qkt': qkt, 'softmax': soft, 'final': final}
+
+    def processor(self, cores_a: int, cores_b: int) -> MatrixProcessor:
+        p = MatrixProcessor()
+        p.cores_a = cores_a
+        p.cores_b = cores_b
+        p.block_size = BLOCK_SIZE
+        p.matmul_engine = self.matmul_engine
+        return p
+
+
+def _check_divisible(rows: int, cols: int, cores_a: int, cores_b: int,
+                     total_input_w: int, total_modules: int):
+    if rows % (cores_a * total_input_w * BLOCK_SIZE) != 0:
+        raise ValueError("Rows not divisible by cores_a × total_input_w × block_size")
+    if cols % (cores_b * total_modules * BLOCK_SIZE) != 0:
+        raise ValueError("Cols not divisible by cores_b × total_modules × block_size")
+
+
+def _export_c(processor: MatrixProcessor, matrix: np.ndarray, conv: FixedPointConverter,
+              filename: str, total_modules: int, verbose: bool):
+    """RTL (C v2) export plus the row-major *_row companion"""
+    processor.export_matrix_C_v2(matrix, conv, filename,
+                                 block_size=BLOCK_SIZE,
+                                 total_input_w=TOTAL_INPUT_W,
+                                 total_modules=total_modules,
+                                 output_format='hex',
+                                 debug_print=verbose)
+    base, ext = os.path.splitext(filename)
+    write_lines(f"{base}_row{ext}", matrix, conv.total_bits, 'hex')
+
+
+# ----------------------------------
+# STEP 1: LINEAR PROJECTION
+# ----------------------------------
+@timed('linear_projection')
+def linear_projection_stage(cfg: PipelineConfig, out_dir: str = None, verbose: bool = False) -> dict:
+    """
+    Random input/weights (same per-matrix Generators as matrix_multiplier.py
+    --unique_per_type --integers, so a given seed gives the same matrices) and Q/K/V.
+    An unseeded config draws a seed and stores it in cfg.seed.
+    """
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    cfg.seed = resolve_seed(cfg.seed)
+
+    A = processor.create_matrix(cfg.rows, cfg.cols, cfg.min_val, cfg.max_val, cfg.conv_input, True,
+                                matrix_rng(cfg.seed, 'input', 0, cfg.matrix_seeds))
+    Wq, Wk, Wv = (processor.create_matrix(cfg.cols, cfg.proj_dim, cfg.min_val, cfg.max_val, cfg.conv_weight, True,
+                                          matrix_rng(cfg.seed, name, 0, cfg.matrix_seeds))
+                  for name in ('wq', 'wk', 'wv'))
+
+    Q = processor.multiply_matrices(A, Wq, cfg.conv_input, cfg.conv_weight, cfg.conv_keys)
+    K = processor.multiply_matrices(A, Wk, cfg.conv_input, cfg.conv_weight, cfg.conv_keys)
+    V = processor.multiply_matrices(A, Wv, cfg.conv_input, cfg.conv_weight, cfg.conv_keys)
+
+    results = {'A': A, 'Wq': Wq, 'Wk': Wk, 'Wv': Wv, 'Q': Q, 'K': K, 'V': V}
+    if out_dir:
+        export_projection(cfg, results, out_dir, verbose)
+    return results
+
+
+@timed('export_projection')
+def export_projection(cfg: PipelineConfig, results: dict, out_dir: str, verbose: bool = False):
+    """mem_input / mem_{q,k,v}1 / mem_out_{q,k,v}1 (+ _row)"""
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    A, Wq, Wk, Wv = results['A'], results['Wq'], results['Wk'], results['Wv']
+    Q, K, V = results['Q'], results['K'], results['V']
+
+    processor.export_matrix(A, cfg.conv_input, os.path.join(out_dir, "mem_input.mem"),
+                            mode='core', block_size=BLOCK_SIZE, num_cores=cfg.cores_a, matrix_type='A')
+    for name, W in (('q', Wq), ('k', Wk), ('v', Wv)):
+        processor.export_matrix(W, cfg.conv_weight, os.path.join(out_dir, f"mem_{name}1.mem"),
+                                mode='core', block_size=BLOCK_SIZE, num_cores=cfg.total_modules,
+                                matrix_type='B')
+    for name, M in (('q', Q), ('k', K), ('v', V)):
+        _export_c(processor, M, cfg.conv_keys, os.path.join(out_dir, f"mem_out_{name}1.mem"),
+                  total_modules=1, verbose=verbose)
+
+
+# ----------------------------------
+# STEP 2: Q × K^T
+# ----------------------------------
+@timed('qkt')
+def qkt_stage(cfg: PipelineConfig, Q: np.ndarray, K: np.ndarray,
+              out_dir: str = None, verbose: bool = False) -> np.ndarray:
+    B = np.swapaxes(K, -1, -2)
+    _check_divisible(Q.shape[-2], B.shape[-1], cfg.cores_a, cfg.cores_a, TOTAL_INPUT_W, QKT_TOTAL_MODULES)
+
+    QKT = block_matmul(Q, B, cfg.conv_keys, cfg.conv_keys, cfg.conv_qkt, engine=cfg.matmul_engine)
+
+    if out_dir:
+        export_qkt(cfg, QKT, out_dir, verbose)
+    return QKT
+
+
+@timed('export_qkt')
+def export_qkt(cfg: PipelineConfig, QKT: np.ndarray, out_dir: str, verbose: bool = False):
+    processor = cfg.processor(cfg.cores_a, cfg.cores_a)
+    _export_c(processor, QKT, cfg.conv_qkt, os.path.join(out_dir, "Q_KT.mem"),
+              total_modules=QKT_TOTAL_MODULES, verbose=verbose)
+
+
+# ----------------------------------
+# STEP 3: SOFTMAX
+# ----------------------------------
+@timed('softmax')
+def softmax_stage(cfg: PipelineConfig, QKT: np.ndarray, out_dir: str = None) -> np.ndarray:
+    """
+    Softmax of the raw Q_KT words. The result holds the words block_matmul
+    would read back from softmax_results.mem (masked to soft_total_bits).
+    """
+    width_out = cfg.conv_soft.total_bits
+    frac_out = cfg.conv_soft.fractional_bits
+
+    if cfg.softmax_mode == 'rtl':
+        out = softmax_rtl.softmax_matrix_wrapper(QKT, cfg.conv_qkt.fractional_bits, frac_out, width_out,
+                                                 apply_div=True, div_val=DIV_VALUE,
+                                                 width_in=cfg.conv_qkt.total_bits, tables=cfg.softmax_tables)
+    else:
+        x = softmax_real.fixed_matrix_to_float(QKT, cfg.conv_qkt) / float(DIV_VALUE)
+        out = softmax_real.float_matrix_to_fixed(softmax_real.softmax_real(x), cfg.conv_soft)
+
+    out &= (1 << width_out) - 1
+
+    if out_dir:
+        export_softmax(cfg, out, out_dir)
+    return out
+
+
+@timed('export_softmax')
+def export_softmax(cfg: PipelineConfig, S: np.ndarray, out_dir: str):
+    data = _encode_softmax(cfg, S)
+    with open(os.path.join(out_dir, "softmax_results.mem"), 'wb') as f:
+        f.write(data)
+    count('elements_exported', S.size)
+    count('bytes_written', len(data))
+
+
+def _encode_softmax(cfg: PipelineConfig, out: np.ndarray) -> bytes:
+    """softmax_results.mem text as softmax.py / softmax_real.py write it"""
+    if cfg.softmax_mode == 'rtl':
+        return softmax_rtl.encode_hex_matrix(out, cfg.conv_soft.total_bits)
+    return encode_lines(out, cfg.conv_soft.total_bits, 'hex')
+
+
+# ----------------------------------
+# STEP 4: SOFTMAX × V
+# ----------------------------------
+@timed('softmax_v')
+def softmax_v_stage(cfg: PipelineConfig, S: np.ndarray, V: np.ndarray,
+                    out_dir: str = None, verbose: bool = False) -> np.ndarray:
+    _check_divisible(S.shape[-2], V.shape[-1], cfg.cores_a, cfg.total_modules, TOTAL_INPUT_W, 1)
+
+    FINAL = block_matmul(S, V, cfg.conv_soft, cfg.conv_keys, cfg.conv_final, engine=cfg.matmul_engine)
+
+    if out_dir:
+        export_final(cfg, FINAL, out_dir, verbose)
+    return FINAL
+
+
+@timed('export_final')
+def export_final(cfg: PipelineConfig, FINAL: np.ndarray, out_dir: str, verbose: bool = False):
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    _export_c(processor, FINAL, cfg.conv_final, os.path.join(out_dir, "final_results.mem"),
+              total_modules=1, verbose=verbose)
+
+
+# ----------------------------------
+# Full pipeline
+# ----------------------------------
+@timed('golden_pipeline')
+def run_golden_pipeline(cfg: PipelineConfig, out_dir: str = None, verbose: bool = False,
+                        cache=None, until: str = None) -> dict:
+    """
+    Run all four stages in-process. Returns every intermediate ndarray;
+    writes the .mem artifacts only when out_dir is given.
+    With a GoldenCache (and cfg.seed set) each stage is looked up first and
+    only recomputed on a miss; artifacts are always re-exported.
+    until: stop after that stage (one of GOLDEN_STAGES); nothing is exported.
+    """
+    if until is not None and until not in GOLDEN_STAGES:
+        raise ValueError(f"until must be one of {GOLDEN_STAGES}")
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    keys = cfg.stage_keys() if cache is not None else None
+
+    def cached(name, compute):
+        if keys is None:
+            return compute()
+        arrays = cache.load(keys[name])
+        if arrays is None:
+            arrays = compute()
+            cache.store(keys[name], arrays)
+        else:
+            count('cache_hits')
+        return arrays
+
+    steps = (
+        ('projection', lambda r: linear_projection_stage(cfg)),
+        ('qkt', lambda r: {'qkt': qkt_stage(cfg, r['Q'], r['K'])}),
+        ('softmax', lambda r: {'softmax': softmax_stage(cfg, r['qkt'])}),
+        ('final', lambda r: {'final': softmax_v_stage(cfg, r['softmax'], r['V'])}),
+    )
+    results = {}
+    for name, compute in steps:
+        results.update(cached(name, lambda: compute(results)))
+        if name == until:
+            return results
+
+    if out_dir:
+        export_projection(cfg, results, out_dir, verbose)
+        export_qkt(cfg, results['qkt'], out_dir, verbose)
+        export_softmax(cfg, results['softmax'], out_dir)
+        export_final(cfg, results['final'], out_dir, verbose)
+    return results
+
+
+# ----------------------------------
+# Streaming (row tiled) pipeline
+# ----------------------------------
+class _TiledExport:
+    """
+    C v2 export plus *_row companion, appended one row tile at a time.
+    Row groups are the outermost C v2 loop, so the lines of consecutive
+    row tiles simply follow each other in the file.
+    """
+    def __init__(self, filename: str, conv: FixedPointConverter,
+                 cores_a: int, cores_b: int, total_modules: int):
+        base, ext = os.path.splitext(filename)
+        self.conv = conv
+        self.geometry = (BLOCK_SIZE, cores_a, cores_b, TOTAL_INPUT_W, total_modules)
+        self.f_c = open(filename, 'wb')
+        self.f_row = open(f"{base}_row{ext}", 'wb')
+
+    def write(self, tile: np.ndarray):
+        lines = get_layout('c_v2', *tile.shape, *self.geometry).to_blocks(tile)
+        data_c = encode_lines(lines.reshape(lines.shape[0], -1), self.conv.total_bits, 'hex')
+        data_row = encode_lines(tile, self.conv.total_bits, 'hex')
+        self.f_c.write(data_c)
+        self.f_row.write(data_row)
+        count('elements_exported', 2 * tile.size)
+        count('bytes_written', len(data_c) + len(data_row))
+
+    def close(self):
+        self.f_c.close()
+        self.f_row.close()
+
+
+@timed('streaming_pipeline')
+def run_streaming_pipeline(cfg: PipelineConfig, out_dir: str = None, verbose: bool = False,
+                           groups_per_tile: int = 1) -> dict:
+    """
+    Same results and artifacts as run_golden_pipeline, with the attention
+    part processed in row tiles of groups_per_tile row groups. Only Q, K, V
+    (rows x proj_dim) are held in full; QK^T and softmax are never stored,
+    so peak memory grows with the tile size instead of rows^2.
+    verbose only applies to the projection stage.
+    """
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    results = linear_projection_stage(cfg, out_dir, verbose)
+    Q, K, V = results['Q'], results['K'], results['V']
+    rows = Q.shape[0]
+
+    _check_divisible(rows, K.shape[0], cfg.cores_a, cfg.cores_a, TOTAL_INPUT_W, QKT_TOTAL_MODULES)
+    _check_divisible(rows, V.shape[1], cfg.cores_a, cfg.total_modules, TOTAL_INPUT_W, 1)
+
+    tile_rows = cfg.cores_a * TOTAL_INPUT_W * BLOCK_SIZE * groups_per_tile
+    K_T = K.T
+    FINAL = np.empty((rows, V.shape[1]), dtype=np.int64)
+
+    exports = []
+    if out_dir:
+        qkt_out = _TiledExport(os.path.join(out_dir, "Q_KT.mem"), cfg.conv_qkt,
+                               cfg.cores_a, cfg.cores_a, QKT_TOTAL_MODULES)
+        final_out = _TiledExport(os.path.join(out_dir, "final_results.mem"), cfg.conv_final,
+                                 cfg.cores_a, cfg.total_modules, 1)
+        soft_out = open(os.path.join(out_dir, "softmax_results.mem"), 'wb')
+        exports = [qkt_out, final_out, soft_out]
+
+    try:
+        for r0 in range(0, rows, tile_rows):
+            with stage('tile'):
+                qkt = block_matmul(Q[r0:r0+tile_rows], K_T, cfg.conv_keys, cfg.conv_keys, cfg.conv_qkt,
+                                   engine=cfg.matmul_engine)
+                S = softmax_stage(cfg, qkt)
+                FINAL[r0:r0+tile_rows] = block_matmul(S, V, cfg.conv_soft, cfg.conv_keys, cfg.conv_final,
+                                                      engine=cfg.matmul_engine)
+                if out_dir:
+                    qkt_out.write(qkt)
+                    data = _encode_softmax(cfg, S)
+                    soft_out.write(data)
+                    count('elements_exported', S.size)
+                    count('bytes_written', len(data))
+                    final_out.write(FINAL[r0:r0+tile_rows])
+    finally:
+        for e in exports:
+            e.close()
+
+    results['final'] = FINAL
+    return results
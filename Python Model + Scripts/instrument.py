@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+instrument.py
+
+Lightweight stage instrumentation for the golden model: wall-clock timers,
+counters, and optional per-stage cProfile / tracemalloc capture.
+
+    from instrument import stage, count
+
+    with stage('qkt'):
+        ...
+        count('elements_exported', words.size)
+
+    @timed('block_matmul')
+    def block_matmul(...): ...
+
+Stages nest ('linear_projection/create_matrix'); counters are attributed to
+the innermost open stage. Each thread keeps its own stage stack; stages
+opened on a worker thread (thread pools) nest under the main thread's
+innermost open stage, i.e. the stage that submitted the work. Everything is
+a cheap no-op until enable() is called, so library code can be instrumented
+unconditionally.
+
+    import instrument
+    instrument.enable(profile=True, memory=True)
+    ...
+    print(instrument.summary_table())
+    instrument.write_trace("trace.json")
+
+The JSON trace holds the per-stage summary plus Chrome trace events
+(open it in chrome://tracing or ui.perfetto.dev).
+
+Stage scripts run as subprocesses are covered through the environment:
+with INSTRUMENT_TRACE=<path> set, instrumentation is enabled at import and
+the trace is written to <path> at exit (INSTRUMENT_PROFILE=1 /
+INSTRUMENT_MEMORY=1 switch on the optional captures).
+"""
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_TOP = 15
+
+
+class _Frame:
+    def __init__(self, path: str):
+        self.path = path
+        self.start = time.perf_counter()
+        self.mem_peak = 0
+        self.profiler = None
+
+
+class _StageStats:
+    def __init__(self, path: str):
+        self.path = path
+        self.calls = 0
+        self.total_s = 0.0
+        self.min_s = None
+        self.max_s = 0.0
+        self.mem_peak = None
+        self.counters = {}
+        self.profile = None
+
+    def as_dict(self) -> dict:
+        return {
+            'stage': self.path,
+            'calls': self.calls,
+            'total_s': self.total_s,
+            'min_s': self.min_s,
+            'max_s': self.max_s,
+            'peak_mem_mb': None if self.mem_peak is None else self.mem_peak / (1 << 20),
+            'counters': self.counters,
+            'profile': self.profile,
+        }
+
+
+class Instrumentation:
+    """Timers / counters / captures of one process"""
+    def __init__(self):
+        self.enabled = False
+        self.profile = False
+        self.memory = False
+        self.stats = {}
+        self.events = []
+        self.t0 = time.perf_counter()
+        # stats / events are shared by all threads, the stage stacks are per thread
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._main_stack = []
+
+    @property
+    def stack(self) -> list:
+        """Open stages of the calling thread"""
+        if threading.current_thread() is threading.main_thread():
+            return self._main_stack
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _root(self, stack: list):
+        """Path new top-level stages of this stack go under (worker threads: the submitting stage)"""
+        if stack is self._main_stack:
+            return None
+        top = self._main_stack[-1:]
+        return top[0].path if top else None
+
+    def enable(self, profile: bool = False, memory: bool = False):
+        self.enabled = True
+        self.profile = profile
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.events.clear()
+        self.stack.clear()
+        self.t0 = time.perf_counter()
+
+    def _stats(self, path: str) -> _StageStats:
+        if path not in self.stats:
+            self.stats[path] = _StageStats(path)
+        return self.stats[path]
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        stack = self.stack
+        # tracemalloc peaks and cProfile are process-wide: main thread only
+        main = stack is self._main_stack
+        parent = stack[-1] if stack else None
+        root = parent.path if parent else self._root(stack)
+        frame = _Frame(f"{root}/{name}" if root else name)
+        with self._lock:
+            self._stats(frame.path)     # created on entry: the table lists parents first
+
+        if self.memory and main:
+            if parent:
+                parent.mem_peak = max(parent.mem_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        # one profiler at a time: nested stages are part of the outermost profile
+        if self.profile and main and parent is None:
+            frame.profiler = cProfile.Profile()
+            frame.profiler.enable()
+
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            end = time.perf_counter()
+            elapsed = end - frame.start
+
+            profile = None
+            if frame.profiler is not None:
+                frame.profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(frame.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+                profile = out.getvalue()
+
+            peak = None
+            if self.memory and main:
+                peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+                if parent:
+                    parent.mem_peak = max(parent.mem_peak, peak)
+
+            with self._lock:
+                st = self._stats(frame.path)
+                st.calls += 1
+                st.total_s += elapsed
+                st.min_s = elapsed if st.min_s is None else min(st.min_s, elapsed)
+                st.max_s = max(st.max_s, elapsed)
+                if profile is not None:
+                    st.profile = profile
+                if peak is not None:
+                    st.mem_peak = peak if st.mem_peak is None else max(st.mem_peak, peak)
+
+                self.events.append({
+                    'name': name, 'cat': frame.path, 'ph': 'X', 'pid': os.getpid(),
+                    'tid': 0 if main else threading.get_ident(),
+                    'ts': (frame.start - self.t0) * 1e6, 'dur': elapsed * 1e6,
+                })
+
+    def count(self, key: str, n=1):
+        """Add n to a counter of the innermost open stage ('(none)' outside stages)"""
+        if not self.enabled:
+            return
+        stack = self.stack
+        path = stack[-1].path if stack else (self._root(stack) or '(none)')
+        with self._lock:
+            st = self._stats(path)
+            st.counters[key] = st.counters.get(key, 0) + int(n)
+
+    def merge_trace(self, trace: dict, prefix: str = None):
+        """
+        Fold another process's trace (see trace()) in, e.g. a stage script
+        run as a subprocess; its stages go under prefix (default: the
+        innermost open stage).
+        """
+        if prefix is None and self.stack:
+            prefix = self.stack[-1].path
+        with self._lock:
+            self._merge_trace(trace, prefix)
+
+    def _merge_trace(self, trace: dict, prefix: str):
+        for d in trace.get('stages', []):
+            st = self._stats(f"{prefix}/{d['stage']}" if prefix else d['stage'])
+            st.calls += d['calls']
+            st.total_s += d['total_s']
+            if d['min_s'] is not None:
+                st.min_s = d['min_s'] if st.min_s is None else min(st.min_s, d['min_s'])
+            st.max_s = max(st.max_s, d['max_s'])
+            if d['peak_mem_mb'] is not None:
+                peak = int(d['peak_mem_mb'] * (1 << 20))
+                st.mem_peak = peak if st.mem_peak is None else max(st.mem_peak, peak)
+            for k, v in d['counters'].items():
+                st.counters[k] = st.counters.get(k, 0) + v
+            st.profile = d.get('profile') or st.profile
+        self.events.extend(trace.get('traceEvents', []))
+
+    # --------------------------------------------------------
+    # Report
+    # --------------------------------------------------------
+    def summary(self) -> list:
+        with self._lock:
+            return [st.as_dict() for st in self.stats.values()]
+
+    def summary_table(self) -> str:
+        roots = sum(st.total_s for st in self.stats.values() if '/' not in st.path and st.calls)
+        lines = [f"{'stage':44} {'calls':>6} {'total [s]':>10} {'%':>6} {'peak MB':>8}  counters",
+                 "-" * 100]
+        for st in self.stats.values():
+            indent = "  " * st.path.count('/')
+            name = indent + st.path.rsplit('/', 1)[-1]
+            pct = 100.0 * st.total_s / roots if roots else 0.0
+            mem = '-' if st.mem_peak is None else f"{st.mem_peak / (1 << 20):.1f}"
+            counters = ", ".join(f"{k}={v}" for k, v in st.counters.items())
+            lines.append(f"{name:44} {st.calls:6} {st.total_s:10.4f} {pct:6.1f} {mem:>8}  {counters}")
+        return "\n".join(lines)
+
+    def trace(self) -> dict:
+        return {
+            'meta': {'argv': sys.argv, 'pid': os.getpid(), 'profile': self.profile, 'memory': self.memory},
+            'stages': self.summary(),
+            'traceEvents': list(self.events),
+        }
+
+    def write_trace(self, path: str):
+        dirpath = os.path.dirname(path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f, indent=2)
+
+
+# ------------------------------------------------------------
+# Process-wide instance
+# ------------------------------------------------------------
+INSTRUMENT = Instrumentation()
+
+enable = INSTRUMENT.enable
+reset = INSTRUMENT.reset
+stage = INSTRUMENT.stage
+count = INSTRUMENT.count
+merge_trace = INSTRUMENT.merge_trace
+summary_table = INSTRUMENT.summary_table
+write_trace = INSTRUMENT.write_trace
+
+
+def enabled() -> bool:
+    return INSTRUMENT.enabled
+
+
+def timed(name: str):
+    """Decorator: run the function inside stage(name)"""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not INSTRUMENT.enabled:
+                return fn(*args, **kwargs)
+            with INSTRUMENT.stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _enable_from_env():
+    path = os.environ.get('INSTRUMENT_TRACE')
+    if not path:
+        return
+    enable(profile=os.environ.get('INSTRUMENT_PROFILE') == '1',
+           memory=os.environ.get('INSTRUMENT_MEMORY') == '1')
+    atexit.register(write_trace, path)
+
+
+_enable_from_env()
@@ -23,8 +23,14 @@ python "d:\DATA\Documents\Xirka Internship\PME\Transformer\transformer\Python Mo
 import os
 import argparse
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List
 
+from fixed_matmul import fixed_matmul, DATAPATHS, ROUNDING_MODES
+from block_layout import get_layout
+from mem_codec import encode_lines, write_lines
+from instrument import timed
+
 # ---------------------------
 # Fixed-point helper classes
 # ---------------------------
@@ -77,6 +83,55 @@ class FixedPointConverter:
         width = (self.total_bits + 3) // 4  # hex digits
         return format(v & mask, f'0{width}X')
 
+    # ---------------------------
+    # Array (ndarray) variants
+    # ---------------------------
+    def float_to_fixed_array(self, values, lo: float = None, hi: float = None) -> np.ndarray:
+        """Array version of float_to_fixed: round half-to-even, saturate, two's complement wrap
+        lo / hi clamp the float values first (e.g. 0, 1 for probabilities); float32 input
+        is scaled in float32 (exact, 2^frac_bits is a power of two)"""
+        values = np.asarray(values)
+        if values.dtype != np.float32:
+            values = values.astype(np.float64, copy=False)
+        if lo is not None or hi is not None:
+            values = np.clip(values, lo, hi)
+        scaled = np.round(values * (1 << self.fractional_bits))
+        clamped = np.clip(scaled, self.min_int, self.max_int).astype(np.int64)
+        if values.dtype == np.float32:
+            # max_int rounds up in float32 beyond 24 bits
+            np.minimum(clamped, self.max_int, out=clamped)
+        if self.is_signed:
+            return clamped & ((1 << self.total_bits) - 1)
+        return clamped
+
+    def int_to_fixed_array(self, values) -> np.ndarray:
+        """float_to_fixed_array for integer values, without the float round-trip (value << frac_bits)"""
+        # pre-clip so the shift cannot overflow int64, then saturate exactly
+        lo, hi = self.min_int >> self.fractional_bits, (self.max_int >> self.fractional_bits) + 1
+        scaled = np.clip(np.asarray(values, dtype=np.int64), lo, hi) << self.fractional_bits
+        clamped = np.clip(scaled, self.min_int, self.max_int)
+        if self.is_signed:
+            return clamped & ((1 << self.total_bits) - 1)
+        return clamped
+
+    def fixed_to_float_array(self, values, dtype=np.float64) -> np.ndarray:
+        """Array version of fixed_to_float (values >= 2^(total_bits-1) are negative when signed)
+        dtype=np.float32 halves the output size; exact up to 24 significant bits"""
+        v = np.asarray(values, dtype=np.int64)
+        if self.is_signed:
+            v = np.where(v >= (1 << (self.total_bits - 1)), v - (1 << self.total_bits), v)
+        out = v.astype(dtype)
+        out /= (1 << self.fractional_bits)
+        return out
+
+    def sign_extend_array(self, values) -> np.ndarray:
+        """Mask to total_bits and sign-extend into int64 (no-op on the sign for unsigned)"""
+        v = np.asarray(values, dtype=np.int64) & ((1 << self.total_bits) - 1)
+        if self.is_signed:
+            sign = 1 << (self.total_bits - 1)
+            v = (v ^ sign) - sign
+        return v
+
 # ---------------------------
 # Matrix processing helper
 # ---------------------------
@@ -85,28 +140,44 @@ class MatrixProcessor:
     def __init__(self):
         self.cores_a = 1
         self.cores_b = 1
+        # 'float' (float64 round-trip) or an integer datapath from fixed_matmul
+        self.matmul_engine = 'float'
+        self.rounding = 'truncate'
+        self.acc_bits = None
+        self.block_size = 2
 
+    @timed('create_matrix')
     def create_matrix(self, rows: int, cols: int, min_val: float, max_val: float,
-                      converter: FixedPointConverter, integers_only: bool = False) -> np.ndarray:
-        """Generate random matrix and convert to fixed-point representation (integers)"""
+                      converter: FixedPointConverter, integers_only: bool = False,
+                      rng: np.random.Generator = None) -> np.ndarray:
+        """Generate random matrix and convert to fixed-point representation (integers)
+        rng: numpy Generator, see matrix_rng() (default: fresh unseeded Generator)
+        integers_only draws int64 directly and shifts it into the fixed-point format"""
+        if rng is None:
+            rng = np.random.default_rng()
         if integers_only:
-            data = np.random.randint(int(min_val), int(max_val) + 1, (rows, cols))
-        else:
-            data = np.random.uniform(min_val, max_val, (rows, cols))
-        vec = np.vectorize(converter.float_to_fixed)
-        return vec(data).astype(np.int64)
+            data = rng.integers(int(min_val), int(max_val) + 1, (rows, cols), dtype=np.int64)
+            return converter.int_to_fixed_array(data)
+        data = rng.uniform(min_val, max_val, (rows, cols))
+        return converter.float_to_fixed_array(data)
 
+    @timed('multiply_matrices')
     def multiply_matrices(self, A: np.ndarray, B: np.ndarray,
                           conv_A: FixedPointConverter, conv_B: FixedPointConverter,
                           conv_C: FixedPointConverter) -> np.ndarray:
-        """Multiply fixed-point matrices using float intermediate, then convert to fixed-point"""
-        to_float_A = np.vectorize(conv_A.fixed_to_float)
-        to_float_B = np.vectorize(conv_B.fixed_to_float)
-        A_f = to_float_A(A)
-        B_f = to_float_B(B)
+        """
+        Multiply fixed-point matrices.
+          - matmul_engine 'float' => float intermediate, then convert to fixed-point
+          - matmul_engine 'exact'/'mac' => integer datapath (see fixed_matmul.py)
+        """
+        if self.matmul_engine != 'float':
+            return fixed_matmul(A, B, conv_A, conv_B, conv_C,
+                                datapath=self.matmul_engine, rounding=self.rounding,
+                                acc_bits=self.acc_bits, block_size=self.block_size)
+        A_f = conv_A.fixed_to_float_array(A)
+        B_f = conv_B.fixed_to_float_array(B)
         C_f = np.matmul(A_f, B_f)
-        to_fixed_C = np.vectorize(conv_C.float_to_fixed)
-        return to_fixed_C(C_f).astype(np.int64)
+        return conv_C.float_to_fixed_array(C_f)
 
     def print_matrix(self, matrix: np.ndarray, converter: FixedPointConverter,
                      name: str, display_format: str = 'int'):
@@ -124,6 +195,7 @@ class MatrixProcessor:
                     parts.append(f"{vi:6}")
             print(" ".join(parts))
 
+    @timed('export_matrix')
     def export_matrix(self, matrix: np.ndarray, converter: FixedPointConverter,
                       filename: str, mode: str = 'row',
                       block_size: int = 2, num_cores: int = 1,
@@ -149,9 +221,7 @@ class MatrixProcessor:
                 self._export_core_mode_C(matrix, converter, filename, block_size)
 
     def _export_row_mode(self, matrix: np.ndarray, converter: FixedPointConverter, filename: str):
-        with open(filename, 'w') as f:
-            for row in matrix:
-                f.write(" ".join(converter.int_to_hex(int(x)) for x in row) + "\n")
+        write_lines(filename, matrix, converter.total_bits, fmt='hex')
 
     def _export_core_mode_A(self, matrix: np.ndarray, converter: FixedPointConverter, filename: str,
                              block_size: int, num_cores: int):
@@ -167,22 +237,8 @@ class MatrixProcessor:
         if cols % block_size != 0:
             raise ValueError(f"Matrix A: Cols ({cols}) must be divisible by block_size ({block_size})")
 
-        row_groups = rows // (num_cores * block_size)
-        blocks_per_row = cols // block_size
-
-        with open(filename, 'w') as f:
-            for g in range(row_groups):
-                base_row = g * num_cores * block_size
-                for block_col in range(blocks_per_row):
-                    col_start = block_col * block_size
-                    elements = []
-                    for core in range(num_cores):
-                        rstart = base_row + core * block_size
-                        block = matrix[rstart:rstart+block_size, col_start:col_start+block_size]
-                        for r in range(block_size):
-                            for c in range(block_size):
-                                elements.append(converter.int_to_binary(int(block[r, c])))
-                    f.write(" ".join(elements) + "\n")
+        write_lines(filename, get_layout('core_a', rows, cols, block_size, num_cores).to_blocks(matrix),
+                    converter.total_bits, fmt='bin')
 
     def _export_core_mode_B(self, matrix: np.ndarray, converter: FixedPointConverter, filename: str,
                              block_size: int, num_cores: int):
@@ -198,22 +254,8 @@ class MatrixProcessor:
         if rows % block_size != 0:
             raise ValueError(f"Matrix B: Rows ({rows}) must be divisible by block_size ({block_size})")
 
-        col_groups = cols // (num_cores * block_size)
-        blocks_per_col = rows // block_size
-
-        with open(filename, 'w') as f:
-            for g in range(col_groups):
-                base_col = g * num_cores * block_size
-                for block_row in range(blocks_per_col):
-                    rstart = block_row * block_size
-                    elements = []
-                    for core in range(num_cores):
-                        cstart = base_col + core * block_size
-                        block = matrix[rstart:rstart+block_size, cstart:cstart+block_size]
-                        for c in range(block_size):
-                            for r in range(block_size):
-                                elements.append(converter.int_to_binary(int(block[r, c])))
-                    f.write(" ".join(elements) + "\n")
+        write_lines(filename, get_layout('core_b', rows, cols, block_size, num_cores).to_blocks(matrix),
+                    converter.total_bits, fmt='bin')
 
     def _export_core_mode_C(self, matrix: np.ndarray, converter: FixedPointConverter, filename: str,
                              block_size: int):
@@ -229,25 +271,10 @@ class MatrixProcessor:
         if cols % (self.cores_b * block_size) != 0:
             raise ValueError(f"Matrix C: Cols ({cols}) must be divisible by cores_b×block_size ({self.cores_b}×{block_size})")
 
-        row_groups = rows // (self.cores_a * block_size)
-        col_groups = cols // (self.cores_b * block_size)
-
-        with open(filename, 'w') as f:
-            for rg in range(row_groups):
-                rbase = rg * self.cores_a * block_size
-                for cg in range(col_groups):
-                    cbase = cg * self.cores_b * block_size
-                    elements = []
-                    for cb in range(self.cores_b):
-                        csub = cbase + cb * block_size
-                        for ra in range(self.cores_a):
-                            rsub = rbase + ra * block_size
-                            block = matrix[rsub:rsub+block_size, csub:csub+block_size]
-                            for r in range(block_size):
-                                for c in range(block_size):
-                                    elements.append(converter.int_to_binary(int(block[r, c])))
-                    f.write(" ".join(elements) + "\n")
+        write_lines(filename, get_layout('core_c', rows, cols, block_size, self.cores_a, self.cores_b).to_blocks(matrix),
+                    converter.total_bits, fmt='bin')
     
+    @timed('export_c_v2')
     def export_matrix_C_v2(self,
                       matrix: np.ndarray,
                       converter,
@@ -282,88 +309,126 @@ class MatrixProcessor:
         if cols % (cores_b * total_modules * block_size) != 0:
             raise ValueError("Cols not divisible by cores_b * total_modules * block_size")
 
-        row_groups = rows // (cores_a * total_input_w * block_size)
-        col_groups = cols // (cores_b * total_modules * block_size)
-
         # -------------------------
         # EXPORT
         # -------------------------
-        with open(filename, 'w') as f:
-
-            line_idx = 0
-
-            for rg in range(row_groups):
-                rbase = rg * cores_a * total_input_w * block_size
-
-                for cg in range(col_groups):
-                    cbase = cg * cores_b * total_modules * block_size
-
-                    # Store per input_w (for debug display)
-                    line_slices = []
+        fmt = 'hex' if output_format == 'hex' else 'bin'
+        tiles = get_layout('c_v2', rows, cols, block_size, cores_a, cores_b,
+                           total_input_w, total_modules).to_blocks(matrix)
+        lines, slices, per_slice = tiles.shape
 
-                    for iw in range(total_input_w):
+        write_lines(filename, tiles.reshape(lines, slices * per_slice), converter.total_bits, fmt)
 
-                        elements = []
-
-                        for module in range(total_modules):
-                            for cb in range(cores_b):
-
-                                cstart = cbase + (module * cores_b + cb) * block_size
+        # -------------------------
+        # DEBUG PRINT (YOUR FORMAT)
+        # -------------------------
+        if debug_print:
+            print(self._C_v2_debug_text(tiles, converter, fmt), end='')
+
+    def _C_v2_debug_text(self, tiles: np.ndarray, converter, fmt: str) -> str:
+        """Debug listing of the C v2 blocks: one block per file line, one row per input_w"""
+        lines, slices, per_slice = tiles.shape
+        text = encode_lines(tiles.reshape(lines * slices, per_slice),
+                            converter.total_bits, fmt).decode('ascii').splitlines()
+        out = []
+        for line_idx in range(lines):
+            line_slices = text[line_idx * slices:(line_idx + 1) * slices]
+            out.append(f"\nLine {line_idx}, 0: {line_slices[0]}\n")
+            for idx in range(1, len(line_slices)):
+                out.append(f"         {idx}: {line_slices[idx]}\n")
+        return "".join(out)
+
+    def C_v2_debug_text(self, matrix: np.ndarray, converter, block_size: int,
+                        total_input_w: int, total_modules: int, output_format: str) -> str:
+        """Text export_matrix_C_v2 prints with debug_print=True"""
+        tiles = get_layout('c_v2', *matrix.shape, block_size, self.cores_a, self.cores_b,
+                           total_input_w, total_modules).to_blocks(matrix)
+        return self._C_v2_debug_text(tiles, converter, 'hex' if output_format == 'hex' else 'bin')
 
-                                for ra in range(cores_a):
-                                    rstart = rbase + (iw * cores_a + ra) * block_size
+    def export_matrix_row_hex(matrix, converter, filename):
+        write_lines(filename, matrix, converter.total_bits, fmt='hex', upper=False)
 
-                                    block = matrix[
-                                        rstart:rstart+block_size,
-                                        cstart:cstart+block_size
-                                    ]
+# ---------------------------
+# Linear projection generation
+# ---------------------------
+# Every generated matrix has its own Generator, default_rng([seed, stream, head]),
+# so each one is reproducible on its own: independent of generation order,
+# worker count, head count and of which other matrices are generated.
+MATRIX_STREAMS = {'input': 0, 'wq': 1, 'wk': 2, 'wv': 3, 'a': 4, 'b': 5}
 
-                                    for r in range(block_size):
-                                        for c in range(block_size):
-                                            val = int(block[r, c])
-                                            if output_format == 'hex':
-                                                elements.append(converter.int_to_hex(val))
-                                            else:
-                                                elements.append(converter.int_to_binary(val))
 
-                        line_slices.append(elements)
+def resolve_seed(seed: int = None) -> int:
+    """seed, or a fresh 32-bit one from OS entropy (print it to re-create the run)"""
+    if seed is None:
+        return int(np.random.SeedSequence().generate_state(1)[0])
+    return int(seed)
 
-                    # -------------------------
-                    # WRITE TO FILE (flattened)
-                    # -------------------------
-                    flat_line = []
-                    for s in line_slices:
-                        flat_line.extend(s)
 
-                    f.write(" ".join(flat_line) + "\n")
+def matrix_tag(name: str, head: int = 0) -> str:
+    """'input' / 'a' / 'b', or the weight name with its 1-based head ('wq1', 'wv3')"""
+    return name if name in ('input', 'a', 'b') else f"{name}{head + 1}"
 
-                    # -------------------------
-                    # DEBUG PRINT (YOUR FORMAT)
-                    # -------------------------
-                    if debug_print:
-                        print(f"\nLine {line_idx}, 0:", " ".join(line_slices[0]))
-                        for idx in range(1, len(line_slices)):
-                            print(f"         {idx}:", " ".join(line_slices[idx]))
 
-                    line_idx += 1
+def matrix_rng(seed: int, name: str, head: int = 0, matrix_seeds: dict = None) -> np.random.Generator:
+    """
+    Generator for one matrix. matrix_seeds ({'wq2': 11, 'input': 5}) pins
+    individual matrices to an explicit seed instead of the derived one.
+    """
+    if name not in MATRIX_STREAMS:
+        raise ValueError(f"Unknown matrix '{name}' (expected one of {list(MATRIX_STREAMS)})")
+    tag = matrix_tag(name, head)
+    if matrix_seeds and tag in matrix_seeds:
+        return np.random.default_rng(matrix_seeds[tag])
+    return np.random.default_rng([seed, MATRIX_STREAMS[name], head])
+
+
+def parse_matrix_seeds(items) -> dict:
+    """['wq1=5', 'input=3'] -> {'wq1': 5, 'input': 3}"""
+    out = {}
+    for item in items or []:
+        tag, _, value = item.partition('=')
+        if not value:
+            raise ValueError(f"--matrix_seed expects NAME=SEED, got '{item}'")
+        tag = tag.strip().lower()
+        name, head = tag[:2], tag[2:]
+        if tag not in ('input', 'a', 'b') and not (
+                name in ('wq', 'wk', 'wv') and head.isdigit() and int(head) >= 1):
+            raise ValueError(f"Unknown --matrix_seed tag '{tag}' "
+                             f"(expected input, a, b, wq<h>, wk<h> or wv<h> with head h >= 1)")
+        out[tag] = int(value)
+    return out
+
+
+def _project_output(processor: MatrixProcessor, A: np.ndarray, W: np.ndarray,
+                    conv_A: FixedPointConverter, conv_W: FixedPointConverter,
+                    conv_C: FixedPointConverter, out_name: str, out_row: str,
+                    export_c_v2: bool, block_size: int, total_input_w: int,
+                    total_modules: int, output_format: str, debug_flag: bool):
+    """
+    One projection (A x W) and its exports. Runs in a pool worker, so nothing is
+    printed here: the C v2 debug text is returned for the caller to print in order.
+    """
+    M = processor.multiply_matrices(A, W, conv_A, conv_W, conv_C)
+    debug_text = ""
+    if export_c_v2:
+        processor.export_matrix_C_v2(
+            M, conv_C, out_name,
+            block_size=block_size,
+            total_input_w=total_input_w,
+            total_modules=total_modules,
+            output_format=output_format,
+            debug_print=False
+        )
+        if debug_flag:
+            debug_text = processor.C_v2_debug_text(M, conv_C, block_size, total_input_w,
+                                                   total_modules, output_format)
+        processor.export_matrix(M, conv_C, out_row, mode='row')
+    else:
+        processor.export_matrix(M, conv_C, out_name, mode='core',
+                                block_size=block_size, num_cores=None, matrix_type='C')
+    return M, debug_text
 
-    def export_matrix_row_hex(matrix, converter, filename):
-        import os
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        hex_width = (converter.total_bits + 3) // 4
-        mask = (1 << converter.total_bits) - 1
-
-        with open(filename, 'w') as f:
-            for row in matrix:
-                line = " ".join(
-                    f"{int(v) & mask:0{hex_width}x}"
-                    for v in row
-                )
-                f.write(line + "\n")
 
-# ---------------------------
-# Linear projection generation
-# ---------------------------
 def generate_linear_projection(processor: MatrixProcessor,
                                conv_A: FixedPointConverter,
                                conv_W: FixedPointConverter,
@@ -386,7 +451,11 @@ def generate_linear_projection(processor: MatrixProcessor,
                                output_format: str,
                                debug_flag: bool,
                                output_dir: str,
-                               display: str):
+                               display: str,
+                               workers: int = 1,
+                               parallel: str = 'process',
+                               seed: int = None,
+                               matrix_seeds: dict = None):
     """
     Generate input matrix A, weight matrices (Wq/Wk/Wv) and compute projections (Q/K/V).
     Export:
@@ -397,13 +466,25 @@ def generate_linear_projection(processor: MatrixProcessor,
       - If unique_per_type: generate only one Wq/Wk/Wv (exported as mem_q1.mem etc.)
         and compute/export/print only out_q1/out_k1/out_v1.
       - If unique_per_head: generate distinct weights per head and compute/export/print all heads.
+    Parallelism:
+      - workers > 1 fans every (head, Q/K/V) projection + export out over a
+        process or thread pool; printing stays in head order.
+    Seeding:
+      - seed: every matrix (input, Wq/Wk/Wv of each head) gets its own
+        Generator (see matrix_rng); matrix_seeds overrides single matrices.
+        Without a seed one is drawn from OS entropy and printed.
     """
+    seed = resolve_seed(seed)
+    print(f"[SEED] {seed}")
+
     os.makedirs(output_dir, exist_ok=True)
     processor.cores_a = cores_a
     processor.cores_b = cores_b
+    processor.block_size = block_size
 
     # Create input A
-    A = processor.create_matrix(rows_a, cols_a, min_val, max_val, conv_A, integers_only)
+    A = processor.create_matrix(rows_a, cols_a, min_val, max_val, conv_A, integers_only,
+                                matrix_rng(seed, 'input', 0, matrix_seeds))
     in_fname = f"{output_dir}/mem_input.mem"
     processor.export_matrix(A, conv_A, in_fname, mode='core', block_size=block_size, num_cores=cores_a, matrix_type='A')
     processor.print_matrix(A, conv_A, "Input Matrix A", display)
@@ -418,9 +499,9 @@ def generate_linear_projection(processor: MatrixProcessor,
 
     if unique_per_type:
         # Generate ONLY ONE SET of Wq, Wk, Wv
-        Wq = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
-        Wk = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
-        Wv = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
+        Wq, Wk, Wv = (processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only,
+                                              matrix_rng(seed, name, 0, matrix_seeds))
+                      for name in ('wq', 'wk', 'wv'))
 
         # Store only one
         Wq_list = [Wq]
@@ -447,9 +528,9 @@ def generate_linear_projection(processor: MatrixProcessor,
     else:
         # unique_per_head: generate distinct matrices per head and export each
         for h in range(heads):
-            wq = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
-            wk = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
-            wv = processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only)
+            wq, wk, wv = (processor.create_matrix(weight_rows, weight_cols, min_val, max_val, conv_W, integers_only,
+                                                  matrix_rng(seed, name, h, matrix_seeds))
+                          for name in ('wq', 'wk', 'wv'))
             Wq_list.append(wq)
             Wk_list.append(wk)
             Wv_list.append(wv)
@@ -466,67 +547,40 @@ def generate_linear_projection(processor: MatrixProcessor,
     # If unique_per_head: we print/export all heads
     head_indices: List[int] = [0] if unique_per_type else list(range(heads))
 
-    for idx in head_indices:
-        Q = processor.multiply_matrices(A, Wq_list[idx], conv_A, conv_W, conv_C)
-        K = processor.multiply_matrices(A, Wk_list[idx], conv_A, conv_W, conv_C)
-        V = processor.multiply_matrices(A, Wv_list[idx], conv_A, conv_W, conv_C)
-
-        out_q_name = f"{output_dir}/mem_out_q{idx+1}.mem"
-        out_k_name = f"{output_dir}/mem_out_k{idx+1}.mem"
-        out_v_name = f"{output_dir}/mem_out_v{idx+1}.mem"
+    # Ensure processor has correct cores for exporting C
+    processor.cores_a = cores_a
+    processor.cores_b = cores_b
 
-        out_q_row  = f"{output_dir}/mem_out_q{idx+1}_row.mem"
-        out_k_row  = f"{output_dir}/mem_out_k{idx+1}_row.mem"
-        out_v_row  = f"{output_dir}/mem_out_v{idx+1}_row.mem"
+    # One job per (head, Q/K/V)
+    weights = {'q': Wq_list, 'k': Wk_list, 'v': Wv_list}
+    jobs = [(idx, t) for idx in head_indices for t in ('q', 'k', 'v')]
+
+    def job_args(idx, t):
+        return (processor, A, weights[t][idx], conv_A, conv_W, conv_C,
+                f"{output_dir}/mem_out_{t}{idx+1}.mem",
+                f"{output_dir}/mem_out_{t}{idx+1}_row.mem",
+                export_c_v2, block_size, total_input_w, total_modules,
+                output_format, debug_flag)
+
+    if workers > 1:
+        pool_cls = ProcessPoolExecutor if parallel == 'process' else ThreadPoolExecutor
+        with pool_cls(max_workers=workers) as pool:
+            futures = {job: pool.submit(_project_output, *job_args(*job)) for job in jobs}
+            results = {job: fut.result() for job, fut in futures.items()}
+    else:
+        results = {job: _project_output(*job_args(*job)) for job in jobs}
 
-        # Ensure processor has correct cores for exporting C
-        processor.cores_a = cores_a
-        processor.cores_b = cores_b
+    for idx in head_indices:
+        Q, K, V = (results[(idx, t)][0] for t in ('q', 'k', 'v'))
 
         if export_c_v2:
             print("\n" + "="*60)
             print(f"HEAD {idx+1}")
             print("="*60)
 
-            print("\n[Q OUTPUT]")
-            processor.export_matrix_C_v2(
-                Q, conv_C, out_q_name,
-                block_size=block_size,
-                total_input_w=total_input_w,
-                total_modules=total_modules,
-                output_format=output_format,
-                debug_print=debug_flag
-            )
-            processor.export_matrix(Q, conv_C, out_q_row, mode='row')
-
-            print("\n[K OUTPUT]")
-            processor.export_matrix_C_v2(
-                K, conv_C, out_k_name,
-                block_size=block_size,
-                total_input_w=total_input_w,
-                total_modules=total_modules,
-                output_format=output_format,
-                debug_print=debug_flag
-            )
-            processor.export_matrix(K, conv_C, out_k_row, mode='row')
-
-            print("\n[V OUTPUT]")
-            processor.export_matrix_C_v2(
-                V, conv_C, out_v_name,
-                block_size=block_size,
-                total_input_w=total_input_w,
-                total_modules=total_modules,
-                output_format=output_format,
-                debug_print=debug_flag
-            )
-            processor.export_matrix(V, conv_C, out_v_row, mode='row')
-        else:
-            processor.export_matrix(Q, conv_C, out_q_name, mode='core',
-                                    block_size=block_size, num_cores=None, matrix_type='C')
-            processor.export_matrix(K, conv_C, out_k_name, mode='core',
-                                    block_size=block_size, num_cores=None, matrix_type='C')
-            processor.export_matrix(V, conv_C, out_v_name, mode='core',
-                                    block_size=block_size, num_cores=None, matrix_type='C')
+            for t in ('q', 'k', 'v'):
+                print(f"\n[{t.upper()} OUTPUT]")
+                print(results[(idx, t)][1], end='')
 
         # Print results (float or int depending display)
         processor.print_matrix(Q, conv_C, f"Out_Q{idx+1}", display)
@@ -576,6 +630,14 @@ def main():
 
     parser.add_argument('--unsigned', action='store_true',
                         help='Use unsigned fixed-point (default signed)')
+
+    # Matmul engine
+    parser.add_argument('--matmul_engine', choices=['float'] + list(DATAPATHS), default='float',
+                        help="float: float64 round-trip, exact: integer dot product, mac: multi_matmul RTL model")
+    parser.add_argument('--rounding', choices=ROUNDING_MODES, default='truncate',
+                        help='Rounding of the integer engines when dropping fraction bits')
+    parser.add_argument('--acc_bits', type=int, default=None,
+                        help='Accumulator width of the integer engines (default: no wrap / RTL width for mac)')
     
     # Debugging configs
     parser.add_argument('--output_format', choices=['bin', 'hex'], default='hex',
@@ -585,6 +647,16 @@ def main():
     parser.add_argument('--out_dir', type=str, default='exports',
                     help='Output directory for generated files')
 
+    # Parallel / reproducible generation
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Pool size for per-head Q/K/V projection + export (default: serial)')
+    parser.add_argument('--parallel', choices=['process', 'thread'], default='process',
+                        help='Pool type used when --workers > 1')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Base seed for the per-matrix Generators (default: drawn from OS entropy and printed)')
+    parser.add_argument('--matrix_seed', action='append', default=[], metavar='NAME=SEED',
+                        help='Explicit seed for one matrix: input, a, b, wq<h>, wk<h>, wv<h> (repeatable)')
+
     args = parser.parse_args()
 
     is_signed = not args.unsigned
@@ -610,13 +682,22 @@ def main():
     processor = MatrixProcessor()
     processor.cores_a = args.cores_a
     processor.cores_b = args.cores_b
+    processor.block_size = args.block_size
+    processor.matmul_engine = args.matmul_engine
+    processor.rounding = args.rounding
+    processor.acc_bits = args.acc_bits
 
     if args.task == 'matmul':
         # original behavior (unchanged)
         ROWS_A, COLS_A = args.rows_a, args.cols_a
         COLS_B = args.proj_dim
-        A = processor.create_matrix(ROWS_A, COLS_A, args.min_val, args.max_val, conv_A, args.integers)
-        B = processor.create_matrix(COLS_A, COLS_B, args.min_val, args.max_val, conv_W, args.integers)
+        seed = resolve_seed(args.seed)
+        print(f"[SEED] {seed}")
+        matrix_seeds = parse_matrix_seeds(args.matrix_seed)
+        A = processor.create_matrix(ROWS_A, COLS_A, args.min_val, args.max_val, conv_A, args.integers,
+                                    matrix_rng(seed, 'a', 0, matrix_seeds))
+        B = processor.create_matrix(COLS_A, COLS_B, args.min_val, args.max_val, conv_W, args.integers,
+                                    matrix_rng(seed, 'b', 0, matrix_seeds))
         C = processor.multiply_matrices(A, B, conv_A, conv_W, conv_C)
 
         processor.print_matrix(A, conv_A, "Matrix A", args.display)
@@ -670,7 +751,11 @@ def main():
             export_c_v2=args.export_c_v2,
             debug_flag = args.debug_all_heads,
             output_dir = args.out_dir,
-            display=args.display
+            display=args.display,
+            workers=args.workers,
+            parallel=args.parallel,
+            seed=args.seed,
+            matrix_seeds=parse_matrix_seeds(args.matrix_seed)
         )
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+mem_binary.py
+
+Compact binary matrix container (.tmem) for the intermediate pipeline files.
+
+File layout:
+    b'TMEM'                 magic
+    uint8  version          (1)
+    uint8  reserved
+    uint16 header_len       little endian, JSON header bytes incl. padding
+    JSON header             {"shape", "width", "frac_bits", "signed", "layout", "dtype"}
+                            space padded so the data starts on a 64-byte boundary
+    data                    raw words, C order, little endian
+
+Words are the two's complement bit patterns masked to `width`, stored in the
+smallest unsigned container (uint8/16/32/64). load_tmem() memory-maps the
+data section and returns it without copying.
+
+Usage:
+    # text -> binary
+    python mem_binary.py to_tmem Q_KT_row.mem Q_KT_row.tmem --format hex --width 16 --frac_bits 8
+    # binary -> text
+    python mem_binary.py to_text Q_KT_row.tmem Q_KT_row.mem --format hex
+    # header
+    python mem_binary.py info Q_KT_row.tmem
+"""
+import argparse
+import json
+import os
+import struct
+import numpy as np
+
+from instrument import count
+
+MAGIC = b'TMEM'
+VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct('<4sBBH')
+
+# Layout tags (informational: the words are stored as lines x words_per_line,
+# in the same order as the corresponding text file)
+LAYOUTS = ('row', 'core_a', 'core_b', 'core_c', 'c_v2')
+
+TEXT_FORMATS = ('hex', 'bin', 'xpm')
+
+
+# ------------------------------------------------------------
+# Container
+# ------------------------------------------------------------
+def word_dtype(width: int) -> np.dtype:
+    """Smallest little endian unsigned container for `width` bit words"""
+    for bits in (8, 16, 32, 64):
+        if width <= bits:
+            return np.dtype(f'<u{bits // 8}')
+    raise ValueError(f"Width {width} does not fit in 64 bits")
+
+
+def is_tmem(path: str) -> bool:
+    """True if the file starts with the .tmem magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_tmem(path: str, words, width: int, frac_bits: int, signed: bool = True,
+              layout: str = 'row') -> int:
+    """Write words (any integer ndarray) as .tmem; returns bytes written"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'")
+
+    dtype = word_dtype(width)
+    words = np.asarray(words)
+    data = (words.astype(np.int64).view(np.uint64) & np.uint64((1 << width) - 1)).astype(dtype)
+
+    header = {
+        'shape': list(data.shape),
+        'width': width,
+        'frac_bits': frac_bits,
+        'signed': bool(signed),
+        'layout': layout,
+        'dtype': dtype.str,
+    }
+    hdr = json.dumps(header).encode('ascii')
+    pad = (-(_PREFIX.size + len(hdr))) % ALIGN
+    hdr += b' ' * pad
+
+    dirpath = os.path.dirname(path)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, 0, len(hdr)))
+        f.write(hdr)
+        f.write(np.ascontiguousarray(data).tobytes())
+    count('elements_exported', data.size)
+    count('bytes_written', _PREFIX.size + len(hdr) + data.nbytes)
+    return _PREFIX.size + len(hdr) + data.nbytes
+
+
+def read_header(path: str) -> dict:
+    """Parse the header; adds 'offset' (start of the data section)"""
+    with open(path, 'rb') as f:
+        magic, version, _, hdr_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a .tmem file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported .tmem version {version}")
+        header = json.loads(f.read(hdr_len).decode('ascii'))
+    header['offset'] = _PREFIX.size + hdr_len
+    return header
+
+
+def load_tmem(path: str, mmap: bool = True):
+    """
+    Load a .tmem file. Returns (words, header); with mmap=True the words are a
+    read-only np.memmap view of the file (zero copy).
+    """
+    header = read_header(path)
+    shape = tuple(header['shape'])
+    dtype = np.dtype(header['dtype'])
+
+    if mmap and int(np.prod(shape)) > 0:
+        words = np.memmap(path, dtype=dtype, mode='r', offset=header['offset'], shape=shape)
+    else:
+        with open(path, 'rb') as f:
+            f.seek(header['offset'])
+            words = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return words, header
+
+
+def to_signed(words: np.ndarray, header: dict) -> np.ndarray:
+    """Sign-extend stored words to int64 (copy); unsigned data is widened only"""
+    v = np.asarray(words).astype(np.int64)
+    if header['signed']:
+        sign = 1 << (header['width'] - 1)
+        v = (v ^ sign) - sign
+    return v
+
+
+def load_words(path: str) -> np.ndarray:
+    """Raw words as int64 (same values a hex text loader returns)"""
+    words, _ = load_tmem(path)
+    return np.asarray(words).astype(np.int64)
+
+
+# ------------------------------------------------------------
+# Text <-> binary converters
+# ------------------------------------------------------------
+def read_text_words(path: str, fmt: str, width: int) -> np.ndarray:
+    """Parse a text .mem file (hex / bin spaced words, or XPM continuous hex)"""
+    rows = []
+    digits = (width + 3) // 4
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if fmt == 'xpm':
+                tokens = [line[i:i+digits] for i in range(0, len(line), digits)]
+                rows.append([int(t, 16) for t in tokens])
+            else:
+                base = 16 if fmt == 'hex' else 2
+                rows.append([int(t, base) for t in line.split()])
+    return np.array(rows, dtype=np.uint64).astype(np.int64)
+
+
+def write_text_words(path: str, words, width: int, fmt: str, upper: bool = True) -> int:
+    """Emit words as text .mem (hex / bin spaced, or XPM continuous hex)"""
+    from mem_codec import encode_lines
+
+    data = encode_lines(words, width, 'bin' if fmt == 'bin' else 'hex', upper)
+    if fmt == 'xpm':
+        data = data.replace(b' ', b'')
+    dirpath = os.path.dirname(path)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def text_to_tmem(text_path: str, out_path: str, fmt: str, width: int, frac_bits: int,
+                 signed: bool = True, layout: str = 'row') -> int:
+    return save_tmem(out_path, read_text_words(text_path, fmt, width), width, frac_bits, signed, layout)
+
+
+def tmem_to_text(path: str, out_path: str, fmt: str = 'hex', upper: bool = True) -> int:
+    words, header = load_tmem(path)
+    return write_text_words(out_path, words, header['width'], fmt, upper)
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Binary .tmem <-> text .mem converter")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p_in = sub.add_parser('to_tmem', help='text .mem -> .tmem')
+    p_in.add_argument('input')
+    p_in.add_argument('output')
+    p_in.add_argument('--format', choices=TEXT_FORMATS, default='hex')
+    p_in.add_argument('--width', type=int, required=True)
+    p_in.add_argument('--frac_bits', type=int, required=True)
+    p_in.add_argument('--unsigned', action='store_true')
+    p_in.add_argument('--layout', choices=LAYOUTS, default='row')
+
+    p_out = sub.add_parser('to_text', help='.tmem -> text .mem')
+    p_out.add_argument('input')
+    p_out.add_argument('output')
+    p_out.add_argument('--format', choices=TEXT_FORMATS, default='hex')
+    p_out.add_argument('--lower', action='store_true', help='Lowercase hex digits')
+
+    p_info = sub.add_parser('info', help='Print the .tmem header')
+    p_info.add_argument('input')
+
+    args = parser.parse_args()
+
+    if args.cmd == 'to_tmem':
+        n = text_to_tmem(args.input, args.output, args.format, args.width, args.frac_bits,
+                         not args.unsigned, args.layout)
+        print(f"[OK] {args.input} → {args.output} ({n} bytes)")
+    elif args.cmd == 'to_text':
+        n = tmem_to_text(args.input, args.output, args.format, not args.lower)
+        print(f"[OK] {args.input} → {args.output} ({n} bytes)")
+    else:
+        header = read_header(args.input)
+        for k, v in header.items():
+            print(f"{k:10}: {v}")
+
+
+if __name__ == "__main__":
+    main()
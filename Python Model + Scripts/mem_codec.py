@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+mem_codec.py
+
+Bulk text codec for .mem files: fixed-width hex / binary words, one matrix
+line per text line, words separated by a single space.
+
+Formatting is done on whole ndarrays: words are split into digits with
+shifts, mapped through an ASCII lookup table and emitted as one bytes
+buffer, instead of calling format() per element.
+
+Parsing goes the other way: text in the fixed layout above is viewed
+directly with np.frombuffer as (lines, words, digits), mapped through a
+256-entry lookup table and combined with shifts. Other layouts are split
+with bytes.split(); equal-width tokens still take the lookup-table path,
+tokens of mixed width fall back to int(token, base).
+"""
+import os
+from itertools import chain
+
+import numpy as np
+
+from instrument import count
+
+_HEX_UPPER = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+_HEX_LOWER = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_BIN = np.frombuffer(b'01', dtype=np.uint8)
+
+# ASCII -> digit value (0xFF marks an invalid character)
+_INVALID = 0xFF
+_HEX_VALUE = np.full(256, _INVALID, dtype=np.uint8)
+for _i, _ch in enumerate(b'0123456789abcdef'):
+    _HEX_VALUE[_ch] = _i
+    _HEX_VALUE[bytes([_ch]).upper()[0]] = _i
+_BIN_VALUE = np.full(256, _INVALID, dtype=np.uint8)
+_BIN_VALUE[ord('0')] = 0
+_BIN_VALUE[ord('1')] = 1
+
+# Digits materialized per chunk while formatting (bounds temporary memory)
+_CHUNK_DIGITS = 1 << 22
+
+
+def hex_digits(total_bits: int) -> int:
+    """Hex digits for a total_bits word (same as FixedPointConverter.int_to_hex)"""
+    return (total_bits + 3) // 4
+
+
+def guess_format(data: bytes, total_bits: int) -> str:
+    """'bin' if the first word is a total_bits wide 0/1 string, else 'hex'"""
+    tokens = data[:4096].split()
+    if tokens and len(tokens[0]) == total_bits > hex_digits(total_bits) and not tokens[0].strip(b'01'):
+        return 'bin'
+    return 'hex'
+
+
+def _format_params(fmt: str):
+    """(bits per digit, radix, ASCII value table, prefix letters) of a format"""
+    if fmt == 'hex':
+        return 4, 16, _HEX_VALUE, b'xX'
+    if fmt in ('bin', 'binary'):
+        return 1, 2, _BIN_VALUE, b'bB'
+    raise ValueError(f"Unknown .mem format '{fmt}'")
+
+
+def encode_lines(words, total_bits: int, fmt: str = 'hex', upper: bool = True,
+                 digits: int = None) -> bytes:
+    """
+    Format a 2-D array of words (lines x words_per_line) as .mem text.
+    Values are masked to total_bits (two's complement for negatives), which
+    matches int_to_hex / int_to_binary.
+    """
+    words = np.asarray(words)
+    if words.ndim == 1:
+        words = words[None, :]
+    if words.size == 0:
+        return b''
+
+    bits_per_digit = _format_params(fmt)[0]
+    if fmt == 'hex':
+        lut = _HEX_UPPER if upper else _HEX_LOWER
+        n = digits if digits is not None else hex_digits(total_bits)
+    else:
+        lut = _BIN
+        n = total_bits
+
+    lines, per_line = words.shape
+    mask = np.uint64((1 << total_bits) - 1)
+    digit_mask = np.uint64((1 << bits_per_digit) - 1)
+    shifts = np.arange(n - 1, -1, -1, dtype=np.uint64) * np.uint64(bits_per_digit)
+
+    chunk_lines = max(1, _CHUNK_DIGITS // max(1, per_line * n))
+    parts = []
+    for start in range(0, lines, chunk_lines):
+        block = words[start:start+chunk_lines].astype(np.int64).view(np.uint64) & mask
+        out = np.empty(block.shape + (n + 1,), dtype=np.uint8)
+        out[..., :n] = lut[(block[..., None] >> shifts) & digit_mask]
+        out[..., n] = ord(' ')
+        out[:, -1, n] = ord('\n')
+        parts.append(out.tobytes())
+    return b''.join(parts)
+
+
+def write_lines(filename: str, words, total_bits: int, fmt: str = 'hex',
+                upper: bool = True, digits: int = None) -> int:
+    """Write words as .mem text in one bulk write; returns bytes written"""
+    data = encode_lines(words, total_bits, fmt, upper, digits)
+    dirpath = os.path.dirname(filename)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(data)
+    count('elements_exported', np.size(words))
+    count('bytes_written', len(data))
+    return len(data)
+
+
+# ------------------------------------------------------------
+# Parsing
+# ------------------------------------------------------------
+def _strip_prefix(digits: np.ndarray, prefix: bytes) -> np.ndarray:
+    """Drop a 0x / 0b prefix when every token carries it"""
+    if digits.shape[-1] > 2 and np.all(digits[..., 0] == ord('0')) and \
+            np.all(np.isin(digits[..., 1], np.frombuffer(prefix, dtype=np.uint8))):
+        return digits[..., 2:]
+    return digits
+
+
+def _digits_to_words(digits: np.ndarray, fmt: str):
+    """
+    ASCII digit array (..., n) -> int64 words (...), or None when the words
+    would not fit in int64 or a character is not a plain digit (mixed 0x
+    prefixes, '_' separators...); callers then fall back to int()
+    """
+    bits_per_digit, _, table, prefix = _format_params(fmt)
+    digits = _strip_prefix(digits, prefix)
+    n = digits.shape[-1]
+    if n * bits_per_digit > 63:
+        return None
+
+    values = table[digits]
+    if np.any(values == _INVALID):
+        return None
+
+    # Horner over the (few) digit columns, each step on the whole array
+    out = np.zeros(digits.shape[:-1], dtype=np.int64)
+    for i in range(n):
+        out <<= bits_per_digit
+        out |= values[..., i]
+    return out
+
+
+def _decode_regular(data: bytes, fmt: str):
+    """
+    Fast path for the layout encode_lines writes ($readmemh style): equal
+    length lines, fixed-width words, single-space separators, '\n' endings.
+    The whole buffer is viewed as (lines, line_length) without splitting.
+    Returns None when the text is not in that layout.
+    """
+    first = data.find(b'\n')
+    if first <= 0 or not data.endswith(b'\n'):
+        return None
+    line_len = first + 1
+    if len(data) % line_len != 0:
+        return None
+
+    width = data.find(b' ')
+    if width < 0 or width > first:
+        width = first
+    if (first + 1) % (width + 1) != 0:
+        return None
+    per_line = (first + 1) // (width + 1)
+
+    buf = np.frombuffer(data, dtype=np.uint8).reshape(-1, per_line, width + 1)
+    seps = buf[:, :, width]
+    if not (np.all(seps[:, :-1] == ord(' ')) and np.all(seps[:, -1] == ord('\n'))):
+        return None
+    return _digits_to_words(buf[:, :, :width], fmt)
+
+
+def decode_tokens(tokens, fmt: str = 'hex') -> np.ndarray:
+    """Parse a list of hex / binary tokens (bytes or str) into a flat int64 array"""
+    radix = _format_params(fmt)[1]
+    if not tokens:
+        return np.zeros(0, dtype=np.int64)
+    if isinstance(tokens[0], str):
+        tokens = [t.encode('ascii') for t in tokens]
+
+    width = len(tokens[0])
+    if all(len(t) == width for t in tokens):
+        digits = np.frombuffer(b''.join(tokens), dtype=np.uint8).reshape(len(tokens), width)
+        out = _digits_to_words(digits, fmt)
+        if out is not None:
+            return out
+
+    # Mixed widths (or words wider than int64 holds): per-token parse
+    return np.array([int(t, radix) for t in tokens], dtype=np.int64)
+
+
+def decode_lines(data: bytes, fmt: str = 'hex') -> np.ndarray:
+    """
+    Parse .mem text into a 2-D int64 array (lines x words_per_line).
+    Blank lines are skipped; every other line must hold the same word count.
+    """
+    words = _decode_regular(data, fmt)
+    if words is not None:
+        return words
+
+    rows = [line.split() for line in data.splitlines()]
+    rows = [r for r in rows if r]
+    if not rows:
+        return np.zeros((0, 0), dtype=np.int64)
+    per_line = len(rows[0])
+    if any(len(r) != per_line for r in rows):
+        raise ValueError("Ragged .mem data: lines hold different word counts")
+    return decode_tokens(list(chain.from_iterable(rows)), fmt).reshape(len(rows), per_line)
+
+
+def read_lines(filename: str, fmt: str = 'hex') -> np.ndarray:
+    """Read a whole .mem text file into a 2-D int64 array"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    words = decode_lines(data, fmt)
+    count('elements_read', words.size)
+    count('bytes_read', len(data))
+    return words
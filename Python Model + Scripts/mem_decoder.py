@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+mem_decoder.py
+
+Inverse of the block-order exporters: decode a .mem file written in one of
+the block layouts back into a row-major matrix, e.g. the RTL outputs
+out_Q/K/V.mem, out_QKT.mem and out_FINAL.mem (c_v2), mem_input.mem (core_a)
+or mem_q1.mem (core_b). The word order comes from the cached block_layout
+permutation, so decoding is one np.take however large the file.
+
+Layouts and the geometry flags they use:
+    row     : plain row-major (nothing to undo)
+    core_a  : --cores_a                                 (MatrixProcessor A export)
+    core_b  : --cores_b                                 (MatrixProcessor B export)
+    core_c  : --cores_a --cores_b
+    c_v2    : --cores_a --cores_b --total_input_w --total_modules
+
+Usage:
+    # out_QKT.mem -> row-major hex (same format as the golden Q_KT_row.mem)
+    python mem_decoder.py out_QKT.mem --layout c_v2 --rows 64 --cores_a 2 --cores_b 2 \
+        --total_modules 2 --total_bits 16 --out out_QKT_row.mem
+
+    # as floats / binary container
+    python mem_decoder.py out_FINAL.mem --layout c_v2 --rows 64 --cols 64 --cores_a 2 --cores_b 4 \
+        --total_bits 8 --frac_bits 7 --out out_FINAL.txt --out_format float
+    python mem_decoder.py mem_q1.mem --layout core_b --rows 16 --cols 64 --cores_b 4 --out q1.tmem
+
+    # where do file words end up in the matrix? (LINE:WORD or flat word index)
+    python mem_decoder.py out_QKT.mem --layout c_v2 --rows 64 --cores_a 2 --cores_b 2 \
+        --total_modules 2 --where 3:17 120
+"""
+import argparse
+import os
+import numpy as np
+
+from block_layout import get_layout
+from block_matmul import BLOCK_SIZE
+from matrix_multiplier import FixedPointConverter
+from mem_binary import is_tmem, load_words, save_tmem
+from mem_codec import guess_format, read_lines, write_lines
+
+LAYOUTS = ('row', 'core_a', 'core_b', 'core_c', 'c_v2')
+OUT_FORMATS = ('hex', 'bin', 'int', 'float', 'tmem')
+
+
+# ------------------------------------------------------------
+# Decoding
+# ------------------------------------------------------------
+def layout_geometry(layout: str, cores_a: int = 1, cores_b: int = 1,
+                    total_input_w: int = 2, total_modules: int = 1) -> tuple:
+    """Geometry arguments block_layout.get_layout() takes for `layout`"""
+    if layout == 'core_a':
+        return (cores_a,)
+    if layout == 'core_b':
+        return (cores_b,)
+    if layout == 'core_c':
+        return (cores_a, cores_b)
+    if layout == 'c_v2':
+        return (cores_a, cores_b, total_input_w, total_modules)
+    raise ValueError(f"Unknown block layout '{layout}'")
+
+
+def detect_format(path: str, total_bits: int) -> str:
+    """'bin' if the first word is a total_bits wide 0/1 string, else 'hex'"""
+    with open(path, 'rb') as f:
+        return guess_format(f.read(4096), total_bits)
+
+
+def read_mem_words(path: str, fmt: str = 'auto', total_bits: int = 16) -> np.ndarray:
+    """Raw words of a text .mem (hex / bin) or .tmem file, in file order"""
+    if is_tmem(path):
+        return load_words(path)
+    if fmt == 'auto':
+        fmt = detect_format(path, total_bits)
+    return read_lines(path, fmt)
+
+
+def decode_words(words, layout: str, rows: int, cols: int = None, block_size: int = BLOCK_SIZE,
+                 **geometry) -> np.ndarray:
+    """File-order words -> (rows, cols); cols defaults to words / rows"""
+    words = np.asarray(words)
+    if cols is None:
+        if words.size % rows:
+            raise ValueError(f"{words.size} words do not split into {rows} rows")
+        cols = words.size // rows
+    if layout == 'row':
+        if words.size != rows * cols:
+            raise ValueError(f"File holds {words.size} words, expected {rows}x{cols}")
+        return words.reshape(rows, cols)
+    return get_layout(layout, rows, cols, block_size, *layout_geometry(layout, **geometry)).to_row_major(words)
+
+
+def decode_mem(path: str, layout: str, rows: int, cols: int = None, total_bits: int = 16,
+               fmt: str = 'auto', block_size: int = BLOCK_SIZE, **geometry) -> np.ndarray:
+    """Block-ordered .mem file -> row-major raw words (rows, cols)"""
+    return decode_words(read_mem_words(path, fmt, total_bits), layout, rows, cols, block_size, **geometry)
+
+
+def word_coords(index, layout: str, rows: int, cols: int, block_size: int = BLOCK_SIZE, **geometry):
+    """Flat file word indices -> (row, col) arrays in the decoded matrix"""
+    if layout == 'row':
+        return np.divmod(np.asarray(index), cols)
+    order = get_layout(layout, rows, cols, block_size, *layout_geometry(layout, **geometry)).order
+    return np.divmod(order[np.asarray(index)], cols)
+
+
+# ------------------------------------------------------------
+# Output
+# ------------------------------------------------------------
+def write_matrix(path: str, matrix: np.ndarray, conv: FixedPointConverter, out_format: str) -> int:
+    """Row-major words as hex/bin .mem, int/float text or .tmem; returns bytes written"""
+    if out_format == 'tmem':
+        return save_tmem(path, matrix, conv.total_bits, conv.fractional_bits, conv.is_signed)
+    if out_format in ('hex', 'bin'):
+        return write_lines(path, matrix, conv.total_bits, out_format)
+
+    dirpath = os.path.dirname(path)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+    if out_format == 'float':
+        np.savetxt(path, conv.fixed_to_float_array(matrix), fmt='%.6f', delimiter=' ')
+    else:
+        np.savetxt(path, conv.sign_extend_array(matrix), fmt='%d', delimiter=' ')
+    return os.path.getsize(path)
+
+
+def _parse_where(items, words_per_line: int) -> np.ndarray:
+    index = []
+    for item in items:
+        if ':' in item:
+            line, word = item.split(':', 1)
+            index.append(int(line) * words_per_line + int(word))
+        else:
+            index.append(int(item))
+    return np.array(index, dtype=np.int64)
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Decode block-ordered .mem files to row-major matrices")
+    parser.add_argument('input')
+    parser.add_argument('--layout', choices=LAYOUTS, required=True)
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--cols', type=int, default=None, help='Default: words / rows')
+    parser.add_argument('--block_size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--cores_a', type=int, default=1)
+    parser.add_argument('--cores_b', type=int, default=1)
+    parser.add_argument('--total_input_w', type=int, default=2)
+    parser.add_argument('--total_modules', type=int, default=1)
+
+    parser.add_argument('--format', choices=['auto', 'hex', 'bin'], default='auto',
+                        help='Input word format (.tmem is detected)')
+    parser.add_argument('--total_bits', type=int, default=16)
+    parser.add_argument('--frac_bits', type=int, default=8)
+    parser.add_argument('--unsigned', action='store_true')
+
+    parser.add_argument('--out', default=None, help='Write the row-major matrix here')
+    parser.add_argument('--out_format', choices=OUT_FORMATS, default=None,
+                        help='Default: tmem for *.tmem outputs, else hex')
+    parser.add_argument('--where', nargs='+', default=None, metavar='LINE:WORD',
+                        help='Print the matrix coordinates of file words (LINE:WORD or flat index)')
+    args = parser.parse_args()
+
+    geometry = dict(cores_a=args.cores_a, cores_b=args.cores_b,
+                    total_input_w=args.total_input_w, total_modules=args.total_modules)
+    conv = FixedPointConverter(args.total_bits, args.frac_bits, not args.unsigned)
+
+    words = read_mem_words(args.input, args.format, args.total_bits)
+    matrix = decode_words(words, args.layout, args.rows, args.cols, args.block_size, **geometry)
+    rows, cols = matrix.shape
+    print(f"[DECODE] {args.input}: {args.layout} → {rows}x{cols}")
+
+    if args.where:
+        per_line = words.shape[-1] if words.ndim == 2 else words.size
+        index = _parse_where(args.where, per_line)
+        r, c = word_coords(index, args.layout, rows, cols, args.block_size, **geometry)
+        flat = words.reshape(-1)
+        for i, ri, ci in zip(index.tolist(), r.tolist(), c.tolist()):
+            line, word = divmod(i, per_line)
+            print(f"  word {line}:{word} (#{i}) → [{ri}, {ci}] = {conv.int_to_hex(int(flat[i]))}")
+
+    if args.out:
+        out_format = args.out_format or ('tmem' if args.out.endswith('.tmem') else 'hex')
+        n = write_matrix(args.out, matrix, conv, out_format)
+        print(f"[OK] {args.out} ({out_format}, {n} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,24 @@
 
 # How to use:
 # python mem_processor.py exports/ --total_bits 16 --frac_bits 8 --display float
+#
+# Fast mode (vectorized decode, files processed concurrently, summary only):
+# python mem_processor.py exports/ --total_bits 16 --frac_bits 8 --fast --workers 8
+# python mem_processor.py exports/ --total_bits 16 --frac_bits 8 --fast --show_values --display float
 
 
+import io
 import os
+import re
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 
+import numpy as np
+
+from mem_codec import decode_lines, decode_tokens, guess_format, hex_digits
+
 class FixedPointConverter:
     """Handles fixed-point number conversion and binary cleanup."""
     def __init__(self, total_bits: int, fractional_bits: int, is_signed: bool = True):
@@ -145,6 +157,146 @@ def process_mem_file(file_path: str, converter: FixedPointConverter,
     print(f"\n[Saved cleaned file]  {cleaned_path}")
 
 
+# ------------------------------------------------------------
+# FAST MODE: vectorized decode, bulk write, one pool task per file
+# ------------------------------------------------------------
+_INLINE_WHITESPACE = b' \t\r\x0b\x0c'
+_BLANK_LINES = re.compile(rb'\n{2,}')
+_IS_SPACE = np.zeros(256, dtype=bool)
+_IS_SPACE[np.frombuffer(_INLINE_WHITESPACE + b'\n', dtype=np.uint8)] = True
+
+
+def clean_bytes(data: bytes) -> bytes:
+    """clean_line over a whole file: whitespace inside lines and empty lines removed"""
+    data = data.translate(None, _INLINE_WHITESPACE)
+    if b'\n\n' in data:
+        data = _BLANK_LINES.sub(b'\n', data)
+    data = data.strip(b'\n')
+    return data + b'\n' if data else b''
+
+
+def token_widths(data: bytes) -> np.ndarray:
+    """Length of every whitespace-separated token, from the run edges (no split)"""
+    word = np.zeros(len(data) + 2, dtype=bool)
+    word[1:-1] = ~_IS_SPACE[np.frombuffer(data, dtype=np.uint8)]
+    edges = np.flatnonzero(word[1:] != word[:-1]).reshape(-1, 2)
+    return edges[:, 1] - edges[:, 0]
+
+
+def decode_words(data: bytes, converter: FixedPointConverter) -> np.ndarray:
+    """All words of a file as signed/unsigned int64, lines x words (flat if ragged)"""
+    fmt = guess_format(data, converter.total_bits)
+
+    # Every word must be exactly total_bits wide (binary_to_int's rule), or
+    # total_bits / 4 hex digits; anything else would be decoded and masked
+    width = converter.total_bits if fmt == 'bin' else hex_digits(converter.total_bits)
+    widths = token_widths(data)
+    bad = widths[widths != width]
+    if bad.size:
+        raise ValueError(f"Word length {bad.min()} does not match total bits {converter.total_bits} "
+                         f"({converter.total_bits} binary or {hex_digits(converter.total_bits)} hex digits)")
+
+    try:
+        words = decode_lines(data, fmt)
+    except ValueError:
+        words = decode_tokens(data.split(), fmt)
+    words = words & ((1 << converter.total_bits) - 1)
+    if converter.is_signed:
+        sign = 1 << (converter.total_bits - 1)
+        words = (words ^ sign) - sign
+    return words
+
+
+def format_values(data: bytes, words: np.ndarray, converter: FixedPointConverter,
+                  display_format: str) -> str:
+    """Same listing process_mem_file prints, formatted per array"""
+    if display_format == "binary":
+        return "\n".join(ln.strip() for ln in data.decode('ascii').splitlines() if ln.strip())
+    words = words if words.ndim == 2 else words[None, :]
+    out = io.StringIO()
+    if display_format == "int":
+        np.savetxt(out, words, fmt='%6d', delimiter=' ')
+    else:
+        np.savetxt(out, words / (1 << converter.fractional_bits), fmt='%9.4f', delimiter=' ')
+    return out.getvalue().rstrip("\n")
+
+
+def process_mem_file_fast(file_path: str, converter: FixedPointConverter, output_dir: str,
+                          display_format: str = None) -> dict:
+    """Clean + decode one file; returns summary stats (and the listing if display_format)"""
+    t0 = time.perf_counter()
+    filename = os.path.basename(file_path)
+    result = {'file': file_path, 'type': detect_mem_type(file_path)}
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        words = decode_words(data, converter)
+        if words.size == 0:
+            result['error'] = "empty"
+            return result
+
+        os.makedirs(output_dir, exist_ok=True)
+        cleaned_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}_cleaned.mem")
+        with open(cleaned_path, "wb") as f_out:
+            f_out.write(clean_bytes(data))
+
+        scale = 1.0 / (1 << converter.fractional_bits)
+        result.update({
+            'lines': words.shape[0] if words.ndim == 2 else 1,
+            'words_per_line': words.shape[-1],
+            'words': int(words.size),
+            'bytes': len(data),
+            'min': float(words.min()) * scale,
+            'max': float(words.max()) * scale,
+            'mean': float(words.mean()) * scale,
+            'zeros': int(np.count_nonzero(words == 0)),
+            'cleaned': cleaned_path,
+        })
+        if display_format:
+            result['listing'] = format_values(data, words, converter, display_format)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - t0
+    return result
+
+
+def process_files_fast(mem_files: List[str], converter: FixedPointConverter, output_dir: str,
+                       workers: int = None, display_format: str = None) -> List[dict]:
+    """process_mem_file_fast over many files on a process pool (results in input order)"""
+    if workers == 1 or len(mem_files) == 1:
+        return [process_mem_file_fast(p, converter, output_dir, display_format) for p in mem_files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(process_mem_file_fast, mem_files,
+                             [converter] * len(mem_files), [output_dir] * len(mem_files),
+                             [display_format] * len(mem_files)))
+
+
+def print_fast_summary(results: List[dict], display_format: str, elapsed: float):
+    for r in results:
+        if 'listing' in r:
+            print("\n==============================================")
+            print(f"File: {r['file']} ({r['lines']} x {r['words_per_line']}, {display_format})")
+            print("----------------------------------------------")
+            print(r['listing'])
+
+    print(f"\n{'file':48} {'type':5} {'lines':>7} {'words/ln':>8} {'min':>10} {'max':>10} "
+          f"{'mean':>10} {'zeros':>8}")
+    total_words = total_bytes = 0
+    for r in results:
+        name = os.path.relpath(r['file'])
+        if 'error' in r:
+            print(f"{name:48} [ERROR] {r['error']}")
+            continue
+        total_words += r['words']
+        total_bytes += r['bytes']
+        print(f"{name:48} {r['type']:5} {r['lines']:7} {r['words_per_line']:8} {r['min']:10.4f} "
+              f"{r['max']:10.4f} {r['mean']:10.4f} {r['zeros']:8}")
+
+    failed = sum('error' in r for r in results)
+    print(f"\n[INFO] {len(results) - failed} files, {total_words} words, {total_bytes / (1 << 20):.1f} MB "
+          f"in {elapsed:.2f}s" + (f", {failed} failed" if failed else ""))
+
+
 # ------------------------------------------------------------
 # RECURSIVE DIRECTORY SEARCH
 # ------------------------------------------------------------
@@ -185,10 +337,38 @@ def main():
     parser.add_argument("--output_dir", type=str, default="exports",
                         help="Directory to store cleaned files")
 
+    parser.add_argument("--fast", action="store_true",
+                        help="Vectorized decode, files in parallel, summary statistics only")
+
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Fast mode: worker processes (default: CPU count)")
+
+    parser.add_argument("--show_values", action="store_true",
+                        help="Fast mode: also print the decoded values (--display format)")
+
     args = parser.parse_args()
 
     converter = FixedPointConverter(args.total_bits, args.frac_bits, args.signed)
 
+    if args.fast:
+        if os.path.isfile(args.path):
+            mem_files = [args.path]
+        elif os.path.isdir(args.path):
+            mem_files = find_all_mem_files(args.path)
+        else:
+            print("[ERROR] Path is neither a file nor a directory.")
+            return
+        if not mem_files:
+            print("[ERROR] No .mem files found in directory.")
+            return
+
+        print(f"[INFO] Found {len(mem_files)} .mem files")
+        t0 = time.perf_counter()
+        results = process_files_fast(mem_files, converter, args.output_dir, args.workers,
+                                     args.display if args.show_values else None)
+        print_fast_summary(results, args.display, time.perf_counter() - t0)
+        return
+
     # Determine file vs directory
     if os.path.isfile(args.path):
         # Single file
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+multihead_golden.py
+
+Batched golden model of multihead_attention.sv: every head reads the same
+input matrix A and has its own Wq/Wk/Wv (the per-head Generators of
+matrix_multiplier.py --unique_per_head, so a seed gives the same weights).
+All heads are stacked into (heads, rows, cols) arrays and every stage is a
+single batched call of the single-head kernels (block_matmul / fixed_matmul
+broadcast over the leading axis, softmax works along the last one):
+
+    A (rows, cols) x W (3, heads, cols, proj_dim) -> Q, K, V (heads, rows, proj_dim)
+    Q x K^T   -> (heads, rows, rows)
+    softmax   -> (heads, rows, rows)
+    S x V     -> (heads, rows, proj_dim)
+    concat    -> (rows, heads * proj_dim), head h in columns h*proj_dim ...
+
+Every head is bit-exact with run_golden_pipeline on that head's weights;
+head 1 is the single-head pipeline of the same seed.
+
+    from golden_pipeline import PipelineConfig
+    from multihead_golden import run_multihead_pipeline
+    results = run_multihead_pipeline(cfg, heads=4, out_dir="exports")
+    results['concat']   # row-major fixed-point (rows, heads * proj_dim)
+"""
+import os
+import numpy as np
+
+from golden_pipeline import (PipelineConfig, qkt_stage, softmax_stage, softmax_v_stage,
+                             _export_c, _encode_softmax, QKT_TOTAL_MODULES)
+from matrix_multiplier import matrix_rng, resolve_seed
+from block_matmul import BLOCK_SIZE
+from mem_codec import write_lines
+from instrument import count, timed
+
+
+# ----------------------------------
+# Stages
+# ----------------------------------
+@timed('multihead_projection')
+def multihead_projection_stage(cfg: PipelineConfig, heads: int) -> dict:
+    """
+    A and the Wq/Wk/Wv of every head, then Q/K/V of all heads in one
+    batched multiply. An unseeded config draws a seed and stores it in cfg.seed.
+    """
+    if heads < 1:
+        raise ValueError(f"heads must be >= 1, got {heads}")
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    cfg.seed = resolve_seed(cfg.seed)
+
+    A = processor.create_matrix(cfg.rows, cfg.cols, cfg.min_val, cfg.max_val, cfg.conv_input, True,
+                                matrix_rng(cfg.seed, 'input', 0, cfg.matrix_seeds))
+    W = np.stack([[processor.create_matrix(cfg.cols, cfg.proj_dim, cfg.min_val, cfg.max_val,
+                                           cfg.conv_weight, True,
+                                           matrix_rng(cfg.seed, name, h, cfg.matrix_seeds))
+                   for h in range(heads)]
+                  for name in ('wq', 'wk', 'wv')])
+
+    Q, K, V = processor.multiply_matrices(A, W, cfg.conv_input, cfg.conv_weight, cfg.conv_keys)
+    return {'A': A, 'Wq': W[0], 'Wk': W[1], 'Wv': W[2], 'Q': Q, 'K': K, 'V': V}
+
+
+def concat_heads(heads_out: np.ndarray) -> np.ndarray:
+    """(heads, rows, d) -> (rows, heads * d), heads side by side"""
+    h, rows, d = heads_out.shape
+    return np.ascontiguousarray(heads_out.transpose(1, 0, 2)).reshape(rows, h * d)
+
+
+# ----------------------------------
+# Full pipeline
+# ----------------------------------
+@timed('multihead_pipeline')
+def run_multihead_pipeline(cfg: PipelineConfig, heads: int, out_dir: str = None,
+                           verbose: bool = False) -> dict:
+    """
+    All heads of one attention layer, one vectorized pass per stage.
+    Returns the stacked intermediates plus 'concat'; writes the per-head
+    .mem artifacts only when out_dir is given.
+    """
+    results = multihead_projection_stage(cfg, heads)
+    results['qkt'] = qkt_stage(cfg, results['Q'], results['K'])
+    results['softmax'] = softmax_stage(cfg, results['qkt'])
+    results['final'] = softmax_v_stage(cfg, results['softmax'], results['V'])
+    results['concat'] = concat_heads(results['final'])
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        export_multihead(cfg, results, out_dir, verbose)
+    return results
+
+
+@timed('export_multihead')
+def export_multihead(cfg: PipelineConfig, results: dict, out_dir: str, verbose: bool = False):
+    """
+    Same files as the single-head pipeline with the 1-based head number
+    appended (mem_q{h}, mem_out_q{h}, Q_KT{h}, softmax_results{h},
+    final_results{h}), plus multihead_out_row.mem (the concatenation).
+    """
+    processor = cfg.processor(cfg.cores_a, cfg.total_modules)
+    processor.export_matrix(results['A'], cfg.conv_input, os.path.join(out_dir, "mem_input.mem"),
+                            mode='core', block_size=BLOCK_SIZE, num_cores=cfg.cores_a, matrix_type='A')
+
+    qkt_processor = cfg.processor(cfg.cores_a, cfg.cores_a)
+    for h in range(results['Q'].shape[0]):
+        n = h + 1
+        for name in ('q', 'k', 'v'):
+            processor.export_matrix(results[f'W{name}'][h], cfg.conv_weight,
+                                    os.path.join(out_dir, f"mem_{name}{n}.mem"),
+                                    mode='core', block_size=BLOCK_SIZE, num_cores=cfg.total_modules,
+                                    matrix_type='B')
+            _export_c(processor, results[name.upper()][h], cfg.conv_keys,
+                      os.path.join(out_dir, f"mem_out_{name}{n}.mem"), total_modules=1, verbose=verbose)
+        _export_c(qkt_processor, results['qkt'][h], cfg.conv_qkt, os.path.join(out_dir, f"Q_KT{n}.mem"),
+                  total_modules=QKT_TOTAL_MODULES, verbose=verbose)
+        data = _encode_softmax(cfg, results['softmax'][h])
+        with open(os.path.join(out_dir, f"softmax_results{n}.mem"), 'wb') as f:
+            f.write(data)
+        count('bytes_written', len(data))
+        _export_c(processor, results['final'][h], cfg.conv_final, os.path.join(out_dir, f"final_results{n}.mem"),
+                  total_modules=1, verbose=verbose)
+
+    count('bytes_written', write_lines(os.path.join(out_dir, "multihead_out_row.mem"),
+                                       results['concat'], cfg.conv_final.total_bits, 'hex'))
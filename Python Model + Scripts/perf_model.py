@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+perf_model.py
+
+Cycle-approximate performance model of the self-attention hardware:
+linear_projection (Q/K/V) -> bridge buffer 0 -> Qn x KnT -> rshift ->
+b2r_converter -> softmax_vec -> r2b_converter_v / circular FIFO ->
+bridge buffer 1 -> QKT x Vn.
+
+The model is analytic: per-tile cycle counts come from the RTL counters
+(systolic 2x2 period, accumulator_v2 INNER/BLOCK_SIZE + 1 dones, b2r fill /
+slice / output states, softmax_vec load / pass 1 / ln / pass 2 / read-out),
+and a tile-level event loop adds the hand-offs between stages: Qn x KnT waits
+for Q/K row blocks while the linear projection is still writing them
+(S_LOAD_N), a softmax row block cannot start loading before the previous one
+is done, and QKT x Vn waits for each softmax row block and for V. Small
+fixed latencies (exp / ln pipelines, BRAM reads, FIFO) are constants below.
+Numbers are meant to rank configurations, not to replace simulation.
+
+BRAM usage is the 36Kb block count of every buffer (best aspect ratio of a
+RAMB36); shallow memories are counted as distributed RAM instead.
+
+Usage:
+    python perf_model.py --rows 512 --cols 64 --proj_dim 512 --cores_a 8 --total_modules 8
+
+    # rank a grid by total cycles (or bram / util / cycles_x_bram)
+    python perf_model.py --rows 512 --cols 64 --proj_dim 512 \
+        --grid cores_a=2,4,8,16 total_modules=2,4,8 --rank_by cycles --json perf.json
+"""
+import argparse
+import itertools
+import json
+
+from block_matmul import BLOCK_SIZE
+
+CHUNK_SIZE = 4          # BLOCK_SIZE x BLOCK_SIZE words per core output
+TOTAL_INPUT_W = 2       # multi_matmul_wrapper instances (linear_proj_pkg)
+SOFTMAX_INT_WIDTH = 32  # softmax_vec works in Q16.16
+
+EXP_LATENCY = 3         # exp_vec valid pipe (DELAY)
+LN_LATENCY = 5          # sum-exp adder + lnu range reduction
+BRAM_LATENCY = 1        # xpm tdpram READ_LATENCY
+FIFO_LATENCY = 3        # circular FIFO write -> read
+DISTRIBUTED_MAX_DEPTH = 64
+
+# (depth, width) aspect ratios of a RAMB36
+BRAM36_SHAPES = ((32768, 1), (16384, 2), (8192, 4), (4096, 9), (2048, 18), (1024, 36), (512, 72))
+
+MODEL_KEYS = ('rows', 'cols', 'proj_dim', 'cores_a', 'total_modules', 'block_size', 'chunk_size',
+              'input_total_bits', 'weight_total_bits', 'soft_total_bits', 'final_total_bits')
+RANK_KEYS = {
+    'cycles': lambda r: r['total_cycles'],
+    'bram': lambda r: (r['bram36'], r['total_cycles']),
+    'util': lambda r: -r['utilization'],
+    'cycles_x_bram': lambda r: r['total_cycles'] * max(r['bram36'], 1),
+}
+
+
+# ------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------
+class HwConfig:
+    """RTL parameters of one attention head, derived like run_pipeline.sh / the *_pkg.sv files"""
+
+    def __init__(self, rows: int, cols: int, proj_dim: int, cores_a: int, total_modules: int,
+                 block_size: int = BLOCK_SIZE, chunk_size: int = CHUNK_SIZE,
+                 input_total_bits: int = 16, weight_total_bits: int = 16,
+                 soft_total_bits: int = 8, final_total_bits: int = 8):
+        self.rows = rows
+        self.cols = cols
+        self.proj_dim = proj_dim
+        self.cores_a = cores_a
+        self.total_modules = total_modules
+        self.block_size = block_size
+        self.chunk_size = chunk_size
+
+        self.input_bits = input_total_bits
+        self.weight_bits = weight_total_bits
+        self.keys_bits = input_total_bits + 2
+        self.qkt_bits = self.keys_bits + 4
+        self.soft_bits = soft_total_bits
+        self.final_bits = final_total_bits
+
+        bs = block_size
+        # linear_proj_pkg (NUM_CORES_B = 1)
+        self.row_size = self._div(rows, bs * cores_a * TOTAL_INPUT_W, 'ROW_SIZE_MAT_C')
+        self.col_size = self._div(proj_dim, bs * total_modules, 'COL_SIZE_MAT_C')
+        self.max_flag = self.row_size * self.col_size
+        self.num_a_elements = self._div((rows // bs) * self._div(cols, bs, 'INNER / BLOCK_SIZE'),
+                                        cores_a, 'NUM_A_ELEMENTS')
+        self.num_b_elements = self._div((proj_dim // bs) * (cols // bs), total_modules, 'NUM_B_ELEMENTS')
+        # self_attention_pkg
+        self.tile_softmax = cores_a * TOTAL_INPUT_W * bs
+        self.total_tile_softmax = self._div(rows, self.tile_softmax, 'TOTAL_TILE_SOFTMAX')
+        self.outputs_per_tile = self.tile_softmax // bs
+        self.softmax_row = cores_a * bs
+        self.num_banks_fifo = self.total_tile_softmax
+        self.fifo_depth = max(16, self.outputs_per_tile)
+        self.max_flag_qkt = self.row_size * self.row_size
+        self.max_flag_final = self.max_flag
+
+    @staticmethod
+    def _div(a: int, b: int, name: str) -> int:
+        if b <= 0 or a % b or a < b:
+            raise ValueError(f"{name}: {a} is not a positive multiple of {b}")
+        return a // b
+
+    def pipeline_params(self) -> dict:
+        """The derived parameters run_pipeline.sh logs"""
+        return {
+            'ROW_SIZE_MAT_KEYS': self.row_size,
+            'COL_SIZE_MAT_KEYS': self.col_size,
+            'MAX_FLAG_MAT_KEYS': self.max_flag,
+            'ROW_SIZE_MAT_Q_KT': self.row_size,
+            'COL_SIZE_MAT_Q_KT': self.row_size,
+            'MAX_FLAG_MAT_Q_KT': self.max_flag_qkt,
+            'SOFTMAX_ROW': self.softmax_row,
+            'TOTAL_TILE_SOFT': self.total_tile_softmax,
+            'NUM_BANK_FIFO_MIN': self.num_banks_fifo,
+            'NUM_BANK_FIFO_MAX': self.tile_softmax // 2,
+            'ROW_SIZE_MAT_FINAL': self.row_size,
+            'COL_SIZE_MAT_FINAL': self.col_size,
+            'MAX_FLAG_MAT_FINAL': self.max_flag_final,
+        }
+
+    def as_dict(self) -> dict:
+        return {'rows': self.rows, 'cols': self.cols, 'proj_dim': self.proj_dim,
+                'cores_a': self.cores_a, 'total_modules': self.total_modules,
+                'block_size': self.block_size, 'chunk_size': self.chunk_size,
+                'input_total_bits': self.input_bits, 'weight_total_bits': self.weight_bits,
+                'soft_total_bits': self.soft_bits, 'final_total_bits': self.final_bits}
+
+
+# ------------------------------------------------------------
+# Per-tile cycle counts
+# ------------------------------------------------------------
+def systolic_period(block_size: int) -> int:
+    """2x2 systolic array: counts 0..2*bs, then the controller resets it (2 cycles)"""
+    return 2 * block_size + 3
+
+
+def matmul_tile_cycles(inner: int, block_size: int) -> int:
+    """One output tile: accumulator_v2 fires after INNER/bs + 1 systolic dones"""
+    return (inner // block_size + 1) * systolic_period(block_size) + BRAM_LATENCY
+
+
+def b2r_tile_cycles(hw: HwConfig) -> int:
+    """b2r_converter: FILL (1 word) + SLICE_RD + one output row per cycle (ROW = cores_a * bs)"""
+    return 1 + 1 + hw.softmax_row + 2
+
+
+def softmax_post_cycles(hw: HwConfig) -> int:
+    """softmax_vec after the last tile is loaded: pass 1, ln, pass 2 (2 tiles/cycle), read-out"""
+    half = -(-hw.total_tile_softmax // 2)
+    return 2 * (half + EXP_LATENCY) + LN_LATENCY + hw.total_tile_softmax + BRAM_LATENCY
+
+
+def r2b_cycles(hw: HwConfig) -> int:
+    """r2b_converter_v: converters work per tile in parallel, OUTPUTS_PER_TILE words each"""
+    return hw.outputs_per_tile + 2
+
+
+# ------------------------------------------------------------
+# Timeline
+# ------------------------------------------------------------
+def _stage(start, end, tiles, tile_cycles, stall, **extra) -> dict:
+    out = {'start': start, 'end': end, 'tiles': tiles, 'tile_cycles': tile_cycles,
+           'busy': tiles * tile_cycles, 'stall': stall}
+    out.update(extra)
+    return out
+
+
+def simulate(hw: HwConfig) -> dict:
+    """Tile-level timeline of one head; returns the per-stage start/end/busy/stall cycles"""
+    bs = hw.block_size
+    R = hw.row_size
+
+    # Linear projection (Q, K, V run side by side on their own weight BRAMs)
+    load = -(-hw.num_a_elements // 2)           # two write ports into the input BRAM
+    lp_tile = matmul_tile_cycles(hw.cols, bs)
+    lp_step = max(lp_tile, hw.total_modules)    # outputs are sliced into buffer 0 over TOTAL_MODULES cycles
+    lp_end = load + hw.max_flag * lp_step + hw.total_modules
+    # row block r of W0/N0 is complete once its COL_SIZE_MAT_C tiles are written
+    row_ready = [load + (r + 1) * hw.col_size * lp_step + hw.total_modules for r in range(R)]
+    stages = {'load_input': _stage(0, load, 1, load, 0),
+              'linear_proj': _stage(load, lp_end, hw.max_flag, lp_tile,
+                                    hw.max_flag * (lp_step - lp_tile))}
+
+    # Qn x KnT -> rshift -> b2r, softmax row blocks
+    qkt_tile = matmul_tile_cycles(hw.proj_dim, bs)
+    b2r_tile = b2r_tile_cycles(hw)
+    qkt_step = max(qkt_tile, b2r_tile)
+    soft_post = softmax_post_cycles(hw)
+    t = row_ready[0]
+    qkt_start = t
+    first_out = qkt_start + qkt_step + 1 + b2r_tile
+    stall_lp = stall_soft = 0
+    soft_load_end, soft_end = [], []
+    for i in range(R):
+        for j in range(R):
+            need = max(row_ready[i], row_ready[j])
+            if j == 0 and i > 0:
+                # softmax units take block i only after block i-1 is out (S_DONE -> reset)
+                free = soft_end[i - 1] - qkt_step - b2r_tile
+                if free > max(t, need):
+                    stall_soft += free - max(t, need)
+                    need = free
+            if need > t:
+                stall_lp += need - t
+                t = need
+            t += qkt_step
+        soft_load_end.append(t + 1 + b2r_tile)  # + rshift register
+        soft_end.append(soft_load_end[-1] + soft_post)
+    qkt_end = t
+    stages['qkt'] = _stage(qkt_start, qkt_end, hw.max_flag_qkt, qkt_tile, stall_lp + stall_soft,
+                           stall_wait_lp=stall_lp, stall_wait_softmax=stall_soft)
+    stages['b2r'] = _stage(qkt_start + qkt_step + 1, qkt_end + 1 + b2r_tile, hw.max_flag_qkt, b2r_tile, 0)
+    stages['softmax'] = _stage(first_out, soft_end[-1], R, soft_post, 0)
+
+    # r2b + FIFO -> buffer 1, then QKT x Vn
+    r2b = r2b_cycles(hw)
+    w1_ready = [e + r2b + FIFO_LATENCY for e in soft_end]
+    stages['r2b_fifo'] = _stage(soft_end[0], w1_ready[-1], R, r2b + FIFO_LATENCY, 0)
+
+    final_tile = matmul_tile_cycles(hw.rows, bs)
+    t = max(w1_ready[0], lp_end)
+    final_start = t
+    stall = 0
+    for i in range(R):
+        need = max(w1_ready[i], lp_end)
+        if need > t:
+            stall += need - t
+            t = need
+        t += hw.col_size * final_tile
+    stages['qkt_v'] = _stage(final_start, t, hw.max_flag_final, final_tile, stall)
+    return stages
+
+
+# ------------------------------------------------------------
+# Resources
+# ------------------------------------------------------------
+def bram36_blocks(depth: int, width: int) -> int:
+    """RAMB36 count of a depth x width memory (best aspect ratio)"""
+    return min(-(-depth // d) * -(-width // w) for d, w in BRAM36_SHAPES)
+
+
+def memories(hw: HwConfig) -> list:
+    """(name, depth, width, count) of every buffer of one head"""
+    ts, T = hw.tile_softmax, hw.total_tile_softmax
+    c, ca, tm = hw.chunk_size, hw.cores_a, hw.total_modules
+    bs = hw.block_size
+    in_b2r_width = hw.qkt_bits * c * ca * (ca * TOTAL_INPUT_W)
+    return [
+        ('input_A', hw.num_a_elements, hw.input_bits * c * ca, 1),
+        ('weight_QKV', hw.num_b_elements, hw.weight_bits * c * tm, 3),
+        ('buffer0_W0_Q', hw.row_size * hw.col_size * tm, hw.keys_bits * c * ca * TOTAL_INPUT_W, 1),
+        ('buffer0_N0_K', hw.row_size * hw.col_size * tm, hw.keys_bits * c * ca * TOTAL_INPUT_W, 1),
+        ('b2r_ram', 1, in_b2r_width, TOTAL_INPUT_W),
+        ('softmax_temp', T, SOFTMAX_INT_WIDTH * ts, TOTAL_INPUT_W * hw.softmax_row),
+        ('softmax_out', T, hw.soft_bits * ts, TOTAL_INPUT_W * hw.softmax_row),
+        ('r2b_fifo', hw.fifo_depth, hw.soft_bits * c * ca, TOTAL_INPUT_W * hw.num_banks_fifo),
+        ('buffer1_W1_S', hw.row_size * (hw.rows // bs), hw.soft_bits * c * ca * TOTAL_INPUT_W, 1),
+        ('buffer1_N1_V', (hw.rows // bs) * hw.col_size, hw.keys_bits * c * tm, 1),
+    ]
+
+
+def bram_usage(hw: HwConfig) -> list:
+    """memories() with bits and RAMB36 counts (0 for distributed RAM)"""
+    rows = []
+    for name, depth, width, count in memories(hw):
+        distributed = depth <= DISTRIBUTED_MAX_DEPTH
+        rows.append({'name': name, 'depth': depth, 'width': width, 'count': count,
+                     'bits': depth * width * count,
+                     'bram36': 0 if distributed else bram36_blocks(depth, width) * count,
+                     'distributed': distributed})
+    return rows
+
+
+def pe_counts(hw: HwConfig) -> dict:
+    """Processing elements (bs x bs per core) of each matmul stage"""
+    pe = hw.block_size * hw.block_size
+    return {'linear_proj': 3 * TOTAL_INPUT_W * hw.total_modules * hw.cores_a * pe,
+            'qkt': TOTAL_INPUT_W * TOTAL_INPUT_W * hw.cores_a * hw.cores_a * pe,
+            'qkt_v': TOTAL_INPUT_W * hw.cores_a * hw.total_modules * pe}
+
+
+# ------------------------------------------------------------
+# Estimate
+# ------------------------------------------------------------
+def estimate(hw: HwConfig) -> dict:
+    """Cycles, stalls, bottleneck, PE utilization and BRAM of one configuration"""
+    stages = simulate(hw)
+    total = max(s['end'] for s in stages.values())
+    macs = {'linear_proj': 3 * hw.rows * hw.cols * hw.proj_dim,
+            'qkt': hw.rows * hw.rows * hw.proj_dim,
+            'qkt_v': hw.rows * hw.rows * hw.proj_dim}
+    pes = pe_counts(hw)
+    for name, n in macs.items():
+        span = stages[name]['end'] - stages[name]['start']
+        stages[name]['utilization'] = n / (pes[name] * span) if span else 0.0
+    memory = bram_usage(hw)
+    return {
+        'config': hw.as_dict(),
+        'params': hw.pipeline_params(),
+        'total_cycles': total,
+        'stall_cycles': sum(s['stall'] for s in stages.values()),
+        'bottleneck': max(stages, key=lambda k: stages[k]['busy']),
+        'utilization': sum(macs.values()) / (sum(pes.values()) * total),
+        'pes': sum(pes.values()),
+        'bram36': sum(m['bram36'] for m in memory),
+        'lutram_bits': sum(m['bits'] for m in memory if m['distributed']),
+        'stages': stages,
+        'memories': memory,
+    }
+
+
+def rank(configs: list, rank_by: str = 'cycles') -> list:
+    """estimate() of every config dict, invalid ones last with their error"""
+    ok, bad = [], []
+    for index, params in enumerate(configs):
+        try:
+            result = estimate(HwConfig(**params))
+            result['id'] = index
+            ok.append(result)
+        except ValueError as e:
+            bad.append({'id': index, 'config': params, 'error': str(e)})
+    ok.sort(key=RANK_KEYS[rank_by])
+    return ok + bad
+
+
+# ------------------------------------------------------------
+# Report
+# ------------------------------------------------------------
+def print_report(result: dict, clock_mhz: float):
+    print("Derived run_pipeline.sh parameters")
+    for k, v in result['params'].items():
+        print(f"  {k:<20}: {v}")
+
+    print(f"\n{'stage':<12} {'start':>10} {'end':>10} {'tiles':>7} {'tile_cyc':>9} {'busy':>10} {'stall':>9} {'util':>6}")
+    for name, s in result['stages'].items():
+        util = f"{s['utilization'] * 100:5.1f}%" if 'utilization' in s else '-'
+        print(f"{name:<12} {s['start']:>10} {s['end']:>10} {s['tiles']:>7} {s['tile_cycles']:>9} "
+              f"{s['busy']:>10} {s['stall']:>9} {util:>6}")
+    qkt = result['stages']['qkt']
+    print(f"  qkt stalls: {qkt['stall_wait_lp']} waiting for Q/K, {qkt['stall_wait_softmax']} waiting for softmax")
+
+    print(f"\n{'memory':<14} {'depth':>7} {'width':>7} {'count':>6} {'kbit':>9} {'bram36':>7}")
+    for m in result['memories']:
+        b36 = 'lutram' if m['distributed'] else m['bram36']
+        print(f"{m['name']:<14} {m['depth']:>7} {m['width']:>7} {m['count']:>6} {m['bits'] / 1024:>9.1f} {b36:>7}")
+
+    total = result['total_cycles']
+    print(f"\nTotal       : {total} cycles ({total / clock_mhz:.1f} us @ {clock_mhz:g} MHz)")
+    print(f"Stalls      : {result['stall_cycles']} cycles, bottleneck: {result['bottleneck']}")
+    print(f"PEs         : {result['pes']} ({result['utilization'] * 100:.1f}% utilized)")
+    print(f"BRAM        : {result['bram36']} RAMB36 + {result['lutram_bits'] / 1024:.1f} kbit distributed")
+
+
+def print_ranking(results: list, grid_keys, clock_mhz: float):
+    cols = ['id'] + list(grid_keys)
+    print(" ".join(f"{c:>13}" for c in cols) +
+          f" {'cycles':>10} {'us':>9} {'stall':>9} {'util':>6} {'bram36':>7}  bottleneck")
+    for r in results:
+        head = " ".join(f"{str(r['id'] if c == 'id' else r['config'][c]):>13}" for c in cols)
+        if 'error' in r:
+            print(f"{head}  ❌ {r['error']}")
+            continue
+        print(f"{head} {r['total_cycles']:>10} {r['total_cycles'] / clock_mhz:>9.1f} {r['stall_cycles']:>9} "
+              f"{r['utilization'] * 100:>5.1f}% {r['bram36']:>7}  {r['bottleneck']}")
+
+
+def parse_grid(items) -> dict:
+    """['cores_a=2,4', 'total_modules=8'] -> {'cores_a': [2, 4], 'total_modules': [8]}"""
+    out = {}
+    for item in items or []:
+        key, _, values = item.partition('=')
+        key = key.strip()
+        if key not in MODEL_KEYS:
+            raise ValueError(f"Unknown model key '{key}' (expected one of {list(MODEL_KEYS)})")
+        if not values:
+            raise ValueError(f"Expected KEY=V1,V2, got '{item}'")
+        out[key] = [int(v) for v in values.split(',')]
+    return out
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Cycle-approximate performance model of the attention head")
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--cols', type=int, required=True)
+    parser.add_argument('--proj_dim', type=int, required=True)
+    parser.add_argument('--cores_a', type=int, default=2)
+    parser.add_argument('--total_modules', type=int, default=2)
+    parser.add_argument('--block_size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--chunk_size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--input_total_bits', type=int, default=16)
+    parser.add_argument('--weight_total_bits', type=int, default=16)
+    parser.add_argument('--soft_total_bits', type=int, default=8)
+    parser.add_argument('--final_total_bits', type=int, default=8)
+
+    parser.add_argument('--grid', nargs='+', action='extend', default=[], metavar='KEY=V1,V2',
+                        help='Rank every combination of these values')
+    parser.add_argument('--rank_by', choices=list(RANK_KEYS), default='cycles')
+    parser.add_argument('--clock_mhz', type=float, default=100.0)
+    parser.add_argument('--json', type=str, default=None)
+    args = parser.parse_args()
+
+    base = {k: getattr(args, k) for k in MODEL_KEYS}
+    grid = parse_grid(args.grid)
+
+    if not grid:
+        result = estimate(HwConfig(**base))
+        print_report(result, args.clock_mhz)
+        results = [result]
+    else:
+        keys = list(grid)
+        configs = [dict(base, **dict(zip(keys, combo))) for combo in itertools.product(*grid.values())]
+        results = rank(configs, args.rank_by)
+        print(f"[PERF] {len(configs)} configs ranked by {args.rank_by}\n")
+        print_ranking(results, keys, args.clock_mhz)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'base': base, 'grid': grid, 'rank_by': args.rank_by, 'results': results}, f, indent=2)
+        print(f"\nJSON: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
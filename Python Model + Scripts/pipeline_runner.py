@@ -2,19 +2,53 @@
 
 import os
 import sys
+import json
 import subprocess
 import argparse
+import tempfile
 sys.executable
 
+from golden_pipeline import PipelineConfig, run_golden_pipeline, run_streaming_pipeline
+from fused_attention import run_fused_pipeline, DEFAULT_KEY_TILE
+from multihead_golden import run_multihead_pipeline
+from golden_cache import GoldenCache, stage_key
+from softmax import SoftmaxTables
+import instrument
+
 """
 example run:
 python "d:\DATA\Documents\Xirka Internship\PME\Transformer\transformer\Python Model + Scripts\pipeline_runner.py" --rows 16 --cols 10 --proj_dim 12 --cores_a 2  --total_modules 2 --out_dir exports
 """
 
-def run_cmd(cmd):
+def run_cmd(cmd, name=None):
+    """
+    Run one stage script. With instrumentation on, the child writes its own
+    trace (INSTRUMENT_TRACE) which is folded in under this step's stage.
+    """
     print("\n[RUNNING]")
     print(" ".join(cmd))
-    result = subprocess.run(cmd)
+    name = name or os.path.splitext(os.path.basename(cmd[1]))[0]
+
+    with instrument.stage(name):
+        env = None
+        trace_path = None
+        if instrument.enabled():
+            fd, trace_path = tempfile.mkstemp(prefix=f"trace_{name}_", suffix=".json")
+            os.close(fd)
+            env = dict(os.environ, INSTRUMENT_TRACE=trace_path,
+                       INSTRUMENT_PROFILE='1' if instrument.INSTRUMENT.profile else '0',
+                       INSTRUMENT_MEMORY='1' if instrument.INSTRUMENT.memory else '0')
+
+        result = subprocess.run(cmd, env=env)
+
+        if trace_path:
+            try:
+                if os.path.getsize(trace_path):
+                    with open(trace_path) as f:
+                        instrument.merge_trace(json.load(f))
+            finally:
+                os.remove(trace_path)
+
     if result.returncode != 0:
         raise RuntimeError("Command failed!")
 
@@ -39,6 +73,13 @@ def main():
         help='Choose RTL-like softmax or real softmax'
     )
 
+    parser.add_argument(
+        '--matmul_engine',
+        choices=['float', 'exact', 'mac'],
+        default='float',
+        help='float64 round-trip or integer datapath (mac = multi_matmul RTL model)'
+    )
+
     # Input matrix precision
     parser.add_argument('--input_total_bits', type=int, default=16)
     parser.add_argument('--input_frac_bits', type=int, default=8)
@@ -65,10 +106,151 @@ def main():
 
     parser.add_argument('--out_dir', type=str, default="exports")
 
+    parser.add_argument(
+        '--engine',
+        choices=['inprocess', 'subprocess'],
+        default='inprocess',
+        help='inprocess: pass ndarrays between stages, subprocess: chain the stage scripts'
+    )
+    parser.add_argument('--no_mem', action='store_true',
+                        help='inprocess only: skip writing the .mem artifacts')
+    parser.add_argument('--verbose', action='store_true',
+                        help='inprocess only: print the RTL-format debug lines')
+    parser.add_argument('--stream', action='store_true',
+                        help='inprocess only: compute QK^T / softmax / final one row tile at a time')
+    parser.add_argument('--stream_groups', type=int, default=1,
+                        help='Row groups (cores_a * total_input_w * block_size rows) per streamed tile')
+    parser.add_argument('--fused', action='store_true',
+                        help='inprocess only: fused softmax(QK^T)V, no Q_KT / softmax artifacts')
+    parser.add_argument('--key_tile', type=int, default=DEFAULT_KEY_TILE,
+                        help='Keys per tile in --fused mode')
+    parser.add_argument('--heads', type=int, default=1,
+                        help='inprocess only: > 1 runs all heads batched (per-head weights, '
+                             'artifacts suffixed with the head number + multihead_out_row.mem)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed for A / Wq / Wk / Wv (required for --cache_dir)')
+    parser.add_argument('--matrix_seed', action='append', default=[], metavar='NAME=SEED',
+                        help='Explicit seed for one matrix: input, wq1, wk1, wv1 (repeatable)')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help='inprocess only: reuse stage results keyed by config + seed')
+    parser.add_argument('--cache_max_mb', type=int, default=2048,
+                        help='Size bound of --cache_dir (least recently used entries are evicted)')
+    parser.add_argument('--softmax_tables', action='store_true',
+                        help='rtl softmax by precomputed exp / Q_KT input tables (kept in --cache_dir if given)')
+
+    # Instrumentation (any of these turns it on)
+    parser.add_argument('--timing', action='store_true',
+                        help='Print the per-stage timing / counter table at the end')
+    parser.add_argument('--profile', action='store_true',
+                        help='cProfile every top-level stage (top functions go into the JSON trace)')
+    parser.add_argument('--trace_memory', action='store_true',
+                        help='tracemalloc peak per stage (slows the run down)')
+    parser.add_argument('--trace_json', type=str, default=None,
+                        help='Write the stage summary + Chrome trace events to this JSON file')
+
     args = parser.parse_args()
 
+    if args.timing or args.profile or args.trace_memory or args.trace_json:
+        instrument.enable(profile=args.profile, memory=args.trace_memory)
+    try:
+        with instrument.stage('pipeline'):
+            run_pipeline(args)
+    finally:
+        if instrument.enabled():
+            print("\n[TIMING]")
+            print(instrument.summary_table())
+            if args.trace_json:
+                instrument.write_trace(args.trace_json)
+                print(f"Trace: {args.trace_json}")
+
+
+def softmax_tables(args):
+    """SoftmaxTables for --softmax_tables (on disk in --cache_dir when given), else None"""
+    if not args.softmax_tables:
+        return None
+    cache = GoldenCache(args.cache_dir, max_bytes=args.cache_max_mb << 20) if args.cache_dir else None
+    return SoftmaxTables(cache)
+
+
+def clear_stamp(stamp):
+    """Drop golden_key.txt before out_dir is rewritten (it only vouches for a cached export)"""
+    if os.path.isfile(stamp):
+        os.remove(stamp)
+
+
+def run_pipeline(args):
     os.makedirs(args.out_dir, exist_ok=True)
 
+    FINAL = os.path.join(args.out_dir, "final_results.mem")
+    STAMP = os.path.join(args.out_dir, "golden_key.txt")
+
+    if args.heads > 1 and args.engine != 'inprocess':
+        raise ValueError("--heads > 1 needs --engine inprocess")
+
+    if args.engine == 'inprocess' and args.heads > 1:
+        if args.stream or args.fused or args.cache_dir:
+            print("[WARN] --stream / --fused / --cache_dir stage caching are ignored with --heads > 1")
+        cfg = PipelineConfig.from_args(args)
+        cfg.softmax_tables = softmax_tables(args)
+        if not args.no_mem:
+            clear_stamp(STAMP)
+        run_multihead_pipeline(cfg, args.heads, out_dir=None if args.no_mem else args.out_dir,
+                               verbose=args.verbose)
+        print(f"[SEED] {cfg.seed}")
+        print(f"\n✅ PIPELINE COMPLETE ({args.heads} heads)")
+        print(f"Final result: {os.path.join(args.out_dir, 'multihead_out_row.mem')}")
+        return
+
+    if args.engine == 'inprocess':
+        cfg = PipelineConfig.from_args(args)
+        cfg.softmax_tables = softmax_tables(args)
+        out_dir = None if args.no_mem else args.out_dir
+
+        cache = None
+        if args.cache_dir:
+            if args.seed is None:
+                print("[WARN] --cache_dir needs --seed (unseeded inputs are not reproducible), cache disabled")
+            elif args.fused or args.stream:
+                print("[WARN] --cache_dir stage caching is ignored with --stream / --fused")
+            else:
+                cache = GoldenCache(args.cache_dir, max_bytes=args.cache_max_mb << 20)
+
+        # Artifacts already exported for this exact config (RTL-only rerun): nothing to do
+        stamp_key = None
+        if cache is not None and out_dir:
+            stamp_key = stage_key('export', {'cores_a': cfg.cores_a, 'total_modules': cfg.total_modules},
+                                  [cfg.stage_keys()['final']])
+            if os.path.isfile(FINAL) and os.path.isfile(STAMP):
+                with open(STAMP) as f:
+                    if f.read().strip() == stamp_key:
+                        print(f"\n✅ PIPELINE UP TO DATE ({stamp_key[:12]})")
+                        print(f"Final result: {FINAL}")
+                        return
+        if out_dir:
+            clear_stamp(STAMP)
+
+        if args.fused:
+            run_fused_pipeline(cfg, out_dir=out_dir, verbose=args.verbose,
+                               groups_per_tile=args.stream_groups, key_tile=args.key_tile)
+        elif args.stream:
+            run_streaming_pipeline(cfg, out_dir=out_dir, verbose=args.verbose,
+                                   groups_per_tile=args.stream_groups)
+        else:
+            run_golden_pipeline(cfg, out_dir=out_dir, verbose=args.verbose, cache=cache)
+
+        print(f"[SEED] {cfg.seed}")
+        if cache is not None:
+            print(f"[CACHE] {cache.hits} hit(s), {cache.misses} miss(es), {cache.size() >> 20} MB in {cache.root}")
+            if stamp_key:
+                with open(STAMP, 'w') as f:
+                    f.write(stamp_key + "\n")
+
+        print("\n✅ PIPELINE COMPLETE")
+        print(f"Final result: {FINAL}")
+        return
+
+    clear_stamp(STAMP)
+
     # ----------------------------------
     # STEP 1: MATRIX MULTIPLIER
     # ----------------------------------
@@ -103,8 +285,13 @@ def main():
         "--export_c_v2",
         "--output_format", "hex",
 
+        "--matmul_engine", args.matmul_engine,
+
+        *(["--seed", str(args.seed)] if args.seed is not None else []),
+        *[arg for item in args.matrix_seed for arg in ("--matrix_seed", item)],
+
         "--out_dir", args.out_dir
-    ])
+    ], name="linear_projection")
 
     Q = os.path.join(args.out_dir, "mem_out_q1_row.mem")
     K = os.path.join(args.out_dir, "mem_out_k1_row.mem")
@@ -113,7 +300,6 @@ def main():
     QKT = os.path.join(args.out_dir, "Q_KT.mem")
     QKT_as_input = os.path.join(args.out_dir, "Q_KT_row.mem")
     SOFTMAX = os.path.join(args.out_dir, "softmax_results.mem")
-    FINAL = os.path.join(args.out_dir, "final_results.mem")
 
     # ----------------------------------
     # STEP 2: Q × K^T
@@ -143,13 +329,21 @@ def main():
         "--transpose_B",
         "--export_c_v2",
 
+        "--matmul_engine", args.matmul_engine,
+
         "--output_file", QKT
-    ])
+    ], name="qkt")
 
         # ----------------------------------
     # STEP 3: SOFTMAX
     # ----------------------------------
     if args.softmax_mode == "rtl":
+        tables = []
+        if args.softmax_tables:
+            tables = ["--tables"]
+            if args.cache_dir:
+                # same bound as the golden cache: eviction walks the whole directory
+                tables += ["--tables_dir", args.cache_dir, "--tables_max_mb", str(args.cache_max_mb)]
         run_cmd([
             sys.executable,
             r"/mnt/ssd/mfauzan/transformer/python_code/softmax.py",
@@ -171,7 +365,7 @@ def main():
             "--frac_out", str(args.soft_frac_bits),
 
             "--output_file", SOFTMAX
-        ])
+        ] + tables, name="softmax")
     else:
         run_cmd([
             sys.executable,
@@ -191,7 +385,7 @@ def main():
             "--frac_out", str(args.soft_frac_bits),
 
             "--output_file", SOFTMAX
-        ])
+        ], name="softmax")
 
     # ----------------------------------
     # STEP 4: SOFTMAX × V
@@ -220,8 +414,10 @@ def main():
 
         "--export_c_v2",
 
+        "--matmul_engine", args.matmul_engine,
+
         "--output_file", FINAL
-    ])
+    ], name="softmax_v")
 
     print("\n✅ PIPELINE COMPLETE")
     print(f"Final result: {FINAL}")
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+regression.py
+
+Local job scheduler for RTL regressions: the run_pipeline.sh steps
+(golden model -> bin2hex cleaning -> simulation -> compare.py) of many
+configurations are queued as jobs with dependencies and run on N worker
+slots, with per-job timeouts and retries. The compare.py JSON reports of
+every configuration are collected into one summary.
+
+The simulator is a command template, so Vivado can be swapped for anything
+that writes out_Q/out_K/out_V/out_QKT/out_FINAL.mem into {hw_dir}:
+    --sim vivado        vivado -mode batch -source run_sim.tcl -tclargs ...
+    --sim stub          this script's stub_sim subcommand (copies the golden
+                        files, optionally flipping bits) - no Vivado needed
+    --sim "my_sim {hw_dir} {clean_dir} {rows}"   any template; placeholders
+                        are the config keys plus root/soft_dir/clean_dir/hw_dir
+
+Usage:
+    python regression.py run --rows 64 --cols 16 --proj_dim 64 \
+        --grid cores_a=2,4 total_modules=2,4 --set soft_total_bits=16 soft_frac_bits=15 \
+        --slots 4 --timeout 3600 --retries 1 --sim stub --out_dir regress
+
+    python regression.py stub_sim --soft_dir regress/cfg_000/software --hw_dir regress/cfg_000/hardware
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+from sweep import parse_assignments, expand_grid, CONFIG_KEYS
+from matrix_multiplier import resolve_seed
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+VIVADO_SIM = ("vivado -mode batch -source {root}/run_sim.tcl -tclargs {hw_dir} "
+              "{clean_dir}/mem_input_hex.mem {clean_dir}/mem_q1_hex.mem "
+              "{clean_dir}/mem_k1_hex.mem {clean_dir}/mem_v1_hex.mem "
+              "{input_total_bits} {input_frac_bits} {weight_total_bits} {weight_frac_bits} "
+              "{soft_total_bits} {soft_frac_bits} {final_total_bits} {final_frac_bits} "
+              "{rows} {cols} {proj_dim} {cores_a} {total_modules}")
+STUB_SIM = "{python} {root}/regression.py stub_sim --soft_dir {soft_dir} --hw_dir {hw_dir}"
+SIMULATORS = {'vivado': VIVADO_SIM, 'stub': STUB_SIM}
+
+# golden file -> simulator output, compare precision, c_v2 geometry (cols, cores_b, total_modules)
+COMPARES = {
+    'q':     ('mem_out_q1.mem',    'out_Q.mem',     'keys',  'proj_dim', 'total_modules', 1),
+    'k':     ('mem_out_k1.mem',    'out_K.mem',     'keys',  'proj_dim', 'total_modules', 1),
+    'v':     ('mem_out_v1.mem',    'out_V.mem',     'keys',  'proj_dim', 'total_modules', 1),
+    'qkt':   ('Q_KT.mem',          'out_QKT.mem',   'qkt',   'rows',     'cores_a',       2),
+    'final': ('final_results.mem', 'out_FINAL.mem', 'final', 'proj_dim', 'total_modules', 1),
+}
+CLEANED = (('mem_input.mem', 'input'), ('mem_q1.mem', 'weight'),
+           ('mem_k1.mem', 'weight'), ('mem_v1.mem', 'weight'))
+
+
+# ------------------------------------------------------------
+# Jobs
+# ------------------------------------------------------------
+class Job:
+    """One command; runs once every dependency has succeeded"""
+    def __init__(self, name: str, cmd, deps=(), timeout: float = None, retries: int = 0,
+                 cwd: str = None, log: str = None):
+        self.name = name
+        self.cmd = cmd
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.retries = retries
+        self.cwd = cwd
+        self.log = log
+
+        self.status = 'pending'     # pending / running / ok / failed / timeout / skipped
+        self.attempts = 0
+        self.returncode = None
+        self.error = None           # why the command could not be started
+        self.elapsed = 0.0
+        self._proc = None
+        self._start = None
+        self._log_file = None
+
+    def start(self) -> bool:
+        """Launch the command; False (and self.error) when it cannot be started"""
+        self.attempts += 1
+        self.status = 'running'
+        if self.log:
+            os.makedirs(os.path.dirname(self.log), exist_ok=True)
+            self._log_file = open(self.log, 'a')
+            self._log_file.write(f"\n=== attempt {self.attempts}: {' '.join(self.cmd)}\n")
+            self._log_file.flush()
+        out = self._log_file or subprocess.DEVNULL
+        try:
+            self._proc = subprocess.Popen(self.cmd, cwd=self.cwd, stdout=out, stderr=subprocess.STDOUT,
+                                          start_new_session=True)
+        except OSError as e:
+            # e.g. the simulator binary is not installed: retrying will not help
+            self.error = str(e)
+            if self._log_file:
+                self._log_file.write(f"=== error: {e}\n")
+                self._log_file.close()
+                self._log_file = None
+            return False
+        self._start = time.monotonic()
+        return True
+
+    def poll(self):
+        """None while running, else the return code ('timeout' once the job was killed)"""
+        rc = self._proc.poll()
+        if rc is None and self.timeout is not None and time.monotonic() - self._start > self.timeout:
+            self.kill()
+            return 'timeout'
+        return rc
+
+    def kill(self):
+        try:
+            os.killpg(self._proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, AttributeError):
+            self._proc.kill()
+        self._proc.wait()
+
+    def finish(self, rc):
+        self.elapsed += time.monotonic() - self._start
+        self.returncode = rc
+        if self._log_file:
+            self._log_file.write(f"=== exit: {rc}\n")
+            self._log_file.close()
+            self._log_file = None
+        self._proc = None
+
+
+class Scheduler:
+    """Runs jobs on `slots` concurrent processes, in submission order as dependencies allow"""
+    def __init__(self, slots: int = 1, poll_interval: float = 0.05, log=print):
+        self.slots = slots
+        self.poll_interval = poll_interval
+        self.log = log
+        self.jobs = {}
+
+    def add(self, job: Job) -> Job:
+        if job.name in self.jobs:
+            raise ValueError(f"Duplicate job name '{job.name}'")
+        for dep in job.deps:
+            if dep not in self.jobs:
+                raise ValueError(f"Job '{job.name}' depends on unknown job '{dep}'")
+        self.jobs[job.name] = job
+        return job
+
+    def run(self) -> dict:
+        """Run everything; returns {name: status}"""
+        pending = list(self.jobs.values())
+        running = []
+
+        while pending or running:
+            for job in list(pending):
+                dep_status = [self.jobs[d].status for d in job.deps]
+                if any(s in ('failed', 'timeout', 'skipped') for s in dep_status):
+                    job.status = 'skipped'
+                    pending.remove(job)
+                    self.log(f"[SKIP ] {job.name}")
+                elif all(s == 'ok' for s in dep_status) and len(running) < self.slots:
+                    pending.remove(job)
+                    if not job.start():
+                        job.status = 'failed'
+                        self.log(f"[FAILED] {job.name} ({job.error})")
+                        continue
+                    running.append(job)
+                    self.log(f"[START] {job.name} (attempt {job.attempts})")
+
+            for job in list(running):
+                rc = job.poll()
+                if rc is None:
+                    continue
+                job.finish(rc)
+                running.remove(job)
+                if rc == 0:
+                    job.status = 'ok'
+                elif job.attempts <= job.retries:
+                    job.status = 'pending'
+                    pending.insert(0, job)
+                    self.log(f"[RETRY] {job.name} ({rc})")
+                    continue
+                else:
+                    job.status = 'timeout' if rc == 'timeout' else 'failed'
+                self.log(f"[{job.status.upper():5}] {job.name} ({job.elapsed:.1f}s)")
+
+            time.sleep(self.poll_interval)
+
+        return {name: job.status for name, job in self.jobs.items()}
+
+
+# ------------------------------------------------------------
+# Regression flow
+# ------------------------------------------------------------
+def config_dirs(base: str) -> dict:
+    return {'soft_dir': os.path.join(base, 'software'),
+            'clean_dir': os.path.join(base, 'cleaned_files'),
+            'hw_dir': os.path.join(base, 'hardware')}
+
+
+def _bits(params: dict, kind: str):
+    return params[f"{kind}_total_bits"], params[f"{kind}_frac_bits"]
+
+
+def add_config_jobs(sched: Scheduler, tag: str, params: dict, base: str, sim_template: str,
+                    timeout: float = None, sim_timeout: float = None, retries: int = 0):
+    """golden -> bin2hex x4 -> sim -> compare x5 for one configuration"""
+    dirs = config_dirs(base)
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    logs = os.path.join(base, 'logs')
+    py = sys.executable
+
+    def job(name, cmd, deps=(), job_timeout=timeout):
+        return sched.add(Job(f"{tag}/{name}", cmd, [f"{tag}/{d}" for d in deps],
+                             timeout=job_timeout, retries=retries, log=os.path.join(logs, f"{name}.log")))
+
+    golden = [py, os.path.join(ROOT, 'pipeline_runner.py'), '--out_dir', dirs['soft_dir']]
+    for key in CONFIG_KEYS:
+        if params.get(key) is not None:
+            golden += [f"--{key}", str(params[key])]
+    job('golden', golden)
+
+    cleaned = []
+    for fname, kind in CLEANED:
+        name = f"clean_{os.path.splitext(fname)[0]}"
+        job(name, [py, os.path.join(ROOT, 'bin2hex.py'), os.path.join(dirs['soft_dir'], fname),
+                   '--out_dir', dirs['clean_dir'], '--element-bits', str(_bits(params, kind)[0])], ['golden'])
+        cleaned.append(name)
+
+    # values are quoted before splitting: the repo path has spaces in it
+    fields = {k: shlex.quote(str(v)) for k, v in dict(params, root=ROOT, python=py, **dirs).items()}
+    job('sim', shlex.split(sim_template.format(**fields)), cleaned, job_timeout=sim_timeout or timeout)
+
+    for name, (golden_file, rtl_file, kind, cols, cores_b, modules) in COMPARES.items():
+        total, frac = _bits(params, kind)
+        job(f"compare_{name}", [
+            py, os.path.join(ROOT, 'compare.py'),
+            '--golden', os.path.join(dirs['soft_dir'], golden_file),
+            '--rtl', os.path.join(dirs['hw_dir'], rtl_file),
+            '--total_bits', str(total), '--frac_bits', str(frac),
+            '--layout', 'c_v2', '--rows', str(params['rows']), '--cols', str(params[cols]),
+            '--cores_a', str(params['cores_a']), '--cores_b', str(params[cores_b]),
+            '--total_modules', str(modules),
+            '--json', os.path.join(dirs['soft_dir'], f"compare_{name}.json"),
+        ], ['sim', 'golden'])
+
+
+def collect(tag: str, params: dict, base: str, statuses: dict, errors: dict = None) -> dict:
+    """compare.py summaries + job states (and start errors) of one configuration"""
+    soft_dir = config_dirs(base)['soft_dir']
+    row = {'config': tag, 'params': params, 'dir': base,
+           'jobs': {k.split('/', 1)[1]: v for k, v in statuses.items() if k.startswith(tag + '/')},
+           'compare': {}}
+    row_errors = {k.split('/', 1)[1]: v for k, v in (errors or {}).items() if k.startswith(tag + '/')}
+    if row_errors:
+        row['errors'] = row_errors
+    for name in COMPARES:
+        path = os.path.join(soft_dir, f"compare_{name}.json")
+        if os.path.isfile(path):
+            with open(path) as f:
+                report = json.load(f)
+            row['compare'][name] = {k: report.get(k) for k in
+                                    ('mismatches', 'match_percent', 'max_ulp', 'max_abs_error', 'snr_db')}
+    row['passed'] = (all(s == 'ok' for s in row['jobs'].values()) and len(row['compare']) == len(COMPARES)
+                     and all(c['mismatches'] == 0 for c in row['compare'].values()))
+    return row
+
+
+def run_regression(configs: list, out_dir: str, sim_template: str, slots: int = 1,
+                   timeout: float = None, sim_timeout: float = None, retries: int = 0, log=print) -> list:
+    sched = Scheduler(slots, log=log)
+    tags = []
+    for i, params in enumerate(configs):
+        tag = f"cfg_{i:03d}"
+        add_config_jobs(sched, tag, params, os.path.join(out_dir, tag), sim_template,
+                        timeout, sim_timeout, retries)
+        tags.append(tag)
+    statuses = sched.run()
+    errors = {name: job.error for name, job in sched.jobs.items() if job.error}
+    return [collect(tag, params, os.path.join(out_dir, tag), statuses, errors)
+            for tag, params in zip(tags, configs)]
+
+
+def print_summary(rows: list, grid_keys):
+    header = f"{'config':8} " + " ".join(f"{k:>14}" for k in grid_keys) + \
+             " " + " ".join(f"{n:>10}" for n in COMPARES) + "  result"
+    print(header)
+    for row in rows:
+        cells = []
+        for name in COMPARES:
+            c = row['compare'].get(name)
+            cells.append(f"{'-' if c is None else c['mismatches']:>10}")
+        failed = [k for k, s in row['jobs'].items() if s != 'ok']
+        result = "PASS" if row['passed'] else ("FAIL " + ",".join(failed) if failed else "FAIL")
+        print(f"{row['config']:8} " + " ".join(f"{str(row['params'][k]):>14}" for k in grid_keys) +
+              " " + " ".join(cells) + "  " + result)
+
+
+# ------------------------------------------------------------
+# Stub simulator
+# ------------------------------------------------------------
+def stub_sim(soft_dir: str, hw_dir: str, flip: int = 0):
+    """Stand-in for the RTL simulation: golden files copied to the simulator's output names"""
+    os.makedirs(hw_dir, exist_ok=True)
+    for golden_file, rtl_file, *_ in COMPARES.values():
+        src, dst = os.path.join(soft_dir, golden_file), os.path.join(hw_dir, rtl_file)
+        shutil.copyfile(src, dst)
+    if flip:
+        # flip the lowest bit of the first `flip` words of out_FINAL.mem
+        path = os.path.join(hw_dir, 'out_FINAL.mem')
+        with open(path) as f:
+            lines = f.read().split('\n')
+        words = [w for line in lines for w in line.split()]
+        width = len(words[0])
+        out, n = [], 0
+        for line in lines:
+            toks = line.split()
+            for i, t in enumerate(toks):
+                if n < flip:
+                    toks[i] = format(int(t, 16) ^ 1, f'0{width}X')
+                    n += 1
+            out.append(" ".join(toks))
+        with open(path, 'w') as f:
+            f.write('\n'.join(out))
+    print(f"[STUB SIM] {soft_dir} → {hw_dir}")
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Regression job scheduler (golden / sim / compare)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p_run = sub.add_parser('run', help='Run a regression over a config grid')
+    p_run.add_argument('--rows', type=int, required=True)
+    p_run.add_argument('--cols', type=int, required=True)
+    p_run.add_argument('--proj_dim', type=int, required=True)
+    p_run.add_argument('--cores_a', type=int, default=2)
+    p_run.add_argument('--total_modules', type=int, default=2)
+    p_run.add_argument('--min_val', type=int, default=-1)
+    p_run.add_argument('--max_val', type=int, default=1)
+    p_run.add_argument('--seed', type=int, default=None)
+    p_run.add_argument('--set', nargs='+', action='extend', default=[], metavar='KEY=VALUE')
+    p_run.add_argument('--grid', nargs='+', action='extend', default=[], metavar='KEY=V1,V2')
+    p_run.add_argument('--zip', action='store_true')
+    p_run.add_argument('--derive', action='store_true',
+                       help='Derive keys/qkt precisions from the input precision (run_pipeline.sh rules)')
+
+    p_run.add_argument('--sim', default='vivado',
+                       help="'vivado', 'stub' or a command template (see module docstring)")
+    p_run.add_argument('--slots', type=int, default=os.cpu_count() or 1)
+    p_run.add_argument('--timeout', type=float, default=None, help='Per-job timeout [s]')
+    p_run.add_argument('--sim_timeout', type=float, default=None, help='Timeout of the sim jobs [s]')
+    p_run.add_argument('--retries', type=int, default=0)
+    p_run.add_argument('--out_dir', default='regress')
+
+    p_stub = sub.add_parser('stub_sim', help='Fake simulator: copy golden outputs to the RTL names')
+    p_stub.add_argument('--soft_dir', required=True)
+    p_stub.add_argument('--hw_dir', required=True)
+    p_stub.add_argument('--flip', type=int, default=0, help='Corrupt this many words of out_FINAL.mem')
+
+    args = parser.parse_args()
+
+    if args.cmd == 'stub_sim':
+        stub_sim(args.soft_dir, args.hw_dir, args.flip)
+        return
+
+    base = {k: getattr(args, k) for k in ('rows', 'cols', 'proj_dim', 'cores_a', 'total_modules',
+                                          'min_val', 'max_val')}
+    base.update(parse_assignments(args.set, multi=False))
+    base['seed'] = resolve_seed(args.seed)
+    grid = parse_assignments(args.grid, multi=True)
+    configs = expand_grid(base, grid, zipped=args.zip, derive=args.derive)
+
+    sim_template = SIMULATORS.get(args.sim, args.sim)
+    print(f"[REGRESSION] {len(configs)} configs, {args.slots} slot(s), seed {base['seed']}, sim: {args.sim}")
+
+    t0 = time.perf_counter()
+    rows = run_regression(configs, args.out_dir, sim_template, args.slots,
+                          args.timeout, args.sim_timeout, args.retries)
+    print(f"[REGRESSION] done in {time.perf_counter() - t0:.1f}s\n")
+
+    print_summary(rows, list(grid))
+    summary = os.path.join(args.out_dir, 'summary.json')
+    with open(summary, 'w') as f:
+        json.dump({'base': base, 'grid': grid, 'sim': sim_template, 'results': rows}, f, indent=2)
+    print(f"\nSummary: {summary}")
+
+    sys.exit(0 if all(r['passed'] for r in rows) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,20 @@
 # ============================================
 # AUTO-INCREMENT EXPORT DIRECTORY
 ROOT=/mnt/ssd/mfauzan/transformer/python_code
-# Find next export index
-i=0
-while [ -d "$ROOT/exports_$i" ]; do
-    ((i++))
-done
+# Set EXPORT_NAME to reuse a fixed export directory (e.g. rerunning the RTL
+# against the same golden files); empty = next free exports_$i
+EXPORT_NAME=""
+if [ -n "$EXPORT_NAME" ]; then
+    BASE=$ROOT/$EXPORT_NAME
+else
+    # Find next export index
+    i=0
+    while [ -d "$ROOT/exports_$i" ]; do
+        ((i++))
+    done
+    BASE=$ROOT/exports_$i
+fi
 
-BASE=$ROOT/exports_$i
 LOG_FILE=$BASE/run_config.log
 echo "Using export directory: $BASE"
 
@@ -34,8 +41,20 @@ TOTAL_MODULES=8
 MIN_VAL=-1
 MAX_VAL=1
 SOFTMAX_MODE=rtl
-
-# WARNING: For now, we can not use total width = 32, it will result in error
+# float: float64 round-trip (inexact for total width >= 32)
+# exact: integer dot product, mac: bit-exact multi_matmul model
+MATMUL_ENGINE=mac
+# "--stream" computes QK^T / softmax / final one row tile at a time
+# (needed for long sequences, 4k+ rows); leave empty for the full-matrix path
+STREAM_FLAG=""
+# Empty SEED = fresh random inputs every run (no caching).
+# Set a fixed seed to reuse golden stages from the cache dir; an export dir
+# already holding this config's artifacts then skips the Python model.
+SEED=""
+CACHE_DIR=$ROOT/golden_cache
+CACHE_MAX_MB=2048
+
+# WARNING: total width = 32 only works with MATMUL_ENGINE=exact/mac
 # INPUT MATRIX PRECISION
 INPUT_TOTAL_BITS=32
 INPUT_FRAC_BITS=16
@@ -85,7 +104,7 @@ MAX_FLAG_MAT_FINAL=$(($ROW_SIZE_MAT_FINAL * $COL_SIZE_MAT_FINAL))
 CORES_A_MAT_FINAL=$CORES_A
 CORES_B_MAT_FINAL=$TOTAL_MODULES
 
-echo "[MODEL CONFIG]" >> $LOG_FILE
+echo "[MODEL CONFIG]" > $LOG_FILE
 echo "rows           : $ROWS" >> $LOG_FILE
 echo "cols           : $COLS" >> $LOG_FILE
 echo "proj_dim       : $PROJ_DIM" >> $LOG_FILE
@@ -93,6 +112,10 @@ echo "cores_a        : $CORES_A" >> $LOG_FILE
 echo "total_modules  : $TOTAL_MODULES" >> $LOG_FILE
 echo "min_val        : $MIN_VAL" >> $LOG_FILE
 echo "max_val        : $MAX_VAL" >> $LOG_FILE
+echo "matmul_engine  : $MATMUL_ENGINE" >> $LOG_FILE
+echo "stream         : ${STREAM_FLAG:-off}" >> $LOG_FILE
+echo "seed           : ${SEED:-none}" >> $LOG_FILE
+echo "cache_dir      : $CACHE_DIR (${CACHE_MAX_MB} MB)" >> $LOG_FILE
 echo "INPUT_TOTAL_BITS   : $INPUT_TOTAL_BITS" >> $LOG_FILE
 echo "INPUT_FRAC_BITS    : $INPUT_FRAC_BITS" >> $LOG_FILE
 echo "WEIGHT_TOTAL_BITS  : $WEIGHT_TOTAL_BITS" >> $LOG_FILE
@@ -147,6 +170,10 @@ python3 $ROOT/pipeline_runner.py \
     --min_val $MIN_VAL \
     --max_val $MAX_VAL \
     --softmax_mode $SOFTMAX_MODE \
+    --matmul_engine $MATMUL_ENGINE \
+    $STREAM_FLAG \
+    ${SEED:+--seed $SEED --cache_dir $CACHE_DIR --cache_max_mb $CACHE_MAX_MB} \
+    --timing --trace_json $SOFT_DIR/trace.json \
     \
     --input_total_bits $INPUT_TOTAL_BITS \
     --input_frac_bits $INPUT_FRAC_BITS \
@@ -232,19 +259,28 @@ python3 $ROOT/compare.py \
      --golden $SOFT_DIR/mem_out_q1.mem \
      --rtl    $HW_DIR/out_Q.mem \
      --total_bits $KEYS_TOTAL_BITS \
-     --frac_bits  $KEYS_FRAC_BITS
+     --frac_bits  $KEYS_FRAC_BITS \
+     --layout c_v2 --rows $ROWS --cols $PROJ_DIM \
+     --cores_a $CORES_A --cores_b $TOTAL_MODULES --total_modules 1 \
+     --json $SOFT_DIR/compare_q.json
 
 python3 $ROOT/compare.py \
      --golden $SOFT_DIR/mem_out_k1.mem \
      --rtl    $HW_DIR/out_K.mem \
      --total_bits $KEYS_TOTAL_BITS \
-     --frac_bits  $KEYS_FRAC_BITS
+     --frac_bits  $KEYS_FRAC_BITS \
+     --layout c_v2 --rows $ROWS --cols $PROJ_DIM \
+     --cores_a $CORES_A --cores_b $TOTAL_MODULES --total_modules 1 \
+     --json $SOFT_DIR/compare_k.json
 
 python3 $ROOT/compare.py \
      --golden $SOFT_DIR/mem_out_v1.mem \
      --rtl    $HW_DIR/out_V.mem \
      --total_bits $KEYS_TOTAL_BITS \
-     --frac_bits  $KEYS_FRAC_BITS
+     --frac_bits  $KEYS_FRAC_BITS \
+     --layout c_v2 --rows $ROWS --cols $PROJ_DIM \
+     --cores_a $CORES_A --cores_b $TOTAL_MODULES --total_modules 1 \
+     --json $SOFT_DIR/compare_v.json
 
 echo "QKT COMPARISON"
 echo "================"
@@ -252,7 +288,10 @@ python3 $ROOT/compare.py \
      --golden $SOFT_DIR/Q_KT.mem \
      --rtl    $HW_DIR/out_QKT.mem \
      --total_bits $QKT_TOTAL_BITS \
-     --frac_bits  $QKT_FRAC_BITS
+     --frac_bits  $QKT_FRAC_BITS \
+     --layout c_v2 --rows $ROWS --cols $ROWS \
+     --cores_a $CORES_A --cores_b $CORES_A --total_modules 2 \
+     --json $SOFT_DIR/compare_qkt.json
 
 echo "FINAL COMPARISON"
 echo "================"
@@ -260,7 +299,10 @@ python3 $ROOT/compare.py \
      --golden $SOFT_DIR/final_results.mem \
      --rtl    $HW_DIR/out_FINAL.mem \
      --total_bits $FINAL_TOTAL_BITS \
-     --frac_bits  $FINAL_FRAC_BITS
+     --frac_bits  $FINAL_FRAC_BITS \
+     --layout c_v2 --rows $ROWS --cols $PROJ_DIM \
+     --cores_a $CORES_A --cores_b $TOTAL_MODULES --total_modules 1 \
+     --json $SOFT_DIR/compare_final.json
 
 echo "========================================"
 echo "PIPELINE DONE"
@@ -1,4 +1,13 @@
 import argparse
+import numpy as np
+
+from itertools import islice
+
+from mem_binary import is_tmem, load_tmem, load_words, save_tmem
+from mem_codec import decode_lines, encode_lines, read_lines
+from fixed_matmul import ROUNDING_MODES, shift_right
+from golden_cache import GoldenCache, stage_key
+from instrument import count, timed
 
 """
 This code used the LUT in the softmax hardware
@@ -59,10 +68,16 @@ def q16_to_hex(x, width):
     mask = (1 << width) - 1
     return f"{(x & mask):0{hex_digits}x}"
 
+def rshift_amount(d):
+    # rshift.sv divides with an arithmetic shift only, so d must be a power of 2 (like 16)
+    d = int(d)
+    if d < 1 or d & (d - 1):
+        raise ValueError(f"Divisor {d} is not a power of 2 (the rshift stage only shifts)")
+    return d.bit_length() - 1
+
 def div_qx(x, d):
-    # assume d is power of 2 (like 16)
-    shift = int(d).bit_length() - 1
-    return to_signed32(x >> shift)
+    # the shift keeps the input width; the Q16.16 conversion truncates to 32 bits
+    return x >> rshift_amount(d)
 
 def to_q16_from_qx(x, frac_in):
     shift = 16 - frac_in
@@ -204,37 +219,277 @@ def softmax_row_q16(row, frac):
 
     return out
 
+# ==============================
+# Vectorized softmax (NumPy)
+# Same bit semantics as the scalar functions above,
+# applied to whole matrices (rows = last axis)
+# ==============================
+LUT_A = np.array([to_signed32(v) for v in lutA], dtype=np.int64)
+LUT_C = np.array([to_signed32(v) for v in lutC], dtype=np.int64)
+A_LUT = np.array([to_signed32(v) for v in a_lut], dtype=np.int64)
+B_LUT = np.array([to_signed32(v) for v in b_lut], dtype=np.int64)
+
+def to_signed32_array(x):
+    x = np.asarray(x, dtype=np.int64) & MASK32
+    return (x ^ (1 << 31)) - (1 << 31)
+
+def sat_signed_array(x, width):
+    return np.clip(x, -(1 << (width - 1)), (1 << (width - 1)) - 1)
+
+def sign_extend_array(x, width):
+    """Raw width-bit two's complement words -> signed int64"""
+    sign = 1 << (width - 1)
+    return ((np.asarray(x, dtype=np.int64) & ((1 << width) - 1)) ^ sign) - sign
+
+def div_qx_array(x, d):
+    return x >> rshift_amount(d)
+
+def to_q16_from_qx_array(x, frac_in):
+    shift = 16 - frac_in
+    if shift >= 0:
+        return to_signed32_array(x << shift)
+    else:
+        return to_signed32_array(x >> (-shift))
+
+def rshift_to_q16_array(words, frac_in, div_val=16, width_in=32, rounding='truncate'):
+    """
+    Bridge + rshift + softmax_vec input conversion in one pass: sign-extend
+    the width_in-bit Q_KT words, divide by div_val (>>> log2), shift Qm.frac_in
+    to Q16.16 and truncate to 32 bits. 'truncate' is what rshift.sv does;
+    'round' / 'even' are for exploring the divider only.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"Unknown rounding mode '{rounding}'")
+    x = sign_extend_array(words, width_in)
+    shift = rshift_amount(div_val)
+    q16 = 16 - frac_in
+
+    if rounding == 'truncate' and q16 <= 0:
+        # two floor shifts compose into one
+        x = x >> (shift - q16)
+    else:
+        x = shift_right(x, shift, rounding)
+        x = x << q16 if q16 >= 0 else x >> (-q16)
+    return to_signed32_array(x)
+
+def from_q16_to_qx_array(x, frac_out, width_out):
+    shift = 16 - frac_out
+
+    # clamp negative softmax
+    x = np.maximum(x, 0)
+
+    if shift > 0:
+        # round-to-nearest
+        out = (x + (1 << (shift - 1))) >> shift
+    elif shift < 0:
+        out = x << (-shift)
+    else:
+        out = x
+
+    # saturate to output width
+    return to_signed32_array(sat_signed_array(out, width_out))
+
+def exp_q16_array(x):
+    x = to_signed32_array(x)
+
+    absX = np.abs(x)
+    Ytemp = (absX << 2) & MASK32
+
+    base_idx = np.where((Ytemp >> 21) != 0, 31, (Ytemp >> 16) & 0x1F)
+    idx = np.where(x < 0, base_idx + 32, base_idx)
+
+    prod = to_signed32_array((x * LUT_A[idx]) >> 16)
+    y = to_signed32_array(prod + LUT_C[idx])
+
+    # RTL clamp: if negative -> 0
+    return np.maximum(y, 0)
+
+def lnu_q16_array(x):
+    x = np.asarray(x, dtype=np.int64)
+    idx = np.where(
+        x < 0x00010000, 0,
+        np.where(x >= 0x00080000, 27, (((x - 0x00010000) << 2) >> 16) & 0x1F)
+    )
+
+    # idx 27 covers the whole 48-bit sum range with a < 2^14, so a*x fits int64
+    mult = (A_LUT[idx] * x) >> 16
+    return to_signed32_array(mult + B_LUT[idx])
+
+def softmax_q16_array(mat, exp=exp_q16_array):
+    mat = np.asarray(mat, dtype=np.int64)
+
+    # PASS 0: max
+    max_val = mat.max(axis=-1, keepdims=True)
+
+    # PASS 1: exp + sum (exp >= 0, so the running saturation is a final clamp)
+    exp_vals = exp(mat - max_val)
+    sum_exp = np.minimum(exp_vals.sum(axis=-1, keepdims=True), SUM_MASK)
+
+    # LN
+    ln_sum = lnu_q16_array(sum_exp)
+
+    # PASS 2: final
+    return exp(mat - max_val - ln_sum)
+
+# ==============================
+# Precomputed tables
+# Whole-domain results of exp_q16 and of the Q_KT -> Q16.16 input stage,
+# built on first use and kept in memory (and in a GoldenCache if given),
+# so softmax reduces to array gathers
+# ==============================
+# exp_q16 is 0 for every -2^30 < x < EXP_TABLE_LO (LUT entry 63 is linear
+# and already negative there); softmax arguments above EXP_TABLE_HI
+# (1.0) or at/below -2^30 fall back to exp_q16_array
+EXP_TABLE_LO = -(1 << 20)
+EXP_TABLE_HI = 1 << 16
+EXP_ZERO_FLOOR = -(1 << 30)
+
+# Widest Q_KT word with a full input table (2^20 entries)
+Q16_TABLE_MAX_BITS = 20
+
+class SoftmaxTables:
+    """Lazy exp / input-conversion tables, memoized per configuration"""
+    def __init__(self, cache: GoldenCache = None):
+        self.cache = cache
+        self._tables = {}
+
+    def _table(self, name, params, build):
+        key = stage_key(name, params)
+        table = self._tables.get(key)
+        if table is None:
+            arrays = self.cache.load(key) if self.cache is not None else None
+            if arrays is None:
+                arrays = {'table': build().astype(np.int32)}
+                count('softmax_tables_built')
+                if self.cache is not None:
+                    self.cache.store(key, arrays)
+            table = self._tables[key] = arrays['table'].astype(np.int64)
+        return table
+
+    def exp_table(self):
+        """exp_q16 of EXP_TABLE_LO .. EXP_TABLE_HI"""
+        return self._table('exp_q16', {'lo': EXP_TABLE_LO, 'hi': EXP_TABLE_HI},
+                           lambda: exp_q16_array(np.arange(EXP_TABLE_LO, EXP_TABLE_HI + 1)))
+
+    def q16_table(self, frac_in, div_val=16, width_in=32, rounding='truncate'):
+        """rshift_to_q16_array of every width_in-bit word, None above Q16_TABLE_MAX_BITS"""
+        if width_in > Q16_TABLE_MAX_BITS:
+            return None
+        return self._table('rshift_q16',
+                           {'width_in': width_in, 'frac_in': frac_in, 'div': div_val, 'rounding': rounding},
+                           lambda: rshift_to_q16_array(np.arange(1 << width_in), frac_in, div_val,
+                                                       width_in, rounding))
+
+    def exp_q16(self, x):
+        """exp_q16_array by table lookup"""
+        x = to_signed32_array(x)
+        y = np.take(self.exp_table(), x - EXP_TABLE_LO, mode='clip')
+        outside = (x > EXP_TABLE_HI) | (x <= EXP_ZERO_FLOOR)
+        if outside.any():
+            y[outside] = exp_q16_array(x[outside])
+        return y
+
+    def to_q16(self, words, frac_in, div_val=16, width_in=32, rounding='truncate'):
+        """rshift_to_q16_array by table lookup (computed for wide words)"""
+        table = self.q16_table(frac_in, div_val, width_in, rounding)
+        if table is None:
+            return rshift_to_q16_array(words, frac_in, div_val, width_in, rounding)
+        return table[np.asarray(words, dtype=np.int64) & ((1 << width_in) - 1)]
+
+@timed('softmax_rtl')
+def softmax_matrix_wrapper(
+    mat,
+    frac_in,
+    frac_out,
+    width_out,
+    apply_div=False,
+    div_val=16,
+    width_in=32,
+    rounding='truncate',
+    tables=None
+):
+    """
+    Whole-matrix equivalent of softmax_row_wrapper. mat may hold raw
+    width_in-bit words; they are sign-extended, divided and converted to
+    Q16.16 in one pass (rshift_to_q16_array). With a SoftmaxTables the
+    conversion and both exp passes are table lookups (same results).
+    """
+    div_val = div_val if apply_div else 1
+
+    # optional divide, input Qm.n -> Q16.16, softmax core
+    if tables is not None:
+        x = tables.to_q16(mat, frac_in, div_val, width_in, rounding)
+        out_q16 = softmax_q16_array(x, tables.exp_q16)
+    else:
+        x = rshift_to_q16_array(mat, frac_in, div_val, width_in, rounding)
+        out_q16 = softmax_q16_array(x)
+
+    # Q16.16 -> output Qm.n
+    return from_q16_to_qx_array(out_q16, frac_out, width_out)
+
 # ==============================
 # File IO
 # ==============================
-def read_matrix(file, fmt, frac):
+@timed('read_matrix')
+def read_matrix(file, fmt, frac, width=32):
+    """hex / .tmem input as an int64 array, float input as nested lists"""
+    if fmt == "hex":
+        words = load_words(file) if is_tmem(file) else read_lines(file, "hex")
+        return sign_extend_array(words, width)
+
     mat = []
     with open(file) as f:
         for line in f:
             vals = line.strip().split()
             if not vals:
                 continue
-            if fmt == "float":
-                mat.append([
-                    float_to_q16(float(v), frac)
-                    for v in vals
-                ])
-            else:
-                mat.append([hex_to_q16(v) for v in vals])
+            mat.append([
+                float_to_q16(float(v), frac)
+                for v in vals
+            ])
     return mat
 
+def iter_matrix_chunks(file, fmt, frac, chunk_rows, width=32):
+    """read_matrix one chunk of at most chunk_rows rows at a time (int64 arrays)"""
+    if fmt == "hex" and is_tmem(file):
+        words = load_tmem(file)[0]
+        for r in range(0, words.shape[0], chunk_rows):
+            yield sign_extend_array(np.asarray(words[r:r+chunk_rows]).astype(np.int64), width)
+        return
+
+    with open(file, "rb") as f:
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                return
+            if fmt == "hex":
+                chunk = sign_extend_array(decode_lines(b"".join(lines), "hex"), width)
+            else:
+                chunk = np.array([[float_to_q16(float(v), frac) for v in line.split()]
+                                  for line in lines if line.strip()], dtype=np.int64)
+            if chunk.size:
+                yield chunk
+
 import os
 
-def write_matrix(mat, fmt, frac, width, output_file=None):
-    lines = []
+def encode_hex_matrix(mat, width):
+    """q16_to_hex for a whole matrix, as .mem text bytes"""
+    if width % 4 == 0:
+        return encode_lines(np.asarray(mat, dtype=np.int64), width, "hex", upper=False, digits=width // 4)
+    # q16_to_hex pads to width//4 digits only; values may print wider
+    return "".join(" ".join(q16_to_hex(int(v), width) for v in row) + "\n" for row in mat).encode()
 
-    for row in mat:
-        if fmt == "hex":
-            line = " ".join(q16_to_hex(v, width) for v in row)
-        else:
-            line = " ".join(f"{q16_to_float(v, frac):.6f}" for v in row)
+@timed('write_matrix')
+def write_matrix(mat, fmt, frac, width, output_file=None):
+    if fmt == "hex" and output_file and output_file.endswith(".tmem"):
+        save_tmem(output_file, mat, width, frac)
+        print(f"[INFO] Saved to: {output_file}")
+        return
 
-        lines.append(line)
+    if fmt == "hex":
+        lines = encode_hex_matrix(mat, width).decode().splitlines()
+    else:
+        lines = [" ".join(f"{q16_to_float(v, frac):.6f}" for v in row) for row in mat]
 
     if output_file:
         # create directory if not exists
@@ -243,12 +498,47 @@ def write_matrix(mat, fmt, frac, width, output_file=None):
         with open(output_file, "w") as f:
             for line in lines:
                 f.write(line + "\n")
+        count('elements_exported', sum(len(row) for row in mat))
+        count('bytes_written', sum(len(line) + 1 for line in lines))
 
         print(f"[INFO] Saved to: {output_file}")
     else:
         for line in lines:
             print(line)
             
+def softmax_file_chunked(args):
+    """
+    main() for --chunk_rows: read, process and append chunk_rows rows at a
+    time, so memory is bounded by the chunk instead of the matrix
+    """
+    if args.output_file.endswith(".tmem"):
+        raise ValueError("--chunk_rows writes text output only")
+
+    dirpath = os.path.dirname(args.output_file)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+
+    rows = 0
+    width_in = input_width(args)
+    tables = make_tables(args)
+    with open(args.output_file, "w") as f:
+        for chunk in iter_matrix_chunks(args.input, args.input_format, args.frac_in, args.chunk_rows, width_in):
+            out = softmax_matrix_wrapper(chunk, args.frac_in, args.frac_out, args.width_out,
+                                         args.apply_div, args.div_value, width_in, args.div_rounding, tables)
+            if args.check_scalar:
+                ref = [softmax_row_wrapper(row, args.frac_in, args.frac_out, args.width_out,
+                                           args.apply_div, args.div_value) for row in chunk.tolist()]
+                if ref != out.tolist():
+                    raise RuntimeError(f"Vectorized softmax does not match the scalar path (rows {rows}+)")
+            if args.output_format == "hex":
+                f.write(encode_hex_matrix(out, args.width_out).decode())
+            else:
+                f.write("".join(" ".join(f"{q16_to_float(v, args.frac_out):.6f}" for v in row) + "\n"
+                                for row in out.tolist()))
+            rows += chunk.shape[0]
+
+    print(f"[INFO] Saved to: {args.output_file} ({rows} rows)")
+
 def softmax_row_wrapper(
     row,
     frac_in,
@@ -274,6 +564,17 @@ def softmax_row_wrapper(
     ]
 
 
+def input_width(args):
+    # float inputs are converted straight to 32-bit Qm.frac_in words
+    return args.width_in if args.input_format == "hex" else 32
+
+def make_tables(args):
+    if not args.tables:
+        return None
+    cache = GoldenCache(args.tables_dir, max_bytes=args.tables_max_mb << 20) if args.tables_dir else None
+    return SoftmaxTables(cache)
+
+
 # ==============================
 # MAIN
 # ==============================
@@ -283,7 +584,10 @@ def main():
     parser.add_argument("--input_format", default="hex", choices=["hex","float"])
     parser.add_argument("--output_format", default="hex", choices=["hex","float"])
     parser.add_argument("--apply_div", action="store_true")
-    parser.add_argument("--div_value", type=int, default=16)
+    parser.add_argument("--div_value", type=int, default=16,
+                        help="Power of 2 (the rshift stage divides by shifting)")
+    parser.add_argument("--div_rounding", default="truncate", choices=ROUNDING_MODES,
+                        help="Rounding of the divide (the RTL truncates; others are for exploration)")
     # input format
     parser.add_argument("--width_in", type=int, default=16)
     parser.add_argument("--frac_in", type=int, default=8)
@@ -292,12 +596,38 @@ def main():
     parser.add_argument("--width_out", type=int, default=8)
     parser.add_argument("--frac_out", type=int, default=7)
     parser.add_argument("--output_file", default="softmax_results.txt")
+    parser.add_argument("--check_scalar", action="store_true",
+                        help="Also run the per-element scalar path and verify both match")
+    parser.add_argument("--chunk_rows", type=int, default=0,
+                        help="Stream the input this many rows at a time (0 = whole matrix)")
+    parser.add_argument("--tables", action="store_true",
+                        help="Precomputed exp / input tables (full input table up to 20-bit words)")
+    parser.add_argument("--tables_dir", default=None,
+                        help="Keep the --tables on disk here (a golden_cache directory)")
+    parser.add_argument("--tables_max_mb", type=int, default=256,
+                        help="Size bound of --tables_dir (least recently used entries are evicted)")
     
     args = parser.parse_args()
 
-    mat = read_matrix(args.input, args.input_format, args.frac_in)
+    if args.check_scalar and args.div_rounding != "truncate":
+        raise ValueError("--check_scalar models the truncating RTL divide only")
+
+    if args.chunk_rows > 0:
+        softmax_file_chunked(args)
+        return
+
+    width_in = input_width(args)
+    mat = read_matrix(args.input, args.input_format, args.frac_in, width_in)
+
+    out = softmax_matrix_wrapper(mat, args.frac_in, args.frac_out, args.width_out, args.apply_div, args.div_value,
+                                 width_in, args.div_rounding, make_tables(args)).tolist()
 
-    out = [softmax_row_wrapper(row, args.frac_in, args.frac_out, args.width_out, args.apply_div, args.div_value) for row in mat]
+    if args.check_scalar:
+        rows = mat.tolist() if isinstance(mat, np.ndarray) else mat
+        ref = [softmax_row_wrapper(row, args.frac_in, args.frac_out, args.width_out, args.apply_div, args.div_value) for row in rows]
+        if ref != out:
+            raise RuntimeError("Vectorized softmax does not match the scalar path")
+        print("[INFO] Vectorized softmax matches the scalar path")
 
     write_matrix(out, args.output_format, args.frac_out, args.width_out, args.output_file)
 
@@ -21,9 +21,11 @@ Features:
 4. Optional scaling:
        x = x / div_value
 
-5. Quantizes output back into fixed-point
+5. Quantizes output back into fixed-point (clamped to [0, 1])
 
-6. Exports:
+6. Optional float32 computation (--float32) for large matrices
+
+7. Exports:
        softmax_real_results.txt
 
 Example:
@@ -40,112 +42,60 @@ import argparse
 import numpy as np
 import os
 
-
-# ============================================================
-# Fixed Point Converter
-# ============================================================
-class FixedPointConverter:
-    def __init__(self, total_bits, frac_bits):
-        self.total_bits = total_bits
-        self.frac_bits = frac_bits
-
-        self.max_int = (1 << (total_bits - 1)) - 1
-        self.min_int = -(1 << (total_bits - 1))
-
-    def fixed_to_float(self, val):
-        """
-        Convert signed fixed-point integer -> float
-        """
-        if val & (1 << (self.total_bits - 1)):
-            val -= (1 << self.total_bits)
-
-        return float(val) / (1 << self.frac_bits)
-
-    def float_to_fixed(self, x):
-        """
-        Convert float -> signed fixed-point integer
-        """
-        scaled = int(round(x * (1 << self.frac_bits)))
-
-        if scaled > self.max_int:
-            scaled = self.max_int
-
-        if scaled < self.min_int:
-            scaled = self.min_int
-
-        return scaled
-
-    def int_to_hex(self, val):
-        """
-        Convert signed integer -> hex
-        """
-        if val < 0:
-            val = (1 << self.total_bits) + val
-
-        width_hex = (self.total_bits + 3) // 4
-        return f"{val:0{width_hex}X}"
+from matrix_multiplier import FixedPointConverter
+from mem_binary import is_tmem, load_words, save_tmem
+from mem_codec import read_lines, write_lines
+from instrument import timed
 
 
 # ============================================================
 # Load Matrix
 # ============================================================
+@timed('load_hex_matrix')
 def load_hex_matrix(path):
-    matrix = []
+    if is_tmem(path):
+        return load_words(path)
 
-    with open(path, 'r') as f:
-        for line in f:
-            line = line.strip()
-
-            if not line:
-                continue
-
-            row = [int(x, 16) for x in line.split()]
-            matrix.append(row)
-
-    return np.array(matrix, dtype=np.int64)
+    return read_lines(path, 'hex')
 
 
 # ============================================================
 # Convert Fixed -> Float Matrix
 # ============================================================
-def fixed_matrix_to_float(matrix, conv):
-    out = np.zeros(matrix.shape, dtype=np.float64)
-
-    for i in range(matrix.shape[0]):
-        for j in range(matrix.shape[1]):
-            out[i, j] = conv.fixed_to_float(int(matrix[i, j]))
-
-    return out
+@timed('fixed_to_float')
+def fixed_matrix_to_float(matrix, conv, dtype=np.float64):
+    """
+    Signed fixed-point words -> float (dtype=np.float32 for large matrices)
+    """
+    return conv.fixed_to_float_array(matrix, dtype)
 
 
 # ============================================================
 # Convert Float -> Fixed Matrix
 # ============================================================
+@timed('float_to_fixed')
 def float_matrix_to_fixed(matrix, conv):
-    out = np.zeros(matrix.shape, dtype=np.int64)
-
-    for i in range(matrix.shape[0]):
-        for j in range(matrix.shape[1]):
-            x = max(0.0, min(1.0, float(matrix[i, j])))
-            out[i, j] = conv.float_to_fixed(x)
-
-    return out
+    """
+    Probabilities -> fixed-point, clamped to [0, 1] first
+    """
+    return conv.float_to_fixed_array(matrix, 0.0, 1.0)
 
 
 # ============================================================
 # REAL Softmax
 # ============================================================
+@timed('softmax_real')
 def softmax_real(x):
     """
     Numerically stable softmax
     """
 
     # subtract max for stability
-    x_shift = x - np.max(x, axis=1, keepdims=True)
+    x_shift = x - np.max(x, axis=-1, keepdims=True)
 
     exp_x = np.exp(x_shift)
 
-    sum_exp = np.sum(exp_x, axis=1, keepdims=True)
+    sum_exp = np.sum(exp_x, axis=-1, keepdims=True)
 
     return exp_x / sum_exp
 
@@ -153,11 +103,13 @@ def softmax_real(x):
 # ============================================================
 # Export
 # ============================================================
+@timed('export_hex_matrix')
 def export_hex_matrix(matrix, conv, filename):
-    with open(filename, 'w') as f:
-        for row in matrix:
-            line = " ".join(conv.int_to_hex(int(v)) for v in row)
-            f.write(line + "\n")
+    if filename.endswith('.tmem'):
+        save_tmem(filename, matrix, conv.total_bits, conv.fractional_bits)
+        return
+
+    write_lines(filename, matrix, conv.total_bits, 'hex')
 
 
 # ============================================================
@@ -186,6 +138,8 @@ def main():
     )
 
     parser.add_argument('--display', action='store_true')
+    parser.add_argument('--float32', action='store_true',
+                        help='Compute in float32 (half the memory traffic on large matrices)')
 
     args = parser.parse_args()
 
@@ -194,12 +148,12 @@ def main():
     # --------------------------------------------------------
     conv_in = FixedPointConverter(
         total_bits=args.width_in,
-        frac_bits=args.frac_in
+        fractional_bits=args.frac_in
     )
 
     conv_out = FixedPointConverter(
         total_bits=args.width_out,
-        frac_bits=args.frac_out
+        fractional_bits=args.frac_out
     )
 
     # --------------------------------------------------------
@@ -210,7 +164,11 @@ def main():
     # --------------------------------------------------------
     # Convert to float
     # --------------------------------------------------------
-    matrix_float = fixed_matrix_to_float(matrix_fixed, conv_in)
+    matrix_float = fixed_matrix_to_float(
+        matrix_fixed,
+        conv_in,
+        np.float32 if args.float32 else np.float64
+    )
 
     # --------------------------------------------------------
     # Optional division
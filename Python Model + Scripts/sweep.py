@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+sweep.py
+
+Design-space sweep over golden-model configurations (the run_pipeline.sh
+knobs: core layout, precisions, softmax mode, matmul engine, shapes).
+
+Configurations share work through the stage cache (golden_cache.py):
+every distinct stage result is computed once, level by level
+(projection -> qkt -> softmax -> final), on a process pool. Core counts only
+change the export layout, so e.g. a CORES_A x TOTAL_MODULES grid costs a single
+A/W generation and matmul chain. Each configuration then exports its .mem
+artifacts (optional) and is scored against a float64 reference of
+softmax(Q x K^T / div) x V computed from the same A / W.
+
+Usage:
+    python sweep.py --rows 64 --cols 16 --proj_dim 64 \
+        --grid cores_a=2,4 total_modules=2,4 soft_total_bits=8,16 \
+        --set soft_frac_bits=7 --workers 4 --csv sweep.csv --json sweep.json
+
+    # precisions derived like run_pipeline.sh (keys = input + 2/+1, qkt = keys + 4/+1)
+    python sweep.py --rows 64 --cols 16 --proj_dim 64 --derive \
+        --grid input_total_bits=16,24,32 input_frac_bits=8,12,16 --zip --export_dir sweep_out
+
+--grid keys are PipelineConfig arguments; the cartesian product is taken
+unless --zip pairs the value lists up one to one.
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from golden_pipeline import PipelineConfig, run_golden_pipeline, GOLDEN_STAGES, DIV_VALUE
+from golden_cache import GoldenCache, DEFAULT_MAX_BYTES
+from matrix_multiplier import resolve_seed
+
+_PARAMS = inspect.signature(PipelineConfig.__init__).parameters
+CONFIG_KEYS = [p for p in _PARAMS if p not in ('self', 'matrix_seeds', 'softmax_tables')]
+CONFIG_DEFAULTS = {k: _PARAMS[k].default for k in CONFIG_KEYS
+                   if _PARAMS[k].default is not inspect.Parameter.empty}
+STRING_KEYS = ('softmax_mode', 'matmul_engine')
+SHAPE_KEYS = ('rows', 'cols', 'proj_dim', 'cores_a', 'total_modules')
+
+
+# ------------------------------------------------------------
+# Grid
+# ------------------------------------------------------------
+def _parse_value(key: str, text: str):
+    if key not in CONFIG_KEYS:
+        raise ValueError(f"Unknown config key '{key}' (expected one of {CONFIG_KEYS})")
+    return text if key in STRING_KEYS else int(text)
+
+
+def parse_assignments(items, multi: bool) -> dict:
+    """['cores_a=2,4', 'softmax_mode=rtl'] -> {'cores_a': [2, 4], ...} (scalars if not multi)"""
+    out = {}
+    for item in items or []:
+        key, _, values = item.partition('=')
+        key = key.strip()
+        if not values:
+            raise ValueError(f"Expected KEY=VALUE, got '{item}'")
+        vals = [_parse_value(key, v.strip()) for v in values.split(',')]
+        out[key] = vals if multi else vals[0]
+    return out
+
+
+def derive_precisions(params: dict) -> dict:
+    """run_pipeline.sh's derived Q/K/V and Q_KT precisions (explicit values win)"""
+    p = dict(params)
+    it, fb = p.get('input_total_bits', 16), p.get('input_frac_bits', 8)
+    p.setdefault('keys_total_bits', it + 2)
+    p.setdefault('keys_frac_bits', fb + 1)
+    p.setdefault('qkt_total_bits', p['keys_total_bits'] + 4)
+    p.setdefault('qkt_frac_bits', p['keys_frac_bits'] + 1)
+    return p
+
+
+def expand_grid(base: dict, grid: dict, zipped: bool = False, derive: bool = False) -> list:
+    """Full config dicts of the sweep (PipelineConfig defaults filled in), in grid order"""
+    keys = list(grid)
+    if zipped:
+        lengths = {len(grid[k]) for k in keys}
+        if len(lengths) > 1:
+            raise ValueError("--zip needs value lists of equal length")
+        combos = list(zip(*(grid[k] for k in keys)))
+    else:
+        combos = list(itertools.product(*(grid[k] for k in keys)))
+
+    configs = []
+    for combo in combos or [()]:
+        params = dict(base, **dict(zip(keys, combo)))
+        if derive:
+            params = derive_precisions(params)
+        configs.append(dict(CONFIG_DEFAULTS, **params))
+    return configs
+
+
+# ------------------------------------------------------------
+# Workers (module level: they run in pool processes)
+# ------------------------------------------------------------
+def _compute_stage(params: dict, stage: str, cache_root: str, cache_max: int) -> float:
+    """Compute one stage into the cache (parents are cache hits); returns seconds"""
+    cache = GoldenCache(cache_root, cache_max)
+    t0 = time.perf_counter()
+    run_golden_pipeline(PipelineConfig(**params), cache=cache, until=stage)
+    return time.perf_counter() - t0
+
+
+def float_reference(cfg: PipelineConfig, results: dict) -> np.ndarray:
+    """softmax(Q x K^T / div) x V in float64 from the (fixed-point) A and W"""
+    A = cfg.conv_input.fixed_to_float_array(results['A'])
+    Q, K, V = (A @ cfg.conv_weight.fixed_to_float_array(results[w]) for w in ('Wq', 'Wk', 'Wv'))
+    S = Q @ K.T / float(DIV_VALUE)
+    S = np.exp(S - S.max(axis=1, keepdims=True))
+    return (S / S.sum(axis=1, keepdims=True)) @ V
+
+
+def _finish_config(index: int, params: dict, cache_root: str, cache_max: int, export_dir: str) -> dict:
+    """Export (optional) and score one configuration from the cache"""
+    row = {'id': index}
+    row.update(params)
+    cfg = PipelineConfig(**params)
+    out_dir = os.path.join(export_dir, f"config_{index:03d}") if export_dir else None
+
+    t0 = time.perf_counter()
+    try:
+        results = run_golden_pipeline(cfg, out_dir=out_dir, cache=GoldenCache(cache_root, cache_max))
+    except ValueError as e:
+        row.update(status='error', error=str(e))
+        return row
+    row['export_s'] = time.perf_counter() - t0
+
+    ref = float_reference(cfg, results)
+    err = cfg.conv_final.fixed_to_float_array(results['final']) - ref
+    signal = float(np.sum(ref ** 2))
+    noise = float(np.sum(err ** 2))
+    row.update(
+        status='ok',
+        out_dir=out_dir,
+        max_abs_error=float(np.abs(err).max()),
+        rms_error=float(np.sqrt(np.mean(err ** 2))),
+        snr_db=None if noise == 0 or signal == 0 else float(10 * np.log10(signal / noise)),
+    )
+    return row
+
+
+# ------------------------------------------------------------
+# Sweep
+# ------------------------------------------------------------
+class _Done:
+    """Future-like result of a serial call (re-raises its ValueError like a Future)"""
+    def __init__(self, value=None, error: Exception = None):
+        self.value = value
+        self.error = error
+
+    @classmethod
+    def call(cls, fn, *args):
+        try:
+            return cls(fn(*args))
+        except ValueError as e:
+            return cls(error=e)
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def run_sweep(configs: list, workers: int = 1, cache_dir: str = None,
+              cache_max_bytes: int = DEFAULT_MAX_BYTES, export_dir: str = None, log=print) -> list:
+    """
+    Compute every distinct stage once (level by level, in parallel), then
+    export / score every configuration. Returns one result row per config.
+    Configs without a seed get one common seed, so they share the projection.
+    A stage that raises ValueError (e.g. indivisible core layout) turns only
+    the configs depending on it into error rows.
+    """
+    seed = resolve_seed(None)
+    configs = [dict(c, seed=seed if c.get('seed') is None else c['seed']) for c in configs]
+
+    tmp = None
+    if cache_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="sweep_cache_")
+        cache_dir = tmp.name
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    submit = pool.submit if pool else _Done.call
+    stage_s = {}
+    failed = {}     # stage key -> error message
+    try:
+        # Level by level: every distinct key once
+        keys = [PipelineConfig(**c).stage_keys() for c in configs]
+        error = lambda k: next((failed[k[s]] for s in GOLDEN_STAGES if k[s] in failed), None)
+        for stage in GOLDEN_STAGES:
+            unique = {}
+            for c, k in zip(configs, keys):
+                if error(k) is None:
+                    unique.setdefault(k[stage], c)
+            t0 = time.perf_counter()
+            futures = {key: submit(_compute_stage, c, stage, cache_dir, cache_max_bytes)
+                       for key, c in unique.items()}
+            for key, fut in futures.items():
+                try:
+                    stage_s[key] = fut.result()
+                except ValueError as e:
+                    failed[key] = str(e)
+            log(f"[{stage:10}] {len(unique):4} distinct of {len(configs)} configs "
+                f"({time.perf_counter() - t0:.2f}s)")
+
+        futures = [submit(_finish_config, i, c, cache_dir, cache_max_bytes, export_dir)
+                   if error(k) is None else _Done(dict({'id': i}, **c, status='error', error=error(k)))
+                   for i, (c, k) in enumerate(zip(configs, keys))]
+        rows = [f.result() for f in futures]
+    finally:
+        if pool:
+            pool.shutdown()
+        if tmp:
+            tmp.cleanup()
+
+    for row, k in zip(rows, keys):
+        # stage compute time of this config's chain (shared stages count in full)
+        if row['status'] == 'ok':
+            row['compute_s'] = sum(stage_s[k[s]] for s in GOLDEN_STAGES)
+    return rows
+
+
+# ------------------------------------------------------------
+# Output
+# ------------------------------------------------------------
+RESULT_KEYS = ['status', 'max_abs_error', 'rms_error', 'snr_db', 'compute_s', 'export_s', 'out_dir', 'error']
+
+
+def write_csv(rows: list, path: str):
+    columns = ['id'] + CONFIG_KEYS + RESULT_KEYS
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def print_table(rows: list, grid_keys):
+    cols = ['id'] + list(grid_keys) + ['status', 'max_abs_error', 'rms_error', 'snr_db']
+    width = {c: max(len(c), 10) for c in cols}
+
+    def cell(row, c):
+        v = row.get(c)
+        if isinstance(v, float):
+            return f"{v:.4g}"
+        return '-' if v is None else str(v)
+
+    print(" ".join(f"{c:>{width[c]}}" for c in cols))
+    for row in rows:
+        print(" ".join(f"{cell(row, c):>{width[c]}}" for c in cols))
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Golden model configuration sweep")
+
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--cols', type=int, required=True)
+    parser.add_argument('--proj_dim', type=int, required=True)
+    parser.add_argument('--cores_a', type=int, default=2)
+    parser.add_argument('--total_modules', type=int, default=2)
+    parser.add_argument('--min_val', type=int, default=-1)
+    parser.add_argument('--max_val', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed shared by every config (default: drawn once and printed)')
+
+    parser.add_argument('--set', nargs='+', action='extend', default=[], metavar='KEY=VALUE',
+                        help='Fixed PipelineConfig arguments')
+    parser.add_argument('--grid', nargs='+', action='extend', default=[], metavar='KEY=V1,V2',
+                        help='Swept PipelineConfig arguments')
+    parser.add_argument('--zip', action='store_true', help='Pair grid values instead of the product')
+    parser.add_argument('--derive', action='store_true',
+                        help='Derive keys/qkt precisions from the input precision (run_pipeline.sh rules)')
+
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help='Keep stage results here (default: temporary, removed afterwards)')
+    parser.add_argument('--cache_max_mb', type=int, default=DEFAULT_MAX_BYTES >> 20)
+    parser.add_argument('--export_dir', type=str, default=None,
+                        help='Write each config\'s .mem artifacts to <export_dir>/config_<id>')
+    parser.add_argument('--csv', type=str, default=None)
+    parser.add_argument('--json', type=str, default=None)
+
+    args = parser.parse_args()
+
+    base = {k: getattr(args, k) for k in SHAPE_KEYS + ('min_val', 'max_val')}
+    base.update(parse_assignments(args.set, multi=False))
+    base['seed'] = resolve_seed(args.seed)
+    grid = parse_assignments(args.grid, multi=True)
+
+    configs = expand_grid(base, grid, zipped=args.zip, derive=args.derive)
+    print(f"[SWEEP] {len(configs)} configs, seed {base['seed']}, {args.workers} worker(s)")
+
+    t0 = time.perf_counter()
+    rows = run_sweep(configs, workers=args.workers, cache_dir=args.cache_dir,
+                     cache_max_bytes=args.cache_max_mb << 20, export_dir=args.export_dir)
+    print(f"[SWEEP] done in {time.perf_counter() - t0:.2f}s\n")
+
+    print_table(rows, grid.keys())
+
+    if args.csv:
+        write_csv(rows, args.csv)
+        print(f"\nCSV : {args.csv}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'base': base, 'grid': grid, 'results': rows}, f, indent=2)
+        print(f"JSON: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
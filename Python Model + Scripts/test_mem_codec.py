@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+test_mem_codec.py
+
+Parsing checks for mem_codec's vectorized decoders (python -m pytest -q).
+"""
+import numpy as np
+
+from compare import load_hex_file, load_hex_matrix
+from mem_codec import decode_lines, decode_tokens, encode_lines
+
+
+def test_decode_tokens_mixed_width():
+    # same total length as three 2-digit tokens: must not take the reshape path
+    assert decode_tokens([b'12', b'3', b'456']).tolist() == [0x12, 0x3, 0x456]
+    assert decode_tokens(['12', '3', '456']).tolist() == [0x12, 0x3, 0x456]
+
+
+def test_decode_tokens_fixed_width():
+    assert decode_tokens([b'00ff', b'7FFF', b'0x10']).tolist() == [0xFF, 0x7FFF, 0x10]
+    assert decode_tokens([b'0101', b'1111'], 'bin').tolist() == [5, 15]
+
+
+def test_compare_loaders_mixed_width(tmp_path):
+    path = tmp_path / "mixed.mem"
+    path.write_bytes(b"12 3\n456\n")
+    assert load_hex_file(str(path)).tolist() == [0x12, 0x3, 0x456]
+    assert load_hex_matrix(str(path)).tolist() == [0x12, 0x3, 0x456]
+
+
+def test_decode_lines_roundtrip():
+    words = np.arange(-8, 8, dtype=np.int64).reshape(4, 4)
+    data = encode_lines(words, 16, 'hex')
+    assert (decode_lines(data, 'hex') == words & 0xFFFF).all()